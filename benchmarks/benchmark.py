@@ -0,0 +1,151 @@
+"""Load, serialization and execution benchmarks over generated projects.
+
+Generates a project of each shape and size with benchmarks/generator.py and times:
+
+    load              loading the project yaml without the compiled project cache
+    load_cached       loading the project from its compiled project cache
+    serialize_json    streaming getDag JSON with writeDag
+    serialize_jsonl   streaming the compact by-id JSON Lines dag
+    execute_thread    executing the noOp tasks on the thread workers
+    execute_asyncio   executing the noOp tasks on the asyncio engine
+
+Load is excluded from the execution timings. Results are written as a json document
+so runs can be compared between releases.
+
+    python benchmarks/benchmark.py --shapes mesh nested --tasks 1000 10000 --output results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from generator import SHAPES, writeProject
+from mycelium.Project import Project
+from mycelium.Dag import DagFormat
+
+
+BENCHMARKS = ("load", "load_cached", "serialize_json", "serialize_jsonl", "execute_thread", "execute_asyncio")
+
+
+def _time(run, setup=None)->float:
+
+    state = setup() if setup else None
+    start = time.perf_counter()
+    run(state)
+    return time.perf_counter() - start
+
+
+def _serialize(project:Project, format:DagFormat, compact:bool):
+
+    with open(os.devnull, "w") as f:
+        project.writeDag(f, format, compact=compact)
+
+
+def _runs(directory:str)->dict:
+    """The benchmark callables, each takes the project returned by its setup."""
+
+    def load(cache:bool):
+        return lambda: Project(directory, useCache=cache, cachePath=os.path.join(directory, ".mycelium", "project.cache"))
+
+    return {
+        "load": (lambda p: load(False)(), None),
+        "load_cached": (lambda p: load(True)(), None),
+        "serialize_json": (lambda p: _serialize(p, DagFormat.JSON, False), load(True)),
+        "serialize_jsonl": (lambda p: _serialize(p, DagFormat.JSONL, True), load(True)),
+        "execute_thread": (lambda p: p.execute(engine="THREAD", history=False), load(True)),
+        "execute_asyncio": (lambda p: p.execute(engine="ASYNCIO", history=False), load(True))
+    }
+
+
+def benchmark(shape:str, tasks:int, width:int=10, repeat:int=3, benchmarks:list=BENCHMARKS)->list:
+    """Time each benchmark repeat times on a generated project and return a result per benchmark."""
+
+    directory = tempfile.mkdtemp()
+    try:
+        writeProject(directory, shape, tasks, width)
+        path = os.path.join(directory, "")
+        runs = _runs(path)
+
+        # populate the compiled project cache and count the edges
+        project = Project(path, useCache=True, cachePath=os.path.join(path, ".mycelium", "project.cache"))
+        edges = sum(len(t.dependencies) for t in [*project.dag.values(), *project.barriers.values()])
+
+        results = []
+        for b in benchmarks:
+            run, setup = runs[b]
+            seconds = [_time(run, setup) for i in range(repeat)]
+            results.append({
+                "benchmark": b,
+                "shape": shape,
+                "tasks": tasks,
+                "width": width,
+                "edges": edges,
+                "barriers": len(project.barriers),
+                "seconds": seconds,
+                "min": min(seconds),
+                "median": statistics.median(seconds),
+                "usPerTask": min(seconds) / tasks * 1e6
+            })
+
+        return results
+
+    finally:
+        shutil.rmtree(directory)
+
+
+def _revision()->str:
+
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args:list=None)->dict:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--tasks", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--output", help="write the results to this json file instead of stdout")
+    options = parser.parse_args(args)
+
+    report = {
+        "revision": _revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": []
+    }
+
+    for shape in options.shapes:
+        for tasks in options.tasks:
+            for r in benchmark(shape, tasks, options.width, options.repeat, options.benchmarks):
+                report["results"].append(r)
+                print(f"{r['benchmark']:<16} shape={shape:<8} tasks={tasks:<7} min={r['min']:.3f}s us_per_task={r['usPerTask']:.1f}", file=sys.stderr)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        json.dump(report, sys.stdout, indent=4)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Synthetic project generator.
+
+Writes a mycelium.yaml project with pipelines, tasks and patterns files of a
+given shape and number of tasks:
+
+    fanout   one task group of every task hanging off the pipeline origin
+    chain    a single deep chain, each task depends on the one before
+    mesh     groups of width tasks, each group depends on the previous group
+    diamond  layers alternating one task and width tasks, each layer depends
+             on the previous one with alternating AND and OR dependencies
+    nested   a binary tree of task groups with leaf groups of width tasks,
+             the second group of each pair depends on the first alternating
+             AND and OR dependencies with success and completion conditions
+
+    python benchmarks/generator.py ./projects/ mesh 10000
+"""
+import os
+import sys
+import yaml
+
+
+SHAPES = ("fanout", "chain", "mesh", "diamond", "nested")
+PATTERNS = 100
+
+LOGGING = {
+    "version": 1,
+    "formatters": {"simple": {"format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"}},
+    "handlers": {"console": {"class": "logging.StreamHandler", "level": "WARNING", "formatter": "simple", "stream": "ext://sys.stderr"}},
+    "root": {"level": "WARNING", "handlers": ["console"]}
+}
+
+
+def _dependsOn(group:str, condition:str="success", operator:str="AND")->list:
+    return [{"task": group, "condition": condition, "operator": operator}]
+
+
+def _fanout(names:list, width:int)->list:
+    return [{"name": "fanout", "tasks": names}]
+
+
+def _chain(names:list, width:int)->list:
+    return [
+        {
+            "name": f"chain{i}",
+            "dependsOn": _dependsOn(names[i - 1]) if i else [],
+            "tasks": [n]
+        }
+        for i, n in enumerate(names)
+    ]
+
+
+def _mesh(names:list, width:int)->list:
+    return [
+        {
+            "name": f"mesh{g}",
+            "dependsOn": _dependsOn(f"mesh{g - 1}") if g else [],
+            "tasks": names[i:i + width]
+        }
+        for g, i in enumerate(range(0, len(names), width))
+    ]
+
+
+def _diamond(names:list, width:int)->list:
+
+    groups = []
+    i = 0
+    while i < len(names):
+        size = 1 if len(groups) % 2 == 0 else width
+        layer = len(groups)
+        groups.append({
+            "name": f"diamond{layer}",
+            # every other join is met by any of the tasks of the fork
+            "dependsOn": _dependsOn(f"diamond{layer - 1}", "completion" if layer % 4 == 2 else "success", "OR" if layer % 4 == 2 else "AND") if layer else [],
+            "tasks": names[i:i + size]
+        })
+        i += size
+
+    return groups
+
+
+def _nested(names:list, width:int)->list:
+
+    def nest(name:str, chunks:list, depth:int)->dict:
+        if len(chunks) == 1:
+            return {"name": name, "tasks": chunks[0]}
+
+        half = len(chunks) // 2
+        first = nest(f"{name}_0", chunks[:half], depth + 1)
+        second = nest(f"{name}_1", chunks[half:], depth + 1)
+        second["dependsOn"] = _dependsOn(
+            first["name"],
+            "success" if depth % 2 == 0 else "completion",
+            "AND" if depth % 2 == 0 else "OR")
+
+        return {"name": name, "tasks": [first, second]}
+
+    chunks = [names[i:i + width] for i in range(0, len(names), width)]
+    return [nest("nested", chunks, 0)]
+
+
+def writeProject(directory:str, shape:str, tasks:int, width:int=10, taskType:str="noOp")->str:
+    """Write a project of the shape with the number of tasks and return its directory path.
+
+    Tasks are noOp tasks by default so executing the project only costs the scheduling.
+    Every task references one of the patterns so loading also stitches patterns.
+    """
+
+    if shape not in SHAPES:
+        raise Exception(f"Unknown project shape {shape}, the shapes are {', '.join(SHAPES)}.")
+
+    names = [f"task{t}" for t in range(tasks)]
+    pipeline = globals()[f"_{shape}"](names, width)
+
+    if taskType == "noOp":
+        patterns = [{"name": f"pattern{p}", "priority": p % 3} for p in range(PATTERNS)]
+    else:
+        patterns = [{"name": f"pattern{p}", "path": "./", "timeout": 3600} for p in range(PATTERNS)]
+
+    files = {
+        "logging.yaml": LOGGING,
+        "mycelium.yaml": {
+            "version": "sibytes.io/mycelium/project/api/0.1.0",
+            "project": {
+                "name": shape,
+                "directory": f"./{shape}/",
+                "pipelines": ["./pipelines.yaml"],
+                "tasks": ["./tasks.yaml"],
+                "patterns": ["./patterns.yaml"]
+            }
+        },
+        f"{shape}/patterns.yaml": {
+            "version": "sibytes.io/mycelium/pattern/api/0.1.0",
+            "patterns": patterns
+        },
+        f"{shape}/tasks.yaml": {
+            "version": "sibytes.io/mycelium/task/api/0.1.0",
+            "tasks": [
+                {"type": taskType, "name": n, "pattern": f"pattern{t % PATTERNS}"}
+                for t, n in enumerate(names)
+            ]
+        },
+        f"{shape}/pipelines.yaml": {
+            "version": "sibytes.io/mycelium/pipeline/api/0.1.0",
+            "maxParallel": 4,
+            "pipelines": [{"name": shape, "tasks": pipeline}]
+        }
+    }
+
+    os.makedirs(os.path.join(directory, shape), exist_ok=True)
+    for name, content in files.items():
+        with open(os.path.join(directory, name), "w") as f:
+            yaml.dump(content, f, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper), sort_keys=False)
+
+    return os.path.join(directory, "")
+
+
+if __name__ == "__main__":
+
+    directory, shape, tasks = sys.argv[1:4]
+    print(writeProject(directory, shape, int(tasks), *[int(a) for a in sys.argv[4:5]]))
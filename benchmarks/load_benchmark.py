@@ -0,0 +1,37 @@
+"""Project load time benchmark.
+
+Writes projects of task groups that each depend on the previous group and
+times loading them without the compiled project cache. The time per task
+should stay flat as the number of tasks grows.
+
+    python benchmarks/load_benchmark.py 1000 10000 100000
+"""
+import os
+import sys
+import time
+import tempfile
+import shutil
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from generator import writeProject
+from mycelium.Project import Project
+
+
+def benchmark(tasks:int)->float:
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = writeProject(directory, "mesh", tasks, taskType="databricksNotebook")
+        start = time.perf_counter()
+        Project(path, useCache=False)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+
+    os.environ.setdefault("MYCELIUMLOGGINGQUEUE", "True")
+    for tasks in [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]:
+        seconds = benchmark(tasks)
+        print(f"tasks={tasks} seconds={seconds:.3f} us_per_task={seconds / tasks * 1e6:.1f}")
@@ -11,7 +11,7 @@ with open("./taskDag.yaml", "w") as f:
     f.writelines(project.getDag(DagFormat.YAML))
 
 with open("./taskDag.json", "w") as f:
-    f.writelines(project.getDag(DagFormat.JSON))
+    project.writeDag(f, DagFormat.JSON)
 
 project.execute()
 
@@ -0,0 +1,191 @@
+import sys
+from array import array
+from .Task import Task, TaskStatus
+from .Dependency import Dependency
+from .DependencyStatus import DependencyCondition, DependencyOperator
+
+
+def taskState(task:Task, exclude:tuple=())->dict:
+    """The attributes of a task whether they're held in slots or a __dict__."""
+
+    state = dict()
+    for cls in reversed(type(task).__mro__):
+        slots = cls.__dict__.get("__slots__", ())
+        for s in (slots,) if isinstance(slots, str) else slots:
+            if s not in exclude and s != "__dict__" and hasattr(task, s):
+                state[s] = getattr(task, s)
+
+    state.update({k: v for k, v in getattr(task, "__dict__", {}).items() if k not in exclude})
+    return state
+
+
+class CompactTaskView:
+    """Keeps the status and edges of a task in a CompactDag.
+
+    Mixed into the class of each task so the task keeps its behaviour while its status
+    is a byte in the graph's status array and its dependencies and dependents are
+    materialized from the graph's adjacency arrays when they're asked for. The class
+    of the task is kept as taskClass on the view class.
+    """
+
+    __slots__ = ()
+    taskClass = None
+
+    @property
+    def status(self)->TaskStatus:
+        return TaskStatus(self._graph.status[self._id])
+
+
+    @status.setter
+    def status(self, value:TaskStatus):
+        self._graph.status[self._id] = value.value
+
+
+    @property
+    def dependencies(self)->list:
+        return self._graph.dependencies(self._id)
+
+
+    @dependencies.setter
+    def dependencies(self, value:list):
+        raise Exception(f"The dependencies of compact task {self.name} are read only.")
+
+
+    @property
+    def dependents(self)->list:
+        return self._graph.dependents(self._id)
+
+
+    @dependents.setter
+    def dependents(self, value:list):
+        raise Exception(f"The dependents of compact task {self.name} are read only.")
+
+
+    @property
+    def edges(self)->"CompactEdges":
+        """The edges leaving the task read from the graph's arrays, see CompactEdges."""
+
+        return CompactEdges(self._graph, self._id)
+
+
+    @property
+    def dependencyOperators(self)->array:
+        """The operator values of the task's dependencies."""
+
+        graph = self._graph
+        return graph.dependencyOperators[graph.dependencyOffsets[self._id]:graph.dependencyOffsets[self._id + 1]]
+
+
+class CompactEdges:
+    """The edges leaving a task of a CompactDag.
+
+    Iterates (dependent, condition, operator) of each dependency on the task, in the
+    order of its dependents, from the graph's arrays so a scheduler can walk the edges
+    without materializing Dependency objects.
+    """
+
+    __slots__ = ("_graph", "_id")
+
+    def __init__(self, graph:"CompactDag", taskId:int):
+
+        self._graph = graph
+        self._id = taskId
+
+
+    def __iter__(self):
+
+        graph = self._graph
+        for i in range(graph.dependentOffsets[self._id], graph.dependentOffsets[self._id + 1]):
+            edge = graph.dependentEdges[i]
+            if edge >= 0:
+                yield graph.nodes[graph.dependentTargets[i]], \
+                    DependencyCondition(graph.dependencyConditions[edge]), \
+                    DependencyOperator(graph.dependencyOperators[edge])
+
+
+class CompactDag:
+    """A compact, array backed representation of a dag.
+
+    Each task has an integer id, the index of its record in nodes. Dependencies and
+    dependents are held as compressed sparse row arrays, the edges of task i are
+    targets[offsets[i]:offsets[i+1]], dependency conditions and operators are held as
+    enum values in parallel byte arrays and task statuses in a byte array. Each dependent
+    edge holds the index of the matching dependency edge, or -1 when there isn't one. Task records
+    use __slots__ so the graph holds no per-task dictionaries or lists.
+    """
+
+    _viewClasses = dict()
+
+    def __init__(self, tasks:list):
+
+        ids = {id(t): i for i, t in enumerate(tasks)}
+
+        self.dependencyOffsets = array("q", [0])
+        self.dependencyTargets = array("q")
+        self.dependencyConditions = array("b")
+        self.dependencyOperators = array("b")
+        self.dependentOffsets = array("q", [0])
+        self.dependentTargets = array("q")
+        self.dependentEdges = array("q")
+        self.status = bytearray(t.status.value for t in tasks)
+
+        # (task id, dependent id) -> index of the dependency edge
+        edges = dict()
+        for i, t in enumerate(tasks):
+            for d in t.dependencies:
+                edges.setdefault((ids[id(d.task)], i), len(self.dependencyTargets))
+                self.dependencyTargets.append(ids[id(d.task)])
+                self.dependencyConditions.append(d.condition.value)
+                self.dependencyOperators.append(d.operator.value)
+            self.dependencyOffsets.append(len(self.dependencyTargets))
+
+        for i, t in enumerate(tasks):
+            for d in t.dependents:
+                self.dependentTargets.append(ids[id(d)])
+                self.dependentEdges.append(edges.get((i, ids[id(d)]), -1))
+            self.dependentOffsets.append(len(self.dependentTargets))
+
+        self.nodes = [self._view(t, i) for i, t in enumerate(tasks)]
+
+
+    @classmethod
+    def _viewClass(cls, taskClass:type)->type:
+
+        viewClass = cls._viewClasses.get(taskClass)
+        if not viewClass:
+            viewClass = type(f"Compact{taskClass.__name__}", (CompactTaskView, taskClass), {"__slots__": ("_graph", "_id"), "taskClass": taskClass})
+            cls._viewClasses[taskClass] = viewClass
+
+        return viewClass
+
+
+    def _view(self, task:Task, taskId:int)->Task:
+
+        viewClass = self._viewClass(task.__class__)
+        view = viewClass.__new__(viewClass)
+        for k, v in taskState(task, ("_status", "_dependencies", "_dependents")).items():
+            # attributes such as the type and path repeat across many tasks
+            object.__setattr__(view, k, sys.intern(v) if type(v) is str else v)
+        view._graph = self
+        view._id = taskId
+
+        return view
+
+
+    def dependencies(self, taskId:int)->list:
+
+        return [
+            Dependency(
+                self.nodes[self.dependencyTargets[i]],
+                DependencyCondition(self.dependencyConditions[i]).name,
+                DependencyOperator(self.dependencyOperators[i]).name)
+            for i in range(self.dependencyOffsets[taskId], self.dependencyOffsets[taskId + 1])
+        ]
+
+
+    def dependents(self, taskId:int)->list:
+
+        return [
+            self.nodes[self.dependentTargets[i]]
+            for i in range(self.dependentOffsets[taskId], self.dependentOffsets[taskId + 1])
+        ]
@@ -1,8 +1,14 @@
-from .Task import Task, PipelineOrigin
+from .Task import Task, PipelineOrigin, TaskGroupBarrier, poolClaims
 from .Dependency import Dependency
+from .DependencyStatus import DependencyCondition
+from .CompactDag import CompactDag, taskState
 import json
 import yaml
+import io
+import itertools
+from collections import deque
 from enum import Enum
+from . import Logging
 
 class DagFormat(Enum):
     # for type safe programming
@@ -13,6 +19,8 @@ class DagFormat(Enum):
     JSON = 3
     # human readable
     YAML = 4
+    # streaming friendly, a task per line
+    JSONL = 5
 
 
 class Dag:
@@ -40,8 +48,9 @@ class Dag:
             taskLookup[task.name] = task
 
         # create a lookup of tasks by group name
-        # we need this to easily add dependecies
-        taskGroupLookup = {projectName: []}
+        # we need this to easily add dependecies, each group is an
+        # insertion ordered dictionary used as a set of its tasks.
+        taskGroupLookup = {projectName: dict()}
         groupKeys = [projectName]
         if pipelines and pipelines["pipelines"]:
             self._indexTaskGroups(groupKeys, pipelines["pipelines"], taskLookup, taskGroupLookup)
@@ -50,17 +59,109 @@ class Dag:
         self.dag = dict()
         self.dag[self.name] = taskLookup[self.name]
 
+        # task group barriers by group name, condition and operator
+        # these are virtual nodes so aren't part of the dag dictionary
+        self.barriers = dict()
+        self.graph:CompactDag = None
+        # slots of the implicit pool of each task group with a maxParallel limit
+        self.groupLimits = dict()
+
         # if has pipelines then recurse them for tasks
         if pipelines and pipelines["pipelines"]:
             self._addTasks(pipelines["pipelines"], taskLookup, taskGroupLookup, self.dag)
 
+        # task names by group name used to select groups as targets
+        self.taskGroups = {
+            g: [t.name for t in groupTasks]
+            for g, groupTasks in taskGroupLookup.items() if g != projectName
+        }
+
+        self._validateDag()
+
+
+    def _validateDag(self):
+        """Check the dag in a single O(V+E) pass and store its topological order.
+
+        Kahn's algorithm from the origin puts every task and barrier after its
+        dependencies in order and numbers it in levels with the length of the
+        longest path from the origin. Nodes that are never ordered are on a cycle,
+        which raises naming the cycle, or depend on a cycle or on a task that isn't
+        in any pipeline. Those can't be reached from the origin, they are logged
+        and listed in unreachable because they'd never run.
+        """
+
+        origin = self.getDagOrigin()
+        nodes = [*self.dag.values(), *self.barriers.values()]
+        unmet = {t: len(t.dependencies) for t in nodes}
+
+        self.order = []
+        self.levels = {origin.name: 0}
+        ready = deque([origin])
+        while ready:
+            task = ready.popleft()
+            self.order.append(task)
+            level = self.levels[task.name] + 1
+            for t in task.dependents:
+                if self.levels.get(t.name, 0) < level:
+                    self.levels[t.name] = level
+                unmet[t] -= 1
+                if unmet[t] == 0:
+                    ready.append(t)
+
+        if len(self.order) == len(nodes):
+            self.unreachable = []
+            return
+
+        ordered = set(self.order)
+        remaining = [t for t in nodes if t not in ordered]
+        cycle = self._findCycle(remaining, unmet)
+        if cycle:
+            raise Exception(f"The dag has a cycle: {' -> '.join(t.name for t in cycle)}.")
+
+        self.unreachable = [t.name for t in remaining]
+        for t in remaining:
+            self.levels.pop(t.name, None)
+
+        logger = Logging.getLogger(self.name)
+        logger.warning(f"Tasks unreachable from the pipeline origin that will never run: {', '.join(self.unreachable)}")
+
+
+    def _findCycle(self, remaining:list, unmet:dict)->list:
+        """Find a cycle among the unordered nodes by an iterative depth first walk of their dependencies."""
+
+        # nodes on the path of the walk by their position in it, and nodes with no cycle behind them
+        path = dict()
+        cleared = set()
+        for root in remaining:
+            if root in cleared:
+                continue
+
+            stack = [(root, iter(root.dependencies))]
+            path[root] = 0
+            while stack:
+                task, dependencies = stack[-1]
+                for d in dependencies:
+                    t = d.task
+                    if t in path:
+                        cycle = list(path)[path[t]:]
+                        return [*cycle, t]
+                    if unmet.get(t) and t not in cleared:
+                        path[t] = len(path)
+                        stack.append((t, iter(t.dependencies)))
+                        break
+                else:
+                    stack.pop()
+                    del path[task]
+                    cleared.add(task)
+
+        return None
+
 
     def _addTasksToGroupLkp(self, taskName:str, groupKeys:list, tasks:dict, taskGroupLookup:dict):
 
         for k in groupKeys:
             try:
-                if not tasks[taskName] in taskGroupLookup[k]:
-                    taskGroupLookup[k].append(tasks[taskName])
+                taskGroupLookup[k][tasks[taskName]] = None
             except KeyError:
                 # the tasks isn't in the tasks lookup
                 # ocam's razor, if it's not in the lookup then 
@@ -84,7 +185,7 @@ class Dag:
                 nextGroupKeys = groupKeys[:]
                 # create a new key and empty lists to append tasks
                 nextGroupKeys.append(t.get("name"))
-                taskGroupLookup[t.get("name")] = []
+                taskGroupLookup[t.get("name")] = dict()
                 # we're in a task group so we need to recurse down to find tasks.
                 self._indexTaskGroups(nextGroupKeys, t["tasks"], tasks, taskGroupLookup)
 
@@ -103,13 +204,19 @@ class Dag:
             return enabled 
 
 
-    def _addTasksToDag(self, taskName:str, tasks:dict, dag:dict, dependencies:list, enabled:bool):
+    def _addTasksToDag(self, taskName:str, tasks:dict, dag:dict, dependencies:list, enabled:bool, pools:dict=None):
 
         try:
             
             # add the properties and dependencies to the tasks
             tasks[taskName].enabled = enabled
 
+            # the task claims the pools of its groups as well as its own
+            if pools:
+                if not hasattr(type(tasks[taskName]), "pools"):
+                    raise Exception(f"Task {taskName} of type {tasks[taskName].type} can't claim the pools or maxParallel of its task group.")
+                tasks[taskName].pools = {**pools, **(tasks[taskName].pools or {})}
+
             if len(dependencies) == 0:
                 tasks[taskName].dependencies = [Dependency(tasks[self.name])]
             else:
@@ -144,16 +251,43 @@ class Dag:
                 if tasks.get(d["task"]):                            
                     grpDependencies.append(Dependency(tasks[d["task"]], d["condition"], d["operator"]))
                 
-                # if it's a group of tasks add all the tasks using the
-                # taskGroup index of tasks
+                # if it's a group of tasks depend on the barrier that
+                # joins all the tasks of the group
                 if taskGroups.get(d["task"]):
-                    for g in taskGroups[d["task"]]:
-                        grpDependencies.append(Dependency(g, d["condition"], d["operator"]))
+                    barrier = self._getBarrier(d["task"], taskGroups[d["task"]], d["condition"], d["operator"])
+                    grpDependencies.append(Dependency(barrier, DependencyCondition.SUCCESS.name, d["operator"]))
 
         return grpDependencies
 
 
-    def _addTasks(self, pipelineTasks:dict, tasks:dict, taskGroups:dict, dag:dict, dependencies:list=None, enabled:bool=True):
+    def _getBarrier(self, groupName:str, groupTasks:dict, condition:str, operator:str)->TaskGroupBarrier:
+        """Get or create the barrier on the tasks of a group for the condition and operator."""
+
+        name = f"{groupName}:{condition.upper()}:{operator.upper()}"
+        barrier = self.barriers.get(name)
+
+        if not barrier:
+            barrier = TaskGroupBarrier(name)
+            barrier.dependencies = [Dependency(g, condition, operator) for g in groupTasks]
+            for g in groupTasks:
+                g.dependents.append(barrier)
+            self.barriers[name] = barrier
+
+        return barrier
+
+
+    def _getGroupPools(self, group:dict, pools:dict)->dict:
+        """The pools claimed by the tasks of a group, a group maxParallel is a pool of its own."""
+
+        groupPools = {**(pools or {}), **(poolClaims(group.get("pools")) or {})}
+        if group.get("maxParallel"):
+            self.groupLimits[group["name"]] = int(group["maxParallel"])
+            groupPools[group["name"]] = 1
+
+        return groupPools or None
+
+
+    def _addTasks(self, pipelineTasks:dict, tasks:dict, taskGroups:dict, dag:dict, dependencies:list=None, enabled:bool=True, pools:dict=None):
 
         if not dependencies:
             dependencies = list()
@@ -162,7 +296,7 @@ class Dag:
         for t in pipelineTasks:
             # if it's a task add it to the dag
             if type(t) is str:
-                self._addTasksToDag(t, tasks, dag, dependencies, enabled)
+                self._addTasksToDag(t, tasks, dag, dependencies, enabled, pools)
 
             # if it's a task group recurse down to look for tasks
             elif t["tasks"]:
@@ -177,9 +311,12 @@ class Dag:
                 # not the previous sibling
                 grpDependencies:list = self._getDependencies(t, tasks, taskGroups, dependencies)
 
+                # resource pools claimed by the group are claimed by all of its tasks
+                grpPools = self._getGroupPools(t, pools)
+
                 # recurse down the hierarchy of task groups passing down the
-                # dependencies and enabled state.
-                self._addTasks(t["tasks"], tasks, taskGroups, dag, grpDependencies, tasksEnabled)
+                # dependencies, enabled state and pools.
+                self._addTasks(t["tasks"], tasks, taskGroups, dag, grpDependencies, tasksEnabled, grpPools)
 
             # if it's neither we have a problem huston!
             # yaml's will be validated when loaded so this shouldn't happen
@@ -188,13 +325,29 @@ class Dag:
                 raise Exception("Unexpected malformed pipeline. DAG nodes must be a task group with a tasks list or a task name as string.")
 
 
-    def _getDagDict(self, dag:dict):
+    def _toDict(self, task:Task, ids:dict=None, positions:dict=None)->dict:
+        """The dictionary of a task with its dependents in the order they were added to the dag.
+
+        The dependents behind a task group barrier are expanded where the barrier was
+        added so they're sorted back into the positions of the tasks in the dag.
+        """
+
+        taskDict = task.toDict(ids)
+        if ids is None and any(isinstance(d, TaskGroupBarrier) for d in task.dependents):
+            positions = positions or {name: i for i, name in enumerate(self.dag)}
+            taskDict["dependents"] = sorted(taskDict["dependents"], key=positions.__getitem__)
+
+        return taskDict
+
+
+    def _getDagDict(self, dag:dict, positions:dict=None):
+        positions = positions or {name: i for i, name in enumerate(self.dag)}
         tod = dict()
         for k, v in dag.items():
             if isinstance(v, dict):
-                tod[k] = self._getDagDict(v)
+                tod[k] = self._getDagDict(v, positions)
             elif isinstance(v, Task):
-                tod[k] = v.toDict()
+                tod[k] = self._toDict(v, positions=positions)
             elif isinstance(v, list):
                 tod[k] = [i.task.name for i in v]
         return tod
@@ -206,12 +359,174 @@ class Dag:
             return self.dag
         elif(format == DagFormat.DICT):
             return self._getDagDict(self.dag)
-        elif(format == DagFormat.JSON):
-            return json.dumps(self._getDagDict(self.dag), indent=indent)
+        elif(format in (DagFormat.JSON, DagFormat.JSONL)):
+            with io.StringIO() as f:
+                self.writeDag(f, format, indent)
+                return f.getvalue()
         elif(format == DagFormat.YAML):
             return yaml.dump(self._getDagDict(self.dag), indent=indent)
 
 
+    def writeDag(self, file, format:DagFormat=DagFormat.JSON, indent:int=4, compact:bool=False):
+        """Write the dag to a text file object a task at a time.
+
+        Only one task is serialized at once so the whole document is never held in memory.
+        JSON is the same document as getDag, JSONL writes a task object per line and YAML
+        writes a mapping entry per task in name order.
+
+        When compact the task group barriers are written as tasks and every task has
+        an integer id, dependents and dependencies reference tasks by id rather than
+        by embedding them.
+        """
+
+        ids = None
+        positions = {name: i for i, name in enumerate(self.dag)}
+        tasks = self.dag.values()
+        if compact:
+            tasks = itertools.chain(self.dag.values(), self.barriers.values())
+            ids = {t.name: i for i, t in enumerate(itertools.chain(self.dag.values(), self.barriers.values()))}
+
+        if format == DagFormat.JSON:
+            # nest each task the way json.dumps indents the whole document
+            pad = "" if indent is None else "\n" + " " * indent
+            separator = ", " if indent is None else ","
+            file.write("{")
+            for i, t in enumerate(tasks):
+                task = json.dumps(self._toDict(t, ids, positions), indent=indent)
+                if indent is not None:
+                    task = task.replace("\n", pad)
+                file.write(f"{separator if i else ''}{pad}{json.dumps(t.name)}: {task}")
+            file.write("}" if not self.dag or indent is None else "\n}")
+
+        elif format == DagFormat.JSONL:
+            for t in tasks:
+                file.write(json.dumps(self._toDict(t, ids, positions)))
+                file.write("\n")
+
+        elif format == DagFormat.YAML:
+            lookup = {**self.dag, **self.barriers} if compact else self.dag
+            for name in sorted(lookup):
+                file.write(yaml.dump({name: self._toDict(lookup[name], ids, positions)}, indent=indent))
+
+        else:
+            raise Exception(f"The dag can only be written as JSON, JSONL or YAML not {format.name}.")
+
+
+    def _compileDag(self)->dict:
+        """Flatten the dag into task states and index based edges.
+
+        Tasks are stored without their dependency and dependent lists so a
+        deep dag doesn't recurse when it's serialized, the edges are rebuilt
+        by _restoreDag in their original order.
+        """
+
+        nodes = [*self.dag.values(), *self.barriers.values()]
+        index = {t.name: i for i, t in enumerate(nodes)}
+        tasks = []
+        dependencies = []
+        dependents = []
+
+        for t in nodes:
+            state = taskState(t, ("_dependencies", "_dependents"))
+            tasks.append((t.__class__, state))
+            dependencies.append([
+                (index[d.task.name], d.condition.name, d.operator.name) for d in t.dependencies
+            ])
+            dependents.append([index[d.name] for d in t.dependents])
+
+        return {
+            "name": self.name,
+            "barriers": len(self.barriers),
+            "groupLimits": self.groupLimits,
+            "taskGroups": self.taskGroups,
+            "order": [index[t.name] for t in self.order],
+            "levels": self.levels,
+            "unreachable": self.unreachable,
+            "tasks": tasks,
+            "dependencies": dependencies,
+            "dependents": dependents
+        }
+
+
+    def _restoreDag(self, compiled:dict):
+
+        tasks = []
+        for cls, state in compiled["tasks"]:
+            task = cls.__new__(cls)
+            for k, v in state.items():
+                object.__setattr__(task, k, v)
+            tasks.append(task)
+
+        for task, dependencies, dependents in zip(tasks, compiled["dependencies"], compiled["dependents"]):
+            task.dependencies = [Dependency(tasks[i], c, o) for i, c, o in dependencies]
+            task.dependents = [tasks[i] for i in dependents]
+
+        # the barriers are the last nodes
+        dagTasks = len(tasks) - compiled["barriers"]
+        self.name = compiled["name"]
+        self.dag = {t.name: t for t in tasks[:dagTasks]}
+        self.barriers = {t.name: t for t in tasks[dagTasks:]}
+        self.groupLimits = compiled["groupLimits"]
+        self.taskGroups = compiled["taskGroups"]
+        self.order = [tasks[i] for i in compiled["order"]]
+        self.levels = compiled["levels"]
+        self.unreachable = compiled["unreachable"]
+        self.graph = None
+
+
+    def compact(self):
+        """Move the dag into a CompactDag.
+
+        The tasks in the dag and barriers are replaced by views over the compact graph
+        with the same names, types and behaviour.
+        """
+
+        nodes = [*self.dag.values(), *self.barriers.values()]
+        self.graph = CompactDag(nodes)
+
+        views = self.graph.nodes
+        index = {id(t): i for i, t in enumerate(nodes)}
+        self.order = [views[index[id(t)]] for t in self.order]
+        self.dag = {t.name: t for t in views[:len(self.dag)]}
+        self.barriers = {t.name: t for t in views[len(self.dag):]}
+
+
+    def closure(self, targets:list, downstream:bool=False)->list:
+        """The tasks and barriers the targets depend on, directly or transitively, and the targets.
+
+        Targets are task or task group names, a group stands for all of its tasks. With
+        downstream the tasks that depend on the targets are included as well. Only the
+        edges reachable from the targets are walked. The origin isn't included.
+        """
+
+        start = []
+        for name in targets:
+            if name in self.taskGroups:
+                start.extend(self.dag[t] for t in self.taskGroups[name])
+            elif name in self.dag and name != self.name:
+                start.append(self.dag[name])
+            else:
+                raise Exception(f"Target {name} is not found in the tasks or task groups.")
+
+        origin = self.getDagOrigin()
+        selected = dict.fromkeys(start)
+        walks = [lambda t: [d.task for d in t.dependencies]]
+        if downstream:
+            walks.append(lambda t: t.dependents)
+
+        for walk in walks:
+            pending = list(start)
+            visited = set(start)
+            while pending:
+                for t in walk(pending.pop()):
+                    if t not in visited and t is not origin:
+                        visited.add(t)
+                        selected[t] = None
+                        pending.append(t)
+
+        return list(selected)
+
+
     def getDagOrigin(self):
 
         return self.dag[self.name]
@@ -0,0 +1,318 @@
+import http.client
+import threading
+import json
+import os
+import base64
+import time
+from queue import LifoQueue, Empty, Full
+from concurrent.futures import Future
+from urllib.parse import urlsplit, urlencode
+from . import Logging
+
+
+class DatabricksApiError(Exception):
+
+    def __init__(self, status:int, message:str):
+        super().__init__(f"Databricks API request failed with status {status}: {message}")
+        self.status = status
+
+
+class HttpSession:
+    """A pool of keep-alive HTTP connections to a single host.
+
+    Connections are reused across threads so that submitting and polling
+    many runs doesn't open a new TLS connection per request.
+    """
+
+    def __init__(self, host:str, headers:dict=None, poolSize:int=8, timeout:float=60):
+
+        url = urlsplit(host)
+        self._https = url.scheme == "https"
+        self._netloc = url.netloc
+        self._headers = headers or dict()
+        self._timeout = timeout
+        self._pool = LifoQueue(poolSize)
+
+
+    def _newConnection(self)->http.client.HTTPConnection:
+
+        if self._https:
+            return http.client.HTTPSConnection(self._netloc, timeout=self._timeout)
+        else:
+            return http.client.HTTPConnection(self._netloc, timeout=self._timeout)
+
+
+    def _release(self, connection:http.client.HTTPConnection):
+
+        try:
+            self._pool.put_nowait(connection)
+        except Full:
+            connection.close()
+
+
+    def _send(self, connection:http.client.HTTPConnection, method:str, path:str, payload:bytes, headers:dict):
+
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        return response, response.read()
+
+
+    def request(self, method:str, path:str, body:dict=None):
+        """Send a request and return the status, headers and decoded json body."""
+
+        headers = {**self._headers, "Content-Type": "application/json"}
+        payload = json.dumps(body).encode() if body is not None else None
+
+        try:
+            connection = self._pool.get_nowait()
+            pooled = True
+        except Empty:
+            connection = self._newConnection()
+            pooled = False
+
+        try:
+            try:
+                response, data = self._send(connection, method, path, payload, headers)
+            except (http.client.HTTPException, ConnectionError):
+                if not pooled:
+                    raise
+                # the server closed the idle keep-alive connection so send again on a
+                # fresh one, run submissions carry an idempotency token for this
+                connection.close()
+                connection = self._newConnection()
+                response, data = self._send(connection, method, path, payload, headers)
+
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        return response.status, response.headers, json.loads(data) if data else dict()
+
+
+    def close(self):
+
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class DatabricksApi:
+    """Minimal client for the Databricks Jobs runs API."""
+
+    TERMINAL_STATES = ("TERMINATED", "SKIPPED", "INTERNAL_ERROR")
+
+    def __init__(self, host:str=None, token:str=None, maxRetries:int=5, backoff:float=1.0, poolSize:int=8):
+
+        self.host = host or os.getenv("DATABRICKS_API_HOST")
+        token = token or os.getenv("DBUTILSTOKEN")
+        if not self.host:
+            raise Exception("The Databricks workspace host is not set, set DATABRICKS_API_HOST.")
+
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self._session = HttpSession(self.host, {"Authorization": f"Bearer {token}"}, poolSize)
+        self._logger = Logging.getLogger(__name__)
+
+
+    def _request(self, method:str, path:str, body:dict=None, query:dict=None)->dict:
+        """Call the api backing off when the workspace rate limits with a 429."""
+
+        if query:
+            path = f"{path}?{urlencode(query)}"
+
+        for attempt in range(self.maxRetries + 1):
+            status, headers, data = self._session.request(method, path, body)
+
+            if status == 429 and attempt < self.maxRetries:
+                retryAfter = headers.get("Retry-After")
+                wait = float(retryAfter) if retryAfter else self.backoff * 2 ** attempt
+                self._logger.warning(f"Rate limited by {self.host}, retrying {path} in {wait}s")
+                time.sleep(wait)
+
+            elif status >= 400:
+                raise DatabricksApiError(status, data.get("message", str(data)))
+
+            else:
+                return data
+
+
+    def submitRun(self, run:dict)->int:
+        return self._request("POST", "/api/2.1/jobs/runs/submit", run)["run_id"]
+
+
+    def getRun(self, runId:int)->dict:
+        return self._request("GET", "/api/2.1/jobs/runs/get", query={"run_id": runId})
+
+
+    def cancelRun(self, runId:int):
+        self._request("POST", "/api/2.1/jobs/runs/cancel", {"run_id": runId})
+
+
+    def exportNotebook(self, path:str)->bytes:
+        """The source of a workspace notebook."""
+
+        content = self._request("GET", "/api/2.0/workspace/export", query={"path": path, "format": "SOURCE"})
+        return base64.b64decode(content.get("content", ""))
+
+
+    def listActiveRuns(self)->set:
+        """Return the ids of all the active submitted runs, a page at a time."""
+
+        active = set()
+        offset = 0
+        while True:
+            page = self._request("GET", "/api/2.1/jobs/runs/list", query={
+                "active_only": "true",
+                "run_type": "SUBMIT_RUN",
+                "limit": 25,
+                "offset": offset
+            })
+            runs = page.get("runs", [])
+            active.update(r["run_id"] for r in runs)
+            offset += len(runs)
+            if not page.get("has_more") or not runs:
+                return active
+
+
+    def close(self):
+        self._session.close()
+
+
+class RunPoller:
+    """A single thread that polls the state of every in-flight run on one interval.
+
+    Each poll lists the active runs a page at a time and only gets the runs
+    that have dropped out of the active list, so the number of requests
+    depends on the number of pages and finished runs, not on the number of
+    tasks waiting.
+    """
+
+    def __init__(self, api:DatabricksApi, interval:float=10):
+
+        self.api = api
+        self.interval = interval
+        self._runs = dict()
+        self._cancels = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._logger = Logging.getLogger(__name__)
+
+
+    def watch(self, runId:int)->Future:
+        """Return a future that resolves to the run when it reaches a terminal state."""
+
+        future = Future()
+        with self._lock:
+            self._runs[runId] = future
+            if not self._thread:
+                self._thread = threading.Thread(target=self._poll, name="RunPoller", daemon=True)
+                self._thread.start()
+
+        self._wake.set()
+        return future
+
+
+    def cancel(self, runId:int, exception:Exception):
+        """Fail the future of a run with the exception and cancel the run on the next poll."""
+
+        with self._lock:
+            self._cancels.add(runId)
+
+        self._resolve(runId, exception=exception)
+        self._wake.set()
+
+
+    def _poll(self):
+
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+
+            try:
+                self.pollOnce()
+            except Exception as e:
+                self._logger.warning(f"Polling Databricks runs failed: {e}")
+
+            with self._lock:
+                if not self._runs and not self._cancels:
+                    self._wake.clear()
+
+
+    def pollOnce(self):
+
+        with self._lock:
+            runIds = list(self._runs)
+            cancels = self._cancels
+            self._cancels = set()
+
+        for runId in cancels:
+            try:
+                self.api.cancelRun(runId)
+            except DatabricksApiError as e:
+                self._logger.warning(f"Failed cancelling Databricks run {runId}: {e}")
+
+        if not runIds:
+            return
+
+        active = self.api.listActiveRuns()
+
+        for runId in runIds:
+            if runId in active:
+                continue
+
+            try:
+                run = self.api.getRun(runId)
+            except DatabricksApiError as e:
+                self._resolve(runId, exception=e)
+                continue
+
+            if run["state"]["life_cycle_state"] in DatabricksApi.TERMINAL_STATES:
+                self._resolve(runId, run)
+
+
+    def _resolve(self, runId:int, run:dict=None, exception:Exception=None):
+
+        with self._lock:
+            future = self._runs.pop(runId, None)
+
+        if future and exception:
+            future.set_exception(exception)
+        elif future:
+            future.set_result(run)
+
+
+_pollerLock = threading.Lock()
+_poller:RunPoller = None
+
+
+def getPoller()->RunPoller:
+    """Get the process wide run poller, created on first use from the environment."""
+    global _poller
+
+    with _pollerLock:
+        if not _poller:
+            interval = float(os.getenv("DATABRICKS_POLL_INTERVAL", "10"))
+            _poller = RunPoller(DatabricksApi(), interval)
+
+    return _poller
+
+
+def getApi()->DatabricksApi:
+    """Get the api client of the process wide run poller."""
+
+    return getPoller().api
+
+
+def resetPoller():
+    """Drop the process wide run poller so the next one is created from the environment."""
+    global _poller
+
+    with _pollerLock:
+        if _poller:
+            _poller.api.close()
+        _poller = None
@@ -1,9 +1,11 @@
-from .Task import Task, TaskStatus
+from .Task import Task, TaskStatus, TaskGroupBarrier
 from .DependencyStatus import *
 
 
 class Dependency:
 
+    __slots__ = ("operator", "condition", "task")
+
     def __init__(self, task:Task, 
         condition:str=DependencyCondition.COMPLETION.name, 
         operator:str=DependencyOperator.OR.name):
@@ -20,27 +22,38 @@ class Dependency:
         }
 
 
+    def expand(self)->list:
+        """The dependencies on tasks that this dependency stands for.
+
+        A dependency on a task group barrier stands for the dependencies of the barrier
+        on each of the group's tasks.
+        """
+
+        if isinstance(self.task, TaskGroupBarrier):
+            return [e for d in self.task.dependencies for e in d.expand()]
+
+        return [self]
+
+
     def isReady(self)->bool:
 
-        if self.task.status.value < TaskStatus.SUCEEDED.value:
-            return False
+        return isMet(self.condition, self.task.status)
+
 
-        elif self.task.status.value >= TaskStatus.SUCEEDED.value and \
-        self.condition == DependencyCondition.COMPLETION:
-            
-            return True
+def isMet(condition:DependencyCondition, status:TaskStatus)->bool:
+    """Whether a dependency with the condition is met by the status of its task."""
 
-        elif self.task.status == TaskStatus.SUCEEDED and \
-        self.condition == DependencyCondition.SUCCESS:
+    if status.value < TaskStatus.SUCEEDED.value:
+        return False
 
-           return True
+    elif condition == DependencyCondition.COMPLETION:
+        return True
 
-        elif self.task.status == TaskStatus.FAILED and \
-        self.condition == DependencyCondition.FAILURE:
+    elif status == TaskStatus.SUCEEDED and condition == DependencyCondition.SUCCESS:
+        return True
 
-           return True
-           
-        else:
-            return False
-        
+    elif status == TaskStatus.FAILED and condition == DependencyCondition.FAILURE:
+        return True
 
+    else:
+        return False
@@ -0,0 +1,339 @@
+"""Execute project tasks on worker processes and hosts.
+
+The coordinator keeps the dag and the scheduler, runnable tasks are sent to
+workers over a transport and each worker reports the result of its tasks back.
+A transport connects the coordinator to its workers, any object with a connect
+method returning connections that send and recv python objects will do:
+
+    ProcessTransport  worker processes on this machine connected by pipes
+    TcpTransport      worker servers on other hosts connected over TCP
+
+Start a TCP worker server on a host with the shared MYCELIUMWORKERKEY set:
+
+    python -m mycelium.Distributed --listen 0.0.0.0:7100 --slots 8
+"""
+import argparse
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from .Task import Task, TaskStatus
+from .CompactDag import CompactTaskView, taskState
+from . import Logging
+
+
+# attributes of a task that are the dag or the scheduling state, they aren't sent to workers
+_EXCLUDE = ("_status", "_dependencies", "_dependents", "_graph", "_id")
+
+
+def _address(address:str)->tuple:
+
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def _taskRecord(task:Task)->tuple:
+    """The class and attributes to rebuild a task in a worker without its dag."""
+
+    cls = type(task)
+    if isinstance(task, CompactTaskView):
+        cls = cls.taskClass
+
+    return cls, taskState(task, _EXCLUDE)
+
+
+def serve(connection, slots:int=1):
+    """Execute the tasks sent over a connection until it's closed, slots tasks at once.
+
+    Each task is rebuilt from its record, executed and its status and attributes
+    are sent back with the result of the execution.
+    """
+
+    logger = Logging.getLogger(f"{__name__}.{os.getpid()}")
+    sendLock = threading.Lock()
+    running = dict()
+
+    def reply(*message):
+        with sendLock:
+            connection.send(message)
+
+    def execute(taskId:int, cls:type, state:dict):
+
+        task = cls.__new__(cls)
+        for k, v in state.items():
+            object.__setattr__(task, k, v)
+        task.status = TaskStatus.QUEUED
+        task.dependencies = []
+        task.dependents = []
+        running[taskId] = task
+
+        try:
+            result = task.execute()
+            reply("result", taskId, task.status.name, taskState(task, _EXCLUDE), result)
+
+        except Exception as e:
+            logger.warning(f"Failed Executing {cls.__name__}: {task.name}, {e}")
+            reply("result", taskId, TaskStatus.FAILED.name, dict(), dict())
+
+        finally:
+            running.pop(taskId, None)
+
+    with ThreadPoolExecutor(slots) as pool:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+
+            if message[0] == "execute":
+                pool.submit(execute, *message[1:])
+
+            elif message[0] == "cancel":
+                task = running.get(message[1])
+                if task:
+                    task.cancel()
+
+            elif message[0] == "stop":
+                break
+
+    connection.close()
+
+
+def listen(address:str, slots:int=1, authkey:bytes=None):
+    """Serve the coordinators that connect to the address, each on its own thread."""
+
+    authkey = authkey or os.getenv("MYCELIUMWORKERKEY", "").encode()
+    if not authkey:
+        raise Exception("The worker key is not set, set MYCELIUMWORKERKEY.")
+
+    logger = Logging.getLogger(__name__)
+    with multiprocessing.connection.Listener(_address(address), authkey=authkey) as listener:
+        logger.info(f"Listening for coordinators on {address} with {slots} slots")
+        while True:
+            try:
+                connection = listener.accept()
+            except (multiprocessing.AuthenticationError, OSError) as e:
+                logger.warning(f"Refused a coordinator connection: {e}")
+                continue
+
+            threading.Thread(target=serve, args=(connection, slots), daemon=True).start()
+
+
+class ProcessTransport:
+    """Worker processes on this machine each connected to the coordinator by a pipe."""
+
+    def __init__(self, processes:int=None, slots:int=1):
+
+        self.processes = processes or os.cpu_count() or 1
+        self.slots = slots
+        self._workers = list()
+
+
+    def connect(self)->list:
+
+        # spawned rather than forked from a process with running threads
+        context = multiprocessing.get_context("spawn")
+        connections = list()
+        for i in range(self.processes):
+            parent, child = context.Pipe()
+            process = context.Process(target=serve, args=(child, self.slots), name=f"MyceliumWorker-{i}", daemon=True)
+            process.start()
+            child.close()
+            self._workers.append(process)
+            connections.append(parent)
+
+        return connections
+
+
+    def close(self):
+
+        for p in self._workers:
+            p.join(5)
+            if p.is_alive():
+                p.terminate()
+        self._workers.clear()
+
+
+class TcpTransport:
+    """Worker servers connected to the coordinator over TCP, see listen.
+
+    The connections are authenticated with the shared key in the authkey parameter
+    or MYCELIUMWORKERKEY environment variable.
+    """
+
+    def __init__(self, addresses:list, authkey:bytes=None, timeout:float=30):
+
+        self.addresses = addresses
+        self.authkey = authkey or os.getenv("MYCELIUMWORKERKEY", "").encode()
+        self.timeout = timeout
+        if not self.authkey:
+            raise Exception("The worker key is not set, set MYCELIUMWORKERKEY.")
+
+
+    def _connect(self, address:str):
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return multiprocessing.connection.Client(_address(address), authkey=self.authkey)
+            except ConnectionRefusedError:
+                # the worker server may still be starting
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+
+    def connect(self)->list:
+        return [self._connect(a) for a in self.addresses]
+
+
+    def close(self):
+        pass
+
+
+class RemoteExecutor:
+    """Executes tasks on the workers of a transport.
+
+    Each task is sent to the connection with the fewest tasks in flight and the
+    calling thread waits for the result, a receiver thread per connection resolves
+    the results as the workers report them.
+    """
+
+    def __init__(self, transport):
+
+        self.transport = transport
+        self._connections = list()
+        self._inFlight = dict()
+        self._sendLocks = dict()
+        self._pending = dict()
+        self._taskIds = dict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._logger = Logging.getLogger(__name__)
+
+
+    def start(self):
+
+        if self._connections:
+            return
+
+        self._connections = self.transport.connect()
+        for c in self._connections:
+            self._inFlight[c] = 0
+            self._sendLocks[c] = threading.Lock()
+            threading.Thread(target=self._receive, args=(c,), name="RemoteExecutor", daemon=True).start()
+
+        self._logger.info(f"Connected to {len(self._connections)} workers")
+
+
+    def _send(self, connection, *message):
+
+        with self._sendLocks[connection]:
+            connection.send(message)
+
+
+    def execute(self, task:Task)->dict:
+        """Execute the task on a worker and apply the status and attributes it reports."""
+
+        future = Future()
+        taskId = None
+        try:
+            with self._lock:
+                if not self._connections:
+                    raise ConnectionError("There are no workers connected")
+                taskId = next(self._ids)
+                connection = min(self._connections, key=self._inFlight.get)
+                self._inFlight[connection] += 1
+                self._pending[taskId] = (future, connection)
+                self._taskIds[task] = (taskId, connection)
+
+            cls, state = _taskRecord(task)
+            self._send(connection, "execute", taskId, cls, state)
+            status, state, result = future.result()
+
+        except Exception as e:
+            self._logger.warning(f"Failed Executing {task.__class__.__name__}: {task.name} on a worker, {e}")
+            status, state, result = TaskStatus.FAILED.name, dict(), dict()
+
+            # a task that was never sent isn't in flight on its connection
+            with self._lock:
+                pending = self._pending.pop(taskId, None)
+                if pending and pending[1] in self._inFlight:
+                    self._inFlight[pending[1]] -= 1
+
+        finally:
+            with self._lock:
+                self._taskIds.pop(task, None)
+
+        for k, v in state.items():
+            object.__setattr__(task, k, v)
+        task.status = TaskStatus[status]
+
+        return result
+
+
+    def cancel(self, task:Task):
+        """Cancel the task on the worker executing it."""
+
+        with self._lock:
+            taskId, connection = self._taskIds.get(task, (None, None))
+
+        if connection:
+            self._send(connection, "cancel", taskId)
+
+
+    def _receive(self, connection):
+
+        while True:
+            try:
+                kind, taskId, status, state, result = connection.recv()
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                pending = self._pending.pop(taskId, None)
+                if pending and pending[1] in self._inFlight:
+                    self._inFlight[pending[1]] -= 1
+
+            if not pending:
+                self._logger.warning(f"Ignoring a {kind} reply for unknown task id {taskId} from a worker")
+                continue
+
+            pending[0].set_result((status, state, result))
+
+        # fail the tasks in flight on a worker that's gone
+        with self._lock:
+            lost = [k for k, (f, c) in self._pending.items() if c is connection]
+            futures = [self._pending.pop(k)[0] for k in lost]
+            if connection in self._connections:
+                self._connections.remove(connection)
+            self._inFlight.pop(connection, None)
+
+        for f in futures:
+            f.set_exception(ConnectionError("The worker connection was lost"))
+
+
+    def close(self):
+
+        connections, self._connections = self._connections, list()
+        for c in connections:
+            try:
+                self._send(c, "stop")
+            except OSError:
+                pass
+            c.close()
+
+        self._inFlight.clear()
+        self.transport.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve mycelium tasks to coordinators over TCP.")
+    parser.add_argument("--listen", required=True, help="host:port to listen on")
+    parser.add_argument("--slots", type=int, default=1, help="tasks executed at once")
+    options = parser.parse_args()
+    listen(options.listen, options.slots)
@@ -0,0 +1,261 @@
+import sqlite3
+import threading
+import time
+import os
+from queue import SimpleQueue
+from contextlib import closing
+from .Task import Task
+from .Worker import TaskObserver
+from . import Logging
+
+
+class RunHistory(TaskObserver):
+    """Persistent run history of projects and their tasks in a local SQLite database.
+
+    State changes are put on a queue and written in batches by a single writer thread
+    so recording history doesn't hold up the workers. Tasks completed from the result
+    cache are flagged as cached and left out of the duration stats.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            project TEXT NOT NULL,
+            started REAL,
+            finished REAL,
+            status TEXT
+        );
+        CREATE TABLE IF NOT EXISTS task_runs (
+            run_id TEXT NOT NULL,
+            task TEXT NOT NULL,
+            queued REAL,
+            started REAL,
+            finished REAL,
+            status TEXT,
+            retries INTEGER DEFAULT 0,
+            cached INTEGER DEFAULT 0,
+            PRIMARY KEY (run_id, task)
+        );
+        CREATE INDEX IF NOT EXISTS ix_task_runs_task ON task_runs (task, status);
+        CREATE INDEX IF NOT EXISTS ix_runs_project ON runs (project, started);
+    """
+
+    _UPSERT = {
+        "queued": """
+            INSERT INTO task_runs (run_id, task, queued) VALUES (?, ?, ?)
+            ON CONFLICT (run_id, task) DO UPDATE SET queued = excluded.queued""",
+        "started": """
+            INSERT INTO task_runs (run_id, task, started) VALUES (?, ?, ?)
+            ON CONFLICT (run_id, task) DO UPDATE SET started = excluded.started""",
+        "finished": """
+            INSERT INTO task_runs (run_id, task, finished, status, retries) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (run_id, task) DO UPDATE SET
+                finished = excluded.finished, status = excluded.status, retries = excluded.retries""",
+        "cached": """
+            INSERT INTO task_runs (run_id, task, cached) VALUES (?, ?, 1)
+            ON CONFLICT (run_id, task) DO UPDATE SET cached = 1""",
+        "runStarted": """
+            INSERT INTO runs (run_id, project, started) VALUES (?, ?, ?)
+            ON CONFLICT (run_id) DO UPDATE SET finished = NULL, status = NULL""",
+        "runFinished": """
+            UPDATE runs SET finished = ?, status = ? WHERE run_id = ?""",
+    }
+
+    def __init__(self, path:str, batchSize:int=500):
+
+        self.path = path
+        self.batchSize = batchSize
+        self.runId = None
+        self._events = SimpleQueue()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._logger = Logging.getLogger(__name__)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as connection:
+            connection.executescript(self._SCHEMA)
+            # histories written before cache hits were flagged
+            columns = [c[1] for c in connection.execute("PRAGMA table_info(task_runs)")]
+            if "cached" not in columns:
+                connection.execute("ALTER TABLE task_runs ADD COLUMN cached INTEGER DEFAULT 0")
+
+
+    def _connect(self)->sqlite3.Connection:
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+
+    def _put(self, event:str, *values):
+
+        self._events.put((event, values))
+        if not self._writer:
+            with self._lock:
+                if not self._writer:
+                    self._writer = threading.Thread(target=self._write, name="RunHistory", daemon=True)
+                    self._writer.start()
+
+
+    def _write(self):
+        """Drain the event queue writing each batch in a single transaction."""
+
+        connection = self._connect()
+        stop = False
+        while not stop:
+            batch = [self._events.get()]
+            while len(batch) < self.batchSize and not self._events.empty():
+                batch.append(self._events.get())
+
+            flushed = []
+            try:
+                with connection:
+                    for event, values in batch:
+                        if event == "flush":
+                            flushed.append(values[0])
+                        elif event == "stop":
+                            stop = True
+                        else:
+                            connection.execute(self._UPSERT[event], values)
+
+            except sqlite3.Error as e:
+                self._logger.warning(f"Failed writing run history to {self.path}: {e}")
+
+            # only signal flushes once the batch is committed
+            for f in flushed:
+                f.set()
+
+        connection.close()
+
+
+    def flush(self, timeout:float=None):
+        """Block until every state change recorded so far has been written."""
+
+        if self._writer:
+            done = threading.Event()
+            self._put("flush", done)
+            done.wait(timeout)
+
+
+    def close(self):
+
+        if self._writer:
+            self._events.put(("stop", ()))
+            self._writer.join()
+            self._writer = None
+
+
+    def runStarted(self, runId:str, project:str):
+        self.runId = runId
+        self._put("runStarted", runId, project, time.time())
+
+
+    def taskQueued(self, task:Task):
+        self._put("queued", self.runId, task.name, time.time())
+
+
+    def taskStarted(self, task:Task):
+        self._put("started", self.runId, task.name, time.time())
+
+
+    def taskCached(self, task:Task):
+        self._put("cached", self.runId, task.name)
+
+
+    def taskFinished(self, task:Task):
+        self._put("finished", self.runId, task.name, time.time(), task.status.name, getattr(task, "retries", 0))
+
+
+    def runFinished(self, status:str):
+        self._put("runFinished", time.time(), status, self.runId)
+        self.flush()
+
+
+    def run(self, runId:str)->dict:
+        """The project, start, finish and status of a run or None if it's not recorded."""
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT run_id, project, started, finished, status FROM runs WHERE run_id = ?", (runId,)).fetchone()
+
+        if row:
+            return {"runId": row[0], "project": row[1], "started": row[2], "finished": row[3], "status": row[4]}
+
+
+    def taskStatuses(self, runId:str)->dict:
+        """The last recorded status of each task of a run by task name.
+
+        Tasks that were queued or started but didn't finish have no status.
+        """
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT task, status FROM task_runs WHERE run_id = ?", (runId,)).fetchall()
+
+        return {task: status for task, status in rows}
+
+
+    def durationStats(self, task:str=None)->dict:
+        """p50, p95, mean and max duration in seconds of the successful runs by task name.
+
+        Runs completed from the result cache aren't counted.
+        """
+
+        query = """
+            WITH d AS (
+                SELECT task, finished - started AS duration,
+                    ROW_NUMBER() OVER (PARTITION BY task ORDER BY finished - started) AS rn,
+                    COUNT(*) OVER (PARTITION BY task) AS n
+                FROM task_runs
+                WHERE status = 'SUCEEDED' AND NOT cached AND started IS NOT NULL AND finished IS NOT NULL
+                    AND (? IS NULL OR task = ?)
+            )
+            SELECT task, MAX(n),
+                MIN(CASE WHEN rn >= 0.5 * n THEN duration END),
+                MIN(CASE WHEN rn >= 0.95 * n THEN duration END),
+                AVG(duration), MAX(duration)
+            FROM d GROUP BY task
+        """
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, (task, task)).fetchall()
+
+        return {
+            r[0]: {"count": r[1], "p50": r[2], "p95": r[3], "mean": r[4], "max": r[5]}
+            for r in rows
+        }
+
+
+    def durations(self, percentile:str="p50")->dict:
+        """Historical duration of each task, to weight critical path scheduling."""
+
+        return {k: v[percentile] for k, v in self.durationStats().items()}
+
+
+    def slowestTasks(self, limit:int=10)->list:
+        """The task names with the longest p95 duration, slowest first."""
+
+        stats = self.durationStats()
+        return sorted(stats.items(), key=lambda s: s[1]["p95"], reverse=True)[:limit]
+
+
+    def makespans(self, project:str, limit:int=30)->list:
+        """The most recent finished runs of a project with their makespan, oldest first."""
+
+        query = """
+            SELECT run_id, started, finished, finished - started, status FROM (
+                SELECT * FROM runs
+                WHERE project = ? AND finished IS NOT NULL
+                ORDER BY started DESC LIMIT ?
+            ) ORDER BY started
+        """
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, (project, limit)).fetchall()
+
+        return [
+            {"runId": r[0], "started": r[1], "finished": r[2], "makespan": r[3], "status": r[4]}
+            for r in rows
+        ]
@@ -1,15 +1,94 @@
 import logging
 import logging.config
+import logging.handlers
+import threading
+import atexit
+import queue
 import yaml
 import os
 
 
-def getLogger(name:str)->logging:
+_lock = threading.Lock()
+_configured = False
+_loggers = dict()
+_listeners = list()
 
-    directoryPath = os.getenv("MYCELIUMPROJECTSDIR")
-    with open(f"{directoryPath}logging.yaml", "r") as f:
-        config = yaml.safe_load(f.read())
-        logging.config.dictConfig(config)
 
-    return logging.getLogger(name)
+def _queueHandlers(logger:logging.Logger):
+    """Move the handlers of a logger behind a queue drained by a listener thread.
 
+    The logger gets a single non-blocking QueueHandler so that the calling
+    thread never waits on stdout or file I/O.
+    """
+
+    handlers = logger.handlers[:]
+    if not handlers:
+        return
+
+    logQueue = queue.SimpleQueue()
+    for h in handlers:
+        logger.removeHandler(h)
+    logger.addHandler(logging.handlers.QueueHandler(logQueue))
+
+    listener = logging.handlers.QueueListener(logQueue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+def configure(directoryPath:str=None, queued:bool=None):
+    """Load the logging configuration once per process.
+
+    The configuration is read from logging.yaml in the directoryPath parameter
+    or MYCELIUMPROJECTSDIR environment variable. When queued, or the MYCELIUMLOGGINGQUEUE
+    environment variable is True, records are handed to QueueListener threads instead
+    of being written by the logging thread.
+    """
+    global _configured
+
+    with _lock:
+        if _configured:
+            return
+
+        if not directoryPath:
+            directoryPath = os.getenv("MYCELIUMPROJECTSDIR")
+
+        if queued is None:
+            queued = os.getenv("MYCELIUMLOGGINGQUEUE", "False").lower() == "true"
+
+        with open(f"{directoryPath}logging.yaml", "r") as f:
+            config = yaml.safe_load(f.read())
+            logging.config.dictConfig(config)
+
+        if queued:
+            _queueHandlers(logging.getLogger())
+            for name in config.get("loggers", {}):
+                _queueHandlers(logging.getLogger(name))
+
+        _configured = True
+
+
+def shutdown():
+    """Flush and stop any queue listeners and allow logging to be configured again."""
+    global _configured
+
+    with _lock:
+        while _listeners:
+            _listeners.pop().stop()
+        _loggers.clear()
+        _configured = False
+
+
+atexit.register(shutdown)
+
+
+def getLogger(name:str)->logging.Logger:
+
+    logger = _loggers.get(name)
+    if logger:
+        return logger
+
+    configure()
+    logger = logging.getLogger(name)
+    _loggers[name] = logger
+
+    return logger
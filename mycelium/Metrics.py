@@ -0,0 +1,414 @@
+import threading
+import time
+import json
+import bisect
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .Task import Task
+from .Worker import TaskObserver
+from . import Logging
+
+
+# seconds from sub millisecond scheduling up to hour long notebook runs
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600)
+# seconds a scheduler lock is waited on or held
+LOCK_BUCKETS = (0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1, 1)
+
+
+def _labels(labels:dict)->str:
+
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class _Shards:
+    """The shards of a metric by thread.
+
+    A shard is only written by its thread so it never waits on a lock. The shards
+    of threads that have exited are folded into a base shard when a shard is
+    added or the shards are collected, so threads coming and going don't grow them.
+    """
+
+    def __init__(self, new, merge):
+
+        self._new = new
+        self._merge = merge
+        self._local = threading.local()
+        self._base = new()
+        self._live = list()
+        self._lock = threading.Lock()
+
+
+    def get(self):
+        """The shard of the calling thread."""
+
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._new()
+            with self._lock:
+                self._fold()
+                self._live.append((threading.current_thread(), shard))
+            self._local.shard = shard
+
+        return shard
+
+
+    def _fold(self):
+
+        live = list()
+        for thread, shard in self._live:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._base, shard)
+
+        self._live = live
+
+
+    def total(self):
+        """The shards merged into a new shard."""
+
+        total = self._new()
+        with self._lock:
+            self._fold()
+            self._merge(total, self._base)
+            shards = [s for t, s in self._live]
+
+        for shard in shards:
+            self._merge(total, shard)
+
+        return total
+
+
+    def __len__(self)->int:
+
+        with self._lock:
+            return len(self._live)
+
+
+def _mergeCounts(total:dict, shard:dict):
+
+    for k, v in list(shard.items()):
+        total[k] = total.get(k, 0) + v
+
+
+def _mergeBuckets(total:list, shard:list):
+
+    for i, v in enumerate(shard[:]):
+        total[i] += v
+
+
+class Counter:
+    """A monotonically increasing count, optionally by label values.
+
+    Each thread counts into its own shard so counting never waits on a lock,
+    the shards are summed when the counter is collected.
+    """
+
+    type = "counter"
+
+    def __init__(self, name:str, help:str, labelNames:tuple=()):
+
+        self.name = name
+        self.help = help
+        self.labelNames = labelNames
+        self._shards = _Shards(dict, _mergeCounts)
+
+
+    def inc(self, value:float=1, *labelValues):
+
+        shard = self._shards.get()
+        shard[labelValues] = shard.get(labelValues, 0) + value
+
+
+    def samples(self)->list:
+
+        values = self._shards.total()
+        return [(self.name, dict(zip(self.labelNames, k)), v) for k, v in values.items()]
+
+
+class Gauge:
+    """A value that goes up and down, or is read from a function when it's collected."""
+
+    type = "gauge"
+
+    def __init__(self, name:str, help:str, function=None):
+
+        self.name = name
+        self.help = help
+        self.function = function
+        self._value = 0
+        self._lock = threading.Lock()
+
+
+    def set(self, value:float):
+        self._value = value
+
+
+    def inc(self, value:float=1):
+
+        with self._lock:
+            self._value += value
+
+
+    def dec(self, value:float=1):
+        self.inc(-value)
+
+
+    @property
+    def value(self)->float:
+        return self.function() if self.function else self._value
+
+
+    def samples(self)->list:
+        return [(self.name, dict(), self.value)]
+
+
+class Histogram:
+    """Counts observations into cumulative buckets like a Prometheus histogram.
+
+    Like the Counter each thread observes into its own shard of bucket counts,
+    sum and count.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name:str, help:str, buckets:tuple=DURATION_BUCKETS):
+
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # the bucket counts, the +Inf count, the sum and the count
+        self._shards = _Shards(lambda: [0] * (len(self.buckets) + 3), _mergeBuckets)
+
+
+    def observe(self, value:float):
+
+        shard = self._shards.get()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+
+    def samples(self)->list:
+
+        totals = self._shards.total()
+
+        samples = []
+        cumulative = 0
+        for le, c in zip([*self.buckets, "+Inf"], totals):
+            cumulative += c
+            samples.append((f"{self.name}_bucket", {"le": str(le)}, cumulative))
+
+        samples.append((f"{self.name}_sum", dict(), float(totals[-2])))
+        samples.append((f"{self.name}_count", dict(), totals[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """A collection of metrics exported as Prometheus text or a json snapshot."""
+
+    def __init__(self):
+
+        self._metrics = dict()
+
+
+    def register(self, metric):
+
+        self._metrics[metric.name] = metric
+        return metric
+
+
+    def counter(self, name:str, help:str, labelNames:tuple=())->Counter:
+        return self.register(Counter(name, help, labelNames))
+
+
+    def gauge(self, name:str, help:str, function=None)->Gauge:
+        return self.register(Gauge(name, help, function))
+
+
+    def histogram(self, name:str, help:str, buckets:tuple=DURATION_BUCKETS)->Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+
+    def toPrometheus(self)->str:
+        """The metrics in the Prometheus text exposition format."""
+
+        lines = []
+        for m in self._metrics.values():
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+    def snapshot(self)->dict:
+        """The metrics as a dictionary of metric name to type, help and samples."""
+
+        return {
+            m.name: {
+                "type": m.type,
+                "help": m.help,
+                "samples": [{"name": n, "labels": l, "value": v} for n, l, v in m.samples()]
+            }
+            for m in self._metrics.values()
+        }
+
+
+class InstrumentedLock:
+    """Wraps a lock timing how long it's waited for and held."""
+
+    def __init__(self, lock, wait:Histogram, hold:Histogram):
+
+        self._lock = lock
+        self._wait = wait
+        self._hold = hold
+        self._acquired = 0
+
+
+    def __enter__(self):
+
+        start = time.perf_counter()
+        self._lock.acquire()
+        # only the thread holding the lock sets the acquired time
+        self._acquired = time.perf_counter()
+        self._wait.observe(self._acquired - start)
+        return self
+
+
+    def __exit__(self, *exc):
+
+        held = time.perf_counter() - self._acquired
+        self._lock.release()
+        self._hold.observe(held)
+
+
+class SchedulerMetrics(TaskObserver):
+    """Counters and histograms of the scheduling of a project's tasks.
+
+    Queue wait is the time from a task being queued to a worker starting it and
+    dependency wait the time from the start of the run to the task being queued,
+    so together they show whether tasks were waiting on their dependencies or on
+    a free worker.
+    """
+
+    def __init__(self, registry:MetricsRegistry=None):
+
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.runs = r.counter("mycelium_runs_total", "Project runs finished by status.", ("status",))
+        self.runSeconds = r.histogram("mycelium_run_seconds", "Project run makespan.")
+        self.tasks = r.counter("mycelium_tasks_total", "Tasks finished by status.", ("status",))
+        self.queueWait = r.histogram("mycelium_task_queue_wait_seconds", "Time from a task being queued to a worker starting it.")
+        self.dependencyWait = r.histogram("mycelium_task_dependency_wait_seconds", "Time from the start of the run to a task being queued.")
+        self.executeSeconds = r.histogram("mycelium_task_execute_seconds", "Task execution time.")
+        self.readinessChecks = r.counter("mycelium_readiness_checks_total", "Dependency edges evaluated when tasks finish.")
+        self.lockWait = r.histogram("mycelium_scheduler_lock_wait_seconds", "Time waiting to acquire the scheduler lock.", LOCK_BUCKETS)
+        self.lockHold = r.histogram("mycelium_scheduler_lock_hold_seconds", "Time the scheduler lock is held.", LOCK_BUCKETS)
+        self.activeWorkers = r.gauge("mycelium_active_workers", "Workers executing a task.", lambda: len(self._started))
+        self.workers = r.gauge("mycelium_workers", "Maximum number of tasks executed in parallel.")
+        self.queueDepth = r.gauge("mycelium_queue_depth", "Runnable tasks waiting for a worker.")
+        self.poolSize = r.gauge("mycelium_worker_threads", "Worker threads in the elastic worker pool.")
+
+        self._runStarted = None
+        self._queued = dict()
+        self._started = dict()
+
+
+    def instrumentLock(self, lock)->InstrumentedLock:
+        return InstrumentedLock(lock, self.lockWait, self.lockHold)
+
+
+    def runStarted(self, runId:str, project:str):
+
+        self._runStarted = time.perf_counter()
+        self._queued.clear()
+        self._started.clear()
+
+
+    def taskQueued(self, task:Task):
+
+        now = time.perf_counter()
+        self._queued[task] = now
+        if self._runStarted:
+            self.dependencyWait.observe(now - self._runStarted)
+
+
+    def taskStarted(self, task:Task):
+
+        now = time.perf_counter()
+        self._started[task] = now
+        queued = self._queued.pop(task, None)
+        if queued:
+            self.queueWait.observe(now - queued)
+
+
+    def taskCached(self, task:Task):
+
+        # a cache hit isn't an execution
+        self._started.pop(task, None)
+
+
+    def taskFinished(self, task:Task):
+
+        started = self._started.pop(task, None)
+        if started:
+            self.executeSeconds.observe(time.perf_counter() - started)
+        self.tasks.inc(1, task.status.name)
+
+
+    def runFinished(self, status:str):
+
+        self.runs.inc(1, status)
+        if self._runStarted:
+            self.runSeconds.observe(time.perf_counter() - self._runStarted)
+
+
+class MetricsServer:
+    """Serves a metrics registry over HTTP on a local port.
+
+    /metrics is the Prometheus text exposition and /metrics.json a json snapshot.
+    """
+
+    def __init__(self, registry:MetricsRegistry, port:int=9464, host:str="127.0.0.1"):
+
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+
+                if self.path == "/metrics":
+                    body = registry.toPrometheus().encode()
+                    contentType = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    contentType = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", contentType)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        Logging.getLogger(__name__).info(f"Serving metrics on http://{host}:{self.port}/metrics")
+
+
+    def close(self):
+
+        self._server.shutdown()
+        self._server.server_close()
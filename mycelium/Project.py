@@ -1,22 +1,60 @@
 
 import os
 import yaml
-import threading
+import asyncio
+import uuid
+import gc
+from contextlib import contextmanager
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from .Task import Task, DatabricksNotebook, TaskStatus, PipelineOrigin
 from .Dag import Dag 
-from .Worker import Worker
+from .Worker import Worker, WorkerPool, ExecutionEngine, SchedulePriority
+from .History import RunHistory
+from .Metrics import SchedulerMetrics, MetricsServer
+from .ResultCache import ResultCache
+from .ResourcePool import ResourcePools
+from .Distributed import RemoteExecutor, ProcessTransport
+from .SharedExecutor import SharedExecutor
+from .ProjectCache import ProjectCache, defaultPath
 from . import Logging
 
+# use the libyaml C parser when PyYAML has been built with it
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def parseYaml(content:bytes)->dict:
+    return yaml.load(content, Loader=YamlLoader)
+
+
+@contextmanager
+def gcPaused():
+    """Pause the cyclic garbage collector.
+
+    Loading a project allocates a lot of long lived objects and no garbage,
+    collections would repeatedly traverse them making loads super linear.
+    """
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
 
 class Project(Dag, Task, Worker):
 
 
-    def __init__(self, directoryPath:str=None):
+    def __init__(self, directoryPath:str=None, useCache:bool=False, compact:bool=False, cachePath:str=None):
         """Initialise the project.
 
         Load the project.yaml file  using the direcoty parameter or PIPELINEPROJECTSDIR environment variable.
-        Load the yaml project files into dictionaries.
+        Load the yaml project files into dictionaries. When useCache is True an unchanged project is
+        loaded from its compiled project cache instead, kept at cachePath or by default in
+        MYCELIUMPROJECTCACHEDIR or the user cache directory. When compact is True the dag is held in
+        a CompactDag to reduce the memory and garbage collection cost of very large dags.
         """
 
         # setup the path envirionemnt variable for project dir and logging
@@ -31,18 +69,61 @@ class Project(Dag, Task, Worker):
         self.enabled = True
         self.name = None
         self.maxParallel = 4
+        self.schedule = SchedulePriority.FIFO
         self.type = self.__class__.__name__
         self._pipelineFiles:List = None
         self._taskFiles:List = None
         self._patternFiles:List = None
         self._dag:List = None
+        self.runId:str = None
+        self.history:RunHistory = None
+        self.metrics:SchedulerMetrics = None
+        self.metricsServer:MetricsServer = None
+        self.useCache = useCache
+        self.cachePath = cachePath
         self.projectFilePath = os.path.join(self.directory, "mycelium.yaml")
         logger.info(f"Loading Mycelium Project: {self.projectFilePath}")
 
         with open(self.projectFilePath, 'r') as f:
 
-            projectDict = yaml.safe_load(f)
-            self._load(**projectDict["project"])
+            projectDict = yaml.load(f, Loader=YamlLoader)
+            with gcPaused():
+                self._load(**projectDict["project"])
+                if compact:
+                    self.compact()
+
+        self.historyPath = os.getenv("MYCELIUMHISTORYPATH") or defaultPath(self.directory, "history.db")
+        self.resultCachePath = os.getenv("MYCELIUMRESULTCACHEPATH") or defaultPath(self.directory, "results.db")
+        self.workerIdleTimeout = float(os.getenv("MYCELIUMWORKERIDLETIMEOUT", 5))
+
+        metricsPort = os.getenv("MYCELIUMMETRICSPORT")
+        if metricsPort:
+            self.enableMetrics(int(metricsPort))
+
+
+    def enableMetrics(self, port:int=None)->SchedulerMetrics:
+        """Collect scheduler metrics for the runs of the project.
+
+        When a port is given the metrics are served on localhost as Prometheus text
+        at /metrics and as a json snapshot at /metrics.json, port 0 picks a free port.
+        The metrics are also available from metrics.registry.snapshot().
+        """
+
+        if not self.metrics:
+            self.metrics = SchedulerMetrics()
+            self._instrument(self.metrics)
+
+        if port is not None and not self.metricsServer:
+            self.metricsServer = MetricsServer(self.metrics.registry, port)
+
+        return self.metrics
+
+
+    @property
+    def workerPool(self)->WorkerPool:
+        """The worker threads of the running thread engine with their size and utilisation."""
+
+        return self._pool
 
 
     @property
@@ -110,8 +191,13 @@ class Project(Dag, Task, Worker):
                 directory: str,
                 pipelines: List[str],
                 tasks: List[str],
-                patterns: List[str]):
-        """Load the project yaml files into a task dictionary and a pipeline dictionary."""
+                patterns: List[str],
+                pools: List[dict] = None):
+        """Load the project yaml files into a task dictionary and a pipeline dictionary.
+
+        Pools are the resource pools of the project, a list of name and slots, that
+        tasks and task groups claim slots of to limit how many of them run at once.
+        """
 
         TASKS_KEY = "tasks"
         PATTERNS_KEY = "patterns"
@@ -127,23 +213,35 @@ class Project(Dag, Task, Worker):
         self._taskFiles = tasks
         self._patternFiless = patterns
 
-        # Load and merge pipeline yaml files into a single dictionary
-        pipelineDict = [
-            self._loadYaml(self.directory + i, pipelineDict, PIPELINES_KEY) 
-            for i in self._pipelineFiles][0]
-        self.maxParallel = pipelineDict["maxParallel"]
+        pipelineFiles = [self.directory + i for i in self._pipelineFiles]
+        taskFiles = [self.directory + i for i in self._taskFiles]
+        patternFiles = [self.directory + i for i in self._patternFiless]
+
+        files = [self.projectFilePath, *pipelineFiles, *taskFiles, *patternFiles]
+        with ThreadPoolExecutor() as executor:
+            contents = dict(zip(files, executor.map(self._readFile, files)))
+
+        # an unchanged project loads straight from the compiled project cache
+        if self.useCache:
+            cache = ProjectCache(self.cachePath or defaultPath(self.directory))
+            key = cache.key(contents)
+            compiled = cache.load(key)
+            if compiled:
+                logger = Logging.getLogger(self.name)
+                logger.info(f"Loaded compiled project {self.name} from {cache.path}")
+                self._loadCompiled(compiled)
+                self._loadPools(pools)
+                return
+
+        # Load and merge the pipeline, task and pattern yaml files into a dictionary each
+        collections = self._loadYaml(files[1:], contents)
+        pipelineDict = self._mergeYaml(pipelineFiles, collections, PIPELINES_KEY)
+        taskDict = self._mergeYaml(taskFiles, collections, TASKS_KEY)
+        patternDict = self._mergeYaml(patternFiles, collections, PATTERNS_KEY)
 
-        # Load and merge tasks yaml files into a single dictionary
-        taskDict = [
-            self._loadYaml(self.directory + i, taskDict, TASKS_KEY) 
-            for i in self._taskFiles][0]
-        
+        self.maxParallel = pipelineDict["maxParallel"]
+        self.schedule = SchedulePriority[pipelineDict.get("schedule", self.schedule.name).upper()]
 
-        # Load and merge patterns yaml files into a single dictionary
-        patternDict = [
-            self._loadYaml(self.directory + i, patternDict, PATTERNS_KEY) 
-            for i in self._patternFiless][0]
-    
         # Fill missing task properties with their pattern attributes
         # where patterns have been declared.
         # Note that if required attribute it missing from the task it's self or any declared pattern
@@ -152,13 +250,63 @@ class Project(Dag, Task, Worker):
         
         # build a task dag, this is dictionary tasks, each task has a list of depends on tasks.
         self._loadDag(self.name, pipelineDict, taskDict)
+        self._loadPools(pools)
+
+        if self.useCache:
+            cache.save(key, self._compile())
 
 
-    def _find(self, dictionary:dict, name:str):
+    def _compile(self)->dict:
+
+        return {
+            "maxParallel": self.maxParallel,
+            "schedule": self.schedule.name,
+            "dag": self._compileDag()
+        }
+
+
+    def _loadCompiled(self, compiled:dict):
+
+        self.maxParallel = compiled["maxParallel"]
+        self.schedule = SchedulePriority[compiled["schedule"]]
+        self._restoreDag(compiled["dag"])
+
+
+    def _loadPools(self, pools:List[dict]):
+        """Create the resource pools and check the slots claimed by the tasks exist."""
+
+        slots = {p["name"]: int(p["slots"]) for p in pools or []}
+        for name, limit in self.groupLimits.items():
+            if name in slots:
+                raise Exception(f"Task group {name} has a maxParallel limit and the same name as a pool.")
+            slots[name] = limit
+
+        self._pools = ResourcePools(slots) if slots else None
+
+        for t in self.dag.values():
+            if getattr(t, "pools", None):
+                if not self._pools:
+                    raise Exception(f"Task {t.name} claims pools but the project doesn't have any pools.")
+                self._pools.validate(t)
+
+
+    def _index(self, items:list)->dict:
+        """Index a list of dictionary items by lower case name, the first item of a name wins."""
+
+        index = dict()
+        for i in items:
+            index.setdefault(i["name"].lower(), i)
+
+        return index
+
+
+    def _find(self, index:dict, name:str):
         """Find a dictionary item by name."""
 
-        found = next(i for i in dictionary if i["name"].lower() == name.lower())
-        return found
+        try:
+            return index[name.lower()]
+        except KeyError:
+            raise Exception(f"Pattern {name} is not found in the pattern definitions.")
 
 
     def _stitchTaskPatterns(self, tasks:dict, patterns:dict):
@@ -174,63 +322,262 @@ class Project(Dag, Task, Worker):
         """
 
         PATTERN_KEY = "pattern"
+        patternIndex = self._index(patterns)
         for task in tasks:
-            if task[PATTERN_KEY]:
-                pattern = self._find(patterns, task[PATTERN_KEY])
+            if task.get(PATTERN_KEY):
+                pattern = self._find(patternIndex, task[PATTERN_KEY])
                 for k, v in pattern.items():
-                    if not k in task.keys():
+                    if not k in task:
                         task[k] = v 
-                del task[PATTERN_KEY]
+            task.pop(PATTERN_KEY, None)
+
 
+    def _readFile(self, path:str)->bytes:
 
-    def _loadYaml(self, path:str, collection:dict, collectKey:str):
-        """Loads the collection yaml file into a dictionary.
+        with open(path, "rb") as f:
+            return f.read()
 
-        Loads the collection yaml file version=sibytes.io/mycelium/[collection]/api/0.1.0
-        into a dictionary and merges the collection item lists into the objects existing dictionary
-        of objects. If this does not exist yet it will be created. The function returns the resulting
-        dictionary
+
+    def _loadYaml(self, paths:List[str], contents:dict)->dict:
+        """Parse the yaml file contents into dictionaries by path.
+
+        libyaml holds the GIL while it parses so the files are parsed in turn, the
+        reads are what's overlapped.
         """
+
         logger = Logging.getLogger(self.name)
-        logger.info(f"Loading {path}...")
+        collections = dict()
+        for p in paths:
+            logger.info(f"Loading {p}...")
+            collections[p] = parseYaml(contents[p])
 
-        with open(path) as f:
-            newCollection = yaml.safe_load(f)
+        return collections
+
+
+    def _mergeYaml(self, paths:List[str], collections:dict, collectKey:str)->dict:
+        """Merges the collection yaml files into a dictionary.
+
+        Merges the collection item lists of the yaml files version=sibytes.io/mycelium/[collection]/api/0.1.0,
+        in the order of the paths, into the dictionary of the first file. Each list is extended in place
+        so merging is linear in the number of items. The function returns the resulting dictionary
+        """
+
+        collection:dict = None
+        for p in paths:
+            newCollection = collections[p]
 
             if collection:
-                collection[collectKey] = [*collection[collectKey], *newCollection[collectKey]]
+                collection[collectKey].extend(newCollection[collectKey])
             else:
                 collection = newCollection
 
         return collection
 
 
-    def execute(self, maxParallel:int=0)->dict:
+    def _startRun(self, durations:dict, history:bool, resume:str=None, targets:list=None, downstream:bool=False)->set:
+        """Start a new run id, attach the run history and index the schedule.
+
+        When resuming a run the run id is kept and the tasks that succeeded in the
+        run history of that run are returned as done. With targets only the closure
+        of the targets is scheduled, see Dag.closure.
+        """
+
+        # select the subgraph first so that unknown targets fail before the run starts
+        selection = self.closure(targets, downstream) if targets else None
+
+        self.runId = resume or uuid.uuid4().hex
+        self.status = TaskStatus.EXECUTING
+
+        if history:
+            if not self.history:
+                self.history = RunHistory(self.historyPath)
+            if self.history not in self._observers:
+                self._observers.append(self.history)
+            # weight the critical path with the historical durations
+            if durations is None and self.schedule == SchedulePriority.CRITICAL_PATH:
+                durations = self.history.durations()
+
+        elif self.history in self._observers:
+            self._observers.remove(self.history)
+
+        done = self._resumeRun(resume) if resume else None
+        if done and selection is not None:
+            done = done.intersection(selection)
+
+        # memoized tasks are completed from the result cache when they're unchanged
+        if any(getattr(t, "memoize", False) for t in (self.dag.values() if selection is None else selection)):
+            if not self._resultCache:
+                self._resultCache = ResultCache(self.resultCachePath)
+            self._resultCache.evict()
+
+        # index the dependency counters before any task can finish
+        self._initSchedule(self.getDagOrigin(), self.schedule, durations, selection, self.order)
+        if selection is not None:
+            logger = Logging.getLogger(self.name)
+            logger.info(f"Selected {len(selection)} tasks and barriers of project={self.name} for targets={targets}")
+
+        if self.metrics:
+            self.metrics.workers.set(self.maxParallel)
+
+        for o in self._observers:
+            o.runStarted(self.runId, self.name)
+
+        return done
+
+
+    def _resumeRun(self, runId:str)->set:
+        """The tasks of the dag that succeeded in a run recorded in the run history."""
+
+        if not self.history or self.history not in self._observers:
+            raise Exception(f"Run {runId} can't be resumed without the run history.")
+
+        if not self.history.run(runId):
+            raise Exception(f"Run {runId} is not found in the run history {self.history.path}.")
+
+        statuses = self.history.taskStatuses(runId)
+        done = {
+            t for name, t in self.dag.items()
+            if statuses.get(name) == TaskStatus.SUCEEDED.name
+        }
 
         logger = Logging.getLogger(self.name)
+        logger.info(f"Resuming run {runId} of project={self.name}, {len(done)} tasks already succeeded")
 
-        # override max parallel if provided
+        return done
+
+
+    def _finishRun(self)->dict:
+
+        # the scheduled tasks, the whole dag or the closure of the targets
+        failed = any(t.status == TaskStatus.FAILED for t in self._edges)
+        self.status = TaskStatus.FAILED if failed else TaskStatus.SUCEEDED
+
+        logger = Logging.getLogger(self.name)
+        reasons = (
+            (TaskStatus.UPSTREAM_FAILED, "their upstream failed"),
+            (TaskStatus.SKIPPED, "their dependency conditions weren't met"),
+            # left waiting on tasks that aren't in any pipeline, see Dag._validateDag
+            (TaskStatus.NONE, "they're unreachable from the pipeline origin")
+        )
+        for status, reason in reasons:
+            # barriers and tasks that aren't in any pipeline are left out
+            names = [t.name for t in self._edges if t.status == status and t.name in self.dag]
+            if names:
+                logger.info(f"Didn't execute {len(names)} tasks because {reason}: {', '.join(names)}")
+
+        for o in self._observers:
+            o.runFinished(self.status.name)
+
+        # stop the history writer, it's started again by the next run
+        if self.history:
+            self.history.close()
+
+        return {"runId": self.runId, "status": self.status.name}
+
+
+    def execute(self, maxParallel:int=0, engine:str=ExecutionEngine.THREAD.name, schedule:str=None, durations:dict=None, history:bool=True, resume:str=None, transport=None, executor:SharedExecutor=None, targets:list=None, downstream:bool=False)->dict:
+        """Execute the project dag.
+
+        The schedule (fifo or critical_path) overrides the pipelines schedule, durations
+        are the expected seconds by task name used to weight the critical path. When history
+        is True task state changes are recorded in the run history at historyPath, the
+        history is the checkpoint of the run. Resume is the id of a run in the history to
+        carry on, the tasks that succeeded in it aren't executed again. The distributed
+        engine executes the tasks on the workers of the transport, by default a worker
+        process for each of maxParallel. When a shared executor is given the tasks run on
+        its threads, fairly shared with the other projects running on it, instead of on
+        threads of the project's own. Targets are the names of tasks or task groups to run
+        with the tasks they depend on, and with downstream the tasks that depend on them,
+        instead of the whole dag.
+        """
+
+        logger = Logging.getLogger(self.name)
+
+        engine = ExecutionEngine[engine.upper()]
+        if engine == ExecutionEngine.ASYNCIO:
+            if executor:
+                raise Exception("The asyncio engine can't run on a shared executor.")
+            return asyncio.run(self.executeAsync(maxParallel, schedule, durations, history, resume, targets, downstream))
+
+        # override max parallel and schedule if provided
         if maxParallel > 0:
             self.maxParallel = maxParallel
 
+        if schedule:
+            self.schedule = SchedulePriority[schedule.upper()]
 
-        if self.isReady():
-            logger.info(f"Starting thread pool with maxParallel with maxParallel={self.maxParallel}")
-            for i in range(self.maxParallel):
-                threading.Thread(target=self._worker, daemon=True).start()
+        result = dict()
 
-            logger.info(f"Starting executing project={self.name}")
-            self._queue.put(self.getDagOrigin())
+        if self.isReady():
+            done = self._startRun(durations, history, resume, targets, downstream)
 
-            self._queue.join()
+            if engine == ExecutionEngine.DISTRIBUTED:
+                self._executor = RemoteExecutor(transport or ProcessTransport(self.maxParallel))
+                self._executor.start()
 
-            logger.info(f"Finished executing project={self.name}")
+            if executor:
+                self._shared = executor
+                executor.attach(self, self.name)
+            else:
+                # worker threads are started as tasks become runnable up to maxParallel
+                self._pool = WorkerPool(self, self.maxParallel, idleTimeout=self.workerIdleTimeout)
+
+            logger.info(f"Starting executing project={self.name}, runId={self.runId}")
+            try:
+                self._start(self.getDagOrigin(), done)
+                self._queue.join()
+            finally:
+                if self._shared:
+                    self._shared.detach(self)
+                    self._shared = None
+                else:
+                    self._pool.close()
+                    logger.info(f"Stopped worker pool, peak={self._pool.peak} of maxParallel={self.maxParallel}")
+                    self._pool = None
+                if self._executor:
+                    self._executor.close()
+                    self._executor = None
+
+            result = self._finishRun()
+            logger.info(f"Finished executing project={self.name}, status={self.status.name}")
 
         else:
             logger.info(f"Failed to start project {self.name}, it is not ready.")
 
+        return result
+
+
+    async def executeAsync(self, maxParallel:int=0, schedule:str=None, durations:dict=None, history:bool=True, resume:str=None, targets:list=None, downstream:bool=False)->dict:
+        """Execute the project on the running event loop.
+
+        Remote task runs are awaited as coroutines so many more of them can be
+        in flight than there are threads, maxParallel caps the concurrent tasks.
+        """
+
+        logger = Logging.getLogger(self.name)
+
+        # override max parallel and schedule if provided
+        if maxParallel > 0:
+            self.maxParallel = maxParallel
+
+        if schedule:
+            self.schedule = SchedulePriority[schedule.upper()]
+
         result = dict()
 
+        if self.isReady():
+            done = self._startRun(durations, history, resume, targets, downstream)
+
+            logger.info(f"Starting event loop with maxParallel={self.maxParallel}")
+            logger.info(f"Starting executing project={self.name}, runId={self.runId}")
+            await self._workAsync(self.getDagOrigin(), self.maxParallel, done)
+
+            result = self._finishRun()
+            logger.info(f"Finished executing project={self.name}, status={self.status.name}")
+
+        else:
+            logger.info(f"Failed to start project {self.name}, it is not ready.")
+
         return result
 
 
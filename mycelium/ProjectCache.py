@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import pickle
+import os
+import sys
+import tempfile
+from . import Logging
+
+
+@functools.lru_cache(maxsize=None)
+def sourceHash()->str:
+    """Hash the python version and the mycelium sources, any change to the package invalidates a cache."""
+
+    package = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(sys.version.encode())
+    for name in sorted(os.listdir(package)):
+        if name.endswith(".py"):
+            digest.update(name.encode())
+            with open(os.path.join(package, name), "rb") as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def defaultPath(directory:str, filename:str="project.cache")->str:
+    """The path of a state file of a project outside of its directory.
+
+    The state of each project is kept in a directory named by a hash of the project
+    path under MYCELIUMPROJECTCACHEDIR or the user cache.
+    """
+
+    cacheDir = os.getenv("MYCELIUMPROJECTCACHEDIR")
+    if not cacheDir:
+        cacheDir = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "mycelium", "projects")
+
+    name = hashlib.sha256(os.path.realpath(directory).encode()).hexdigest()[:32]
+    return os.path.join(cacheDir, name, filename)
+
+
+class ProjectCache:
+    """On-disk cache of a compiled project keyed by a hash of its yaml files.
+
+    The key is a sha256 over the mycelium sources and the path and content of
+    every file the project references so any change to either invalidates the
+    cache. The compiled project is stored with pickle, written to a temporary file
+    and moved into place so a reader never sees a partial cache. Unpickling runs
+    code so a cache that isn't owned by the user or that others can write to is
+    ignored.
+    """
+
+    def __init__(self, path:str):
+
+        self.path = path
+        self._logger = Logging.getLogger(__name__)
+
+
+    def key(self, files:dict)->str:
+        """Hash the content of the files by path, in the order of the dictionary."""
+
+        digest = hashlib.sha256(sourceHash().encode())
+        for path, content in files.items():
+            digest.update(path.encode())
+            digest.update(len(content).to_bytes(8, "little"))
+            digest.update(content)
+
+        return digest.hexdigest()
+
+
+    def _trusted(self, f)->bool:
+
+        if not hasattr(os, "getuid"):
+            return True
+
+        stat = os.fstat(f.fileno())
+        return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+    def load(self, key:str)->dict:
+        """Return the compiled project for the key or None if it's missing, stale or untrusted."""
+
+        try:
+            with open(self.path, "rb") as f:
+                if not self._trusted(f):
+                    self._logger.warning(f"Ignoring project cache {self.path} that's writable by other users")
+                    return None
+                cached = pickle.load(f)
+
+        except FileNotFoundError:
+            return None
+
+        except Exception as e:
+            self._logger.warning(f"Ignoring unreadable project cache {self.path}: {e}")
+            return None
+
+        if cached.get("key") != key:
+            return None
+
+        return cached["project"]
+
+
+    def save(self, key:str, project:dict):
+
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+        except OSError as e:
+            self._logger.warning(f"Failed to write project cache {self.path}: {e}")
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"key": key, "project": project}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, self.path)
+
+        except Exception as e:
+            os.remove(tmpPath)
+            self._logger.warning(f"Failed to write project cache {self.path}: {e}")
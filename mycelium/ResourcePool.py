@@ -0,0 +1,95 @@
+import threading
+import itertools
+import bisect
+from .Task import Task
+
+
+class ResourcePools:
+    """Named pools of slots that runnable tasks claim before they're dispatched.
+
+    A task is dispatched only when all the slots it claims are free and gives them
+    back when it finishes. Tasks that can't get their slots wait in schedule order,
+    a waiting task holds back the later tasks that claim any of the same pools so
+    tasks claiming many slots aren't starved by tasks claiming few.
+    """
+
+    def __init__(self, slots:dict):
+
+        self.slots = dict(slots)
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self, ranks:dict=None):
+        """Free all the slots and forget the waiting tasks for a new run ranked by ranks."""
+
+        with self._lock:
+            self._free = dict(self.slots)
+            self._held = dict()
+            self._waiting = []
+            self._ranks = ranks or dict()
+            self._counter = itertools.count()
+
+
+    def validate(self, task:Task):
+        """Raise when a task claims a pool that isn't declared or more slots than it has."""
+
+        for pool, slots in (getattr(task, "pools", None) or {}).items():
+            if pool not in self.slots:
+                raise Exception(f"Pool {pool} claimed by task {task.name} is not found in the project pools.")
+
+            if slots > self.slots[pool]:
+                raise Exception(f"Task {task.name} claims {slots} slots of pool {pool} which only has {self.slots[pool]}.")
+
+
+    def acquire(self, task:Task)->list:
+        """Take the slots claimed by the task, returns the waiting tasks that now have theirs.
+
+        The task is returned unless it has to wait for its slots.
+        """
+
+        if not getattr(task, "pools", None):
+            return [task]
+
+        with self._lock:
+            bisect.insort(self._waiting, (self._ranks.get(task, 0), next(self._counter), task))
+            return self._admit()
+
+
+    def release(self, task:Task)->list:
+        """Give back the slots held by the task, returns the waiting tasks that now have theirs."""
+
+        with self._lock:
+            held = self._held.pop(task, None)
+            if not held:
+                return []
+
+            for pool, slots in held.items():
+                self._free[pool] += slots
+
+            return self._admit()
+
+
+    def _admit(self)->list:
+
+        admitted = []
+        waiting = []
+        blocked = set()
+        for i, w in enumerate(self._waiting):
+            task = w[2]
+            claimed = task.pools
+            if blocked.isdisjoint(claimed) and all(self._free[p] >= s for p, s in claimed.items()):
+                for p, s in claimed.items():
+                    self._free[p] -= s
+                self._held[task] = claimed
+                admitted.append(task)
+            else:
+                blocked.update(claimed)
+                waiting.append(w)
+                # nothing further back can be admitted once every free pool is held back
+                if all(p in blocked for p, s in self._free.items() if s):
+                    waiting.extend(self._waiting[i + 1:])
+                    break
+
+        self._waiting = waiting
+        return admitted
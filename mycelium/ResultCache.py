@@ -0,0 +1,88 @@
+import sqlite3
+import time
+import os
+from contextlib import closing
+from . import Logging
+
+
+class ResultCache:
+    """Successful task results by the content address of the task run.
+
+    A task that opts in with memoize computes a cache key from everything that
+    determines its result. When the key has a successful result that's younger than
+    maxAge the task is completed from the cache instead of being executed. Evicting
+    removes the results older than maxAge and then the least recently used results
+    beyond maxEntries.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            task TEXT NOT NULL,
+            run_id TEXT,
+            created REAL NOT NULL,
+            used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_results_used ON results (used);
+    """
+
+    def __init__(self, path:str, maxEntries:int=10000, maxAge:float=30 * 24 * 3600):
+
+        self.path = path
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+        self._logger = Logging.getLogger(__name__)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as connection:
+            connection.executescript(self._SCHEMA)
+
+
+    def _connect(self)->sqlite3.Connection:
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+
+    def get(self, key:str)->dict:
+        """The successful result of the key or None when there isn't one or it has expired."""
+
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT task, run_id, created FROM results WHERE key = ? AND created >= ?",
+                (key, now - self.maxAge)).fetchone()
+
+            if row:
+                connection.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+                return {"task": row[0], "runId": row[1], "created": row[2]}
+
+
+    def put(self, key:str, task:str, runId:str=None):
+
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, task, run_id, created, used) VALUES (?, ?, ?, ?, ?)",
+                (key, task, None if runId is None else str(runId), now, now))
+
+
+    def evict(self)->int:
+        """Remove the expired and least recently used results, returns the number removed."""
+
+        with closing(self._connect()) as connection, connection:
+            expired = connection.execute(
+                "DELETE FROM results WHERE created < ?", (time.time() - self.maxAge,)).rowcount
+            unused = connection.execute("""
+                DELETE FROM results WHERE key NOT IN (
+                    SELECT key FROM results ORDER BY used DESC LIMIT ?
+                )""", (self.maxEntries,)).rowcount
+
+        if expired or unused:
+            self._logger.info(f"Evicted {expired} expired and {unused} least recently used results from {self.path}")
+
+        return expired + unused
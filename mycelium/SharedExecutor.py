@@ -0,0 +1,170 @@
+import os
+import threading
+import itertools
+from . import Logging
+
+
+class _Share:
+    """The scheduling state of a project attached to a shared executor."""
+
+    __slots__ = ("name", "worker", "weight", "quota", "vtime", "running")
+
+    def __init__(self, name:str, worker, weight:float, quota:int, vtime:float):
+
+        self.name = name
+        self.worker = worker
+        self.weight = weight
+        self.quota = quota
+        self.vtime = vtime
+        self.running = 0
+
+
+class SharedExecutor:
+    """Worker threads shared by the runs of many projects in a process.
+
+    maxWorkers caps the tasks executing at once across all the projects. The
+    runnable tasks of the attached projects are dispatched by weighted fair
+    queueing, each dispatch advances the virtual time of its project by 1/weight
+    and the next free thread goes to the project with the least virtual time, so
+    the slots are shared in proportion to the weights. A project that attaches or
+    has tasks queued again starts from the virtual time of the last dispatch so it
+    can't bank the time it was idle.
+    A quota caps the tasks of a project executing at once whatever its weight.
+    """
+
+    def __init__(self, maxWorkers:int=16):
+
+        self.maxWorkers = maxWorkers
+        self._weights = dict()
+        self._attached = dict()
+        self._clock = 0.0
+        self._threads = list()
+        self._names = itertools.count()
+        self._closed = False
+        self._condition = threading.Condition()
+
+
+    def register(self, name:str, weight:float=1, quota:int=None):
+        """Set the weight and quota of the runs of the project with the name."""
+
+        if weight <= 0:
+            raise Exception(f"The weight of project {name} must be greater than 0.")
+
+        with self._condition:
+            self._weights[name] = (weight, quota)
+
+
+    def attach(self, worker, name:str):
+        """Dispatch the queued tasks of a project's run until it's detached."""
+
+        with self._condition:
+            if self._closed:
+                raise Exception("The shared executor is closed.")
+
+            weight, quota = self._weights.get(name, (1, None))
+            self._attached[worker] = _Share(name, worker, weight, quota, self._clock)
+            while len(self._threads) < self.maxWorkers:
+                thread = threading.Thread(target=self._run, name=f"MyceliumShared-{next(self._names)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+            self._condition.notify_all()
+
+
+    def detach(self, worker):
+
+        with self._condition:
+            self._attached.pop(worker, None)
+
+
+    def notify(self):
+        """Wake a thread for a task that's been queued."""
+
+        with self._condition:
+            self._condition.notify()
+
+
+    @property
+    def running(self)->dict:
+        """The tasks executing by project name."""
+
+        with self._condition:
+            running = dict()
+            for s in self._attached.values():
+                running[s.name] = running.get(s.name, 0) + s.running
+            return running
+
+
+    def _next(self)->tuple:
+        """The share with the least virtual time that has a task queued and is within its quota."""
+
+        chosen = None
+        for s in self._attached.values():
+            if s.quota is not None and s.running >= s.quota:
+                continue
+            if s.worker._queue.empty():
+                continue
+            # a project that had nothing to run is brought up to the last dispatch
+            s.vtime = max(s.vtime, self._clock)
+            if not chosen or s.vtime < chosen.vtime:
+                chosen = s
+
+        if not chosen:
+            return None, None
+
+        task = chosen.worker._queue.get_nowait()
+        self._clock = chosen.vtime
+        chosen.vtime += 1 / chosen.weight
+        chosen.running += 1
+
+        return chosen, task
+
+
+    def _run(self):
+
+        logger = Logging.getLogger(threading.current_thread().name)
+
+        while True:
+            with self._condition:
+                share, task = self._next()
+                while task is None:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                    share, task = self._next()
+
+            try:
+                share.worker._process(task, logger)
+            finally:
+                with self._condition:
+                    share.running -= 1
+                    # a project at its quota can have another task dispatched
+                    if share.quota is not None:
+                        self._condition.notify()
+
+
+    def close(self, timeout:float=None):
+        """Stop the threads once they've finished their tasks."""
+
+        with self._condition:
+            self._closed = True
+            threads, self._threads = self._threads, list()
+            self._condition.notify_all()
+
+        for t in threads:
+            t.join(timeout)
+
+
+_executorLock = threading.Lock()
+_executor:SharedExecutor = None
+
+
+def getSharedExecutor()->SharedExecutor:
+    """Get the process wide shared executor, MYCELIUMSHAREDWORKERS threads created on first use."""
+    global _executor
+
+    with _executorLock:
+        if not _executor:
+            _executor = SharedExecutor(int(os.getenv("MYCELIUMSHAREDWORKERS", "16")))
+
+    return _executor
@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
 from time import sleep
 from enum import Enum
+import asyncio
 import json
+import os
+import posixpath
+import hashlib
+import uuid
 from .DependencyStatus import DependencyCondition, DependencyOperator
 from . import Logging
+from . import Databricks
 
 
 class TaskStatus(Enum):
@@ -12,10 +18,38 @@ class TaskStatus(Enum):
     EXECUTING = 3
     SUCEEDED = 4
     FAILED = 5
+    # never run because a dependency it needs can no longer be met after an upstream failure
+    UPSTREAM_FAILED = 6
+    # never run because the conditions of its dependencies weren't met, nothing upstream failed
+    SKIPPED = 7
+
+
+def poolClaims(pools)->dict:
+    """Normalise the pools attribute of a task or task group into slots by pool name.
+
+    Pools are a pool name or a list of pool names claiming a slot each, or a
+    mapping of pool name to the number of slots claimed.
+    """
+
+    if not pools:
+        return None
+
+    if isinstance(pools, str):
+        return {pools: 1}
+
+    if isinstance(pools, dict):
+        return {str(p): int(s) for p, s in pools.items()}
+
+    slots = dict()
+    for p in pools:
+        slots[p] = slots.get(p, 0) + 1
+
+    return slots
 
 
 class Task(ABC):
 
+    __slots__ = ()
 
     @staticmethod
     def taskFactory(task:dict):
@@ -23,6 +57,8 @@ class Task(ABC):
             return DatabricksNotebook(**task)
         elif task["type"] == "databricksLibrary":
             return DatabricksLibrary(**task)
+        elif task["type"] == "noOp":
+            return NoOp(**task)
 
 
     @property
@@ -66,13 +102,61 @@ class Task(ABC):
         pass
 
 
+    async def executeAsync(self)->dict:
+        """Coroutine execution of the task.
+
+        Tasks that don't have a native coroutine implementation
+        are executed on the event loop's default thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute)
+
+
+    def cancel(self):
+        """Stop the execution of the task when it overruns its timeout.
+
+        Tasks that can't be stopped run to the end of their execution and are failed.
+        """
+        pass
+
+
     @abstractmethod
     def isReady(self)->bool:
         pass
 
 
+    def dependentNames(self)->list:
+        """Names of the dependent tasks looking through any task group barriers."""
+
+        names = []
+        for d in self.dependents:
+            if isinstance(d, TaskGroupBarrier):
+                names.extend(d.dependentNames())
+            else:
+                names.append(d.name)
+
+        return names
+
+
+    def references(self, ids:dict)->dict:
+        """The id of the task and its dependents and dependencies by task id.
+
+        Dependencies are [id, condition, operator] and aren't expanded through
+        task group barriers, the barriers are referenced by their own ids.
+        """
+
+        return {
+            "id": ids[self.name],
+            "dependents": [ids[t.name] for t in self.dependents],
+            "dependencies": [[ids[d.task.name], d.condition.name, d.operator.name] for d in self.dependencies]
+        }
+
+
 class DatabricksNotebook(Task):
 
+    __slots__ = ("_status", "_type", "_name", "path", "timeout", "transformation", "_enabled",
+        "retry", "retryBackoff", "retryMaxBackoff", "retryJitter", "retries", "parameters", "cluster", "priority",
+        "memoize", "inputs", "pools", "runId", "_dependencies", "_dependents")
 
     def __init__(self,
                 type:str,
@@ -82,7 +166,15 @@ class DatabricksNotebook(Task):
                 transformation:str = "default",
                 enabled:bool = True,
                 retry:int = 0,
-                parameters:dict = None):
+                retryBackoff:float = 10,
+                retryMaxBackoff:float = 600,
+                retryJitter:float = 0.1,
+                parameters:dict = None,
+                cluster:str = None,
+                priority:int = None,
+                memoize:bool = False,
+                inputs:list = None,
+                pools:dict = None):
 
         self.status = TaskStatus.NONE
         self.type = type
@@ -92,7 +184,17 @@ class DatabricksNotebook(Task):
         self.transformation = transformation
         self.enabled = enabled
         self.retry = retry
+        self.retryBackoff = retryBackoff
+        self.retryMaxBackoff = retryMaxBackoff
+        self.retryJitter = retryJitter
+        self.retries = 0
         self.parameters = parameters
+        self.cluster = cluster
+        self.priority = priority
+        self.memoize = memoize
+        self.inputs = inputs
+        self.pools = poolClaims(pools)
+        self.runId = None
         self.dependencies = list()
         self.dependents = list()
     
@@ -157,22 +259,135 @@ class DatabricksNotebook(Task):
         self._dependents = value
 
 
+    def _runParameters(self)->dict:
+        """Merge the parameter list into notebook base parameters.
+
+        Parameter values can reference the task attributes e.g. {path}{name}.
+        """
+
+        attributes = {"name": self.name, "path": self.path, "transformation": self.transformation}
+        parameters = dict()
+        for p in self.parameters or []:
+            for k, v in p.items():
+                parameters[k] = str(v).format(**attributes)
+
+        return parameters
+
+
+    def _runSubmission(self)->dict:
+        """The Jobs runs-submit request for this notebook.
+
+        Each submission has its own idempotency token so that a request sent again
+        after a lost response doesn't start the notebook twice.
+        """
+
+        return {
+            "run_name": self.name,
+            "idempotency_token": uuid.uuid4().hex,
+            "timeout_seconds": self.timeout,
+            "tasks": [{
+                "task_key": self.name,
+                "existing_cluster_id": self.cluster or os.getenv("DATABRICKS_CLUSTER_ID"),
+                "notebook_task": {
+                    "notebook_path": posixpath.join(self.path, self.name),
+                    "base_parameters": self._runParameters()
+                }
+            }]
+        }
+
+
+    def cacheKey(self)->str:
+        """The content address of the result of running the notebook.
+
+        A hash of the notebook path, resolved parameters, transformation, the notebook
+        source in the workspace and the declared input fingerprints.
+        """
+
+        notebookPath = posixpath.join(self.path, self.name)
+        source = Databricks.getApi().exportNotebook(notebookPath)
+
+        key = json.dumps({
+            "type": self.type,
+            "notebookPath": notebookPath,
+            "parameters": self._runParameters(),
+            "transformation": self.transformation,
+            "source": hashlib.sha256(source).hexdigest(),
+            "inputs": self.inputs
+        }, sort_keys=True, default=str)
+
+        return hashlib.sha256(key.encode()).hexdigest()
+
+
+    def cancel(self):
+        """Fail the waiting execution straight away and cancel the run in the workspace.
+
+        A run that's still being submitted can't be cancelled, it's stopped by the
+        workspace at its timeout_seconds.
+        """
+
+        if self.runId:
+            Databricks.getPoller().cancel(self.runId, TimeoutError(f"Timed out after {self.timeout}s"))
+
+
+    def _submit(self, poller:Databricks.RunPoller):
+
+        self.runId = poller.api.submitRun(self._runSubmission())
+        return poller.watch(self.runId)
+
+
+    def _setRunStatus(self, run:dict, logger):
+
+        resultState = run["state"].get("result_state")
+        if resultState == "SUCCESS":
+            logger.info(f"Succeeded Executing {self.__class__.__name__}: {self.name}, run_id={self.runId}")
+            self.status = TaskStatus.SUCEEDED
+        else:
+            logger.warning(f"Failed Executing {self.__class__.__name__}: {self.name}, run_id={self.runId}, state={resultState}")
+            self.status = TaskStatus.FAILED
+
+
     def execute(self):
+        """Submit the notebook run and wait for the shared run poller to see it finish."""
 
         logger = Logging.getLogger(self.name)
         self.status = TaskStatus.EXECUTING
+        run = dict()
 
         try:
             logger.info(f"Started Executing {self.__class__.__name__}: {self.name}")
-            sleep(2)
-            logger.info(f"Succeeded Executing {self.__class__.__name__}: {self.name}")
-            self.status = TaskStatus.SUCEEDED
+            run = self._submit(Databricks.getPoller()).result()
+            self._setRunStatus(run, logger)
 
-        except:
-            logger.warning(f"Failed Executing {self.__class__.__name__}: {self.name}")
+        except Exception as e:
+            logger.warning(f"Failed Executing {self.__class__.__name__}: {self.name}, {e}")
             self.status = TaskStatus.FAILED
 
-        return dict()
+        return run
+
+
+    async def executeAsync(self):
+
+        logger = Logging.getLogger(self.name)
+        self.status = TaskStatus.EXECUTING
+        run = dict()
+
+        try:
+            logger.info(f"Started Executing {self.__class__.__name__}: {self.name}")
+            poller = Databricks.getPoller()
+            loop = asyncio.get_running_loop()
+            future = await loop.run_in_executor(None, self._submit, poller)
+            run = await asyncio.wrap_future(future)
+            self._setRunStatus(run, logger)
+
+        except asyncio.CancelledError:
+            self.status = TaskStatus.FAILED
+            raise
+
+        except Exception as e:
+            logger.warning(f"Failed Executing {self.__class__.__name__}: {self.name}, {e}")
+            self.status = TaskStatus.FAILED
+
+        return run
 
 
     def isReady(self)->bool:
@@ -196,8 +411,8 @@ class DatabricksNotebook(Task):
         return ready
 
 
-    def toDict(self):
-        return {
+    def toDict(self, ids:dict=None):
+        task = {
             "name" : self.name ,
             "status" : self.status.name,
             "type" : self.type,
@@ -206,11 +421,23 @@ class DatabricksNotebook(Task):
             "transformation" : self.transformation,
             "enabled" : self.enabled,
             "retry" : self.retry,
+            "retries" : self.retries,
             "parameters" : self.parameters,
-            "dependents": [d.name for d in self.dependents],
-            "dependencies": [d.toDict() for d in self.dependencies]
+            "cluster" : self.cluster,
+            "priority" : self.priority,
+            "memoize" : self.memoize,
+            "inputs" : self.inputs,
+            "pools" : self.pools
         }
 
+        if ids is None:
+            task["dependents"] = self.dependentNames()
+            task["dependencies"] = [e.toDict() for d in self.dependencies for e in d.expand()]
+        else:
+            task.update(self.references(ids))
+
+        return task
+
 
     def __str__(self):
 
@@ -219,6 +446,7 @@ class DatabricksNotebook(Task):
 
 class DatabricksLibrary(Task):
 
+    __slots__ = ("_status", "_type", "_name", "_enabled", "_dependencies", "_dependents")
 
     def __init__(self, type:str, name:str):
 
@@ -292,9 +520,11 @@ class DatabricksLibrary(Task):
 
     def execute(self):
         logger = Logging.getLogger(self.name)
+        self.status = TaskStatus.EXECUTING
         logger.info(f"Started Executing {self.__class__.__name__}: {self.name}")
         sleep(5)
         logger.info(f"Finished Executing {self.__class__.__name__}: {self.name}")
+        self.status = TaskStatus.SUCEEDED
         return dict()
 
 
@@ -320,8 +550,132 @@ class DatabricksLibrary(Task):
 
 
 
+class NoOp(Task):
+    """A task that does no work and succeeds straight away.
+
+    Used to measure the cost of loading and scheduling a dag on its own.
+    """
+
+    __slots__ = ("_status", "_type", "_name", "_enabled", "priority", "pools", "_dependencies", "_dependents")
+
+    def __init__(self, type:str, name:str, enabled:bool=True, priority:int=None, pools:dict=None):
+
+        self.status = TaskStatus.NONE
+        self.type = type
+        self.name = name
+        self.enabled = enabled
+        self.priority = priority
+        self.pools = poolClaims(pools)
+        self.dependencies = list()
+        self.dependents = list()
+
+
+    @property
+    def status(self)->TaskStatus:
+        return self._status
+
+
+    @status.setter
+    def status(self, value:TaskStatus):
+        self._status = value
+
+
+    @property
+    def name(self)->str:
+        return self._name
+
+
+    @name.setter
+    def name(self, value:str):
+        self._name = value
+
+
+    @property
+    def enabled(self)->bool:
+        return self._enabled
+
+
+    @enabled.setter
+    def enabled(self, value:bool):
+        self._enabled = value
+
+
+    @property
+    def type(self)->str:
+        return self._type
+
+
+    @type.setter
+    def type(self, value:str):
+        self._type = value
+
+
+    @property
+    def dependencies(self)->list:
+        return self._dependencies
+
+
+    @dependencies.setter
+    def dependencies(self, value:list):
+        self._dependencies = value
+
+
+    @property
+    def dependents(self)->list:
+        return self._dependents
+
+
+    @dependents.setter
+    def dependents(self, value:list):
+        self._dependents = value
+
+
+    def execute(self):
+        self.status = TaskStatus.SUCEEDED
+        return dict()
+
+
+    async def executeAsync(self):
+        return self.execute()
+
+
+    def isReady(self)->bool:
+        """The task is ready when all of it's AND or any of it's OR dependencies are full filled."""
+
+        andDependencies = [d.isReady() for d in self.dependencies if d.operator == DependencyOperator.AND]
+        orDependencies = [d.isReady() for d in self.dependencies if d.operator == DependencyOperator.OR]
+
+        return (all(andDependencies) or any(orDependencies)) and self.status == TaskStatus.QUEUED
+
+
+    def toDict(self, ids:dict=None):
+        task = {
+            "name" : self.name,
+            "status" : self.status.name,
+            "type" : self.type,
+            "enabled" : self.enabled,
+            "priority" : self.priority,
+            "pools" : self.pools
+        }
+
+        if ids is None:
+            task["dependents"] = self.dependentNames()
+            task["dependencies"] = [e.toDict() for d in self.dependencies for e in d.expand()]
+        else:
+            task.update(self.references(ids))
+
+        return task
+
+
+    def __str__(self):
+
+        return json.dumps(self.toDict(), indent=4)
+
+
 class PipelineOrigin(Task):
 
+    __slots__ = ("_status", "_type", "_name", "_enabled", "_dependents")
+
     def __init__(self, type:str, name:str):
 
         self.status = TaskStatus.NONE
@@ -394,11 +748,17 @@ class PipelineOrigin(Task):
     def execute(self):
         logger = Logging.getLogger(self.name)
         logger.info(f"Started Executing {self.__class__.__name__}: {self.name}")
-        sleep(5)
+        # the origin does no work, it completes so that
+        # the dependency conditions of the first tasks are met.
+        self.status = TaskStatus.SUCEEDED
         logger.info(f"Finished Executing {self.__class__.__name__}: {self.name}")
         return dict()
 
 
+    async def executeAsync(self):
+        return self.execute()
+
+
     def isReady(self)->bool:
         """work out if it's ok to process. 
         
@@ -408,18 +768,139 @@ class PipelineOrigin(Task):
         return True
 
 
-    def toDict(self):
-        return {
+    def toDict(self, ids:dict=None):
+        task = {
             "name" : self.name ,
             "status" : self.status.name,
             "type" : self.type,
-            "enabled" : self.enabled,
-            "dependents" : [d.name for d in self.dependents]
+            "enabled" : self.enabled
         }
 
+        if ids is None:
+            task["dependents"] = self.dependentNames()
+        else:
+            task.update(self.references(ids))
+
+        return task
+
 
     def __str__(self):
 
         return json.dumps(self.toDict(), indent=4)
 
 
+class TaskGroupBarrier(Task):
+    """A virtual node that joins the tasks of a task group.
+
+    When a task group depends on another task group, each task depends on one
+    barrier per upstream group, condition and operator. The barrier depends on
+    every task of the upstream group with that condition and operator, so two
+    groups of N and M tasks are joined with N+M edges instead of N*M.
+    The scheduler completes a barrier as soon as it's runnable without queueing it.
+    """
+
+    __slots__ = ("_status", "_type", "_name", "_enabled", "_dependencies", "_dependents")
+
+    def __init__(self, name:str):
+
+        self.status = TaskStatus.NONE
+        self.type = self.__class__.__name__
+        self.name = name
+        self.enabled = True
+        self.dependencies = []
+        self.dependents = []
+
+
+    @property
+    def status(self)->TaskStatus:
+        return self._status
+
+
+    @status.setter
+    def status(self, value:TaskStatus):
+        self._status = value
+
+
+    @property
+    def name(self)->str:
+        return self._name
+
+
+    @name.setter
+    def name(self, value:str):
+        self._name = value
+
+
+    @property
+    def enabled(self)->bool:
+        return self._enabled
+
+
+    @enabled.setter
+    def enabled(self, value:bool):
+        self._enabled = value
+
+
+    @property
+    def type(self)->str:
+        return self._type
+
+
+    @type.setter
+    def type(self, value:str):
+        self._type = value
+
+
+    @property
+    def dependencies(self)->list:
+        return self._dependencies
+
+
+    @dependencies.setter
+    def dependencies(self, value:list):
+        self._dependencies = value
+
+
+    @property
+    def dependents(self)->list:
+        return self._dependents
+
+
+    @dependents.setter
+    def dependents(self, value:list):
+        self._dependents = value
+
+
+    def execute(self):
+        self.status = TaskStatus.SUCEEDED
+        return dict()
+
+
+    def isReady(self)->bool:
+        """The barrier is ready when all of its AND or any of its OR dependencies are full filled."""
+
+        andDependencies = [d.isReady() for d in self.dependencies if d.operator == DependencyOperator.AND]
+        orDependencies = [d.isReady() for d in self.dependencies if d.operator == DependencyOperator.OR]
+
+        return (bool(andDependencies) and all(andDependencies)) or any(orDependencies)
+
+
+    def toDict(self, ids:dict=None):
+        task = {
+            "name" : self.name,
+            "status" : self.status.name,
+            "type" : self.type
+        }
+
+        if ids is None:
+            task["dependents"] = self.dependentNames()
+            task["dependencies"] = [d.toDict() for d in self.dependencies]
+        else:
+            task.update(self.references(ids))
+
+        return task
+
+
+    def __str__(self):
+
+        return json.dumps(self.toDict(), indent=4)
@@ -1,56 +1,903 @@
 import threading
-from queue import Queue
+import asyncio
+import itertools
+import heapq
+import random
 import time
-import uuid
-from .Task import Task, TaskStatus
+from collections import deque
+from contextlib import contextmanager
+from queue import Queue, Empty
+from enum import Enum
+from .Task import Task, TaskStatus, TaskGroupBarrier
+from .Dependency import Dependency, isMet
+from .CompactDag import CompactTaskView
+from .DependencyStatus import DependencyOperator
 from . import Logging
-import os
-import uuid
 
 
-class Worker:
+class ExecutionEngine(Enum):
+    # a pool of worker threads blocking on task execution
+    THREAD = 1
+    # a single event loop awaiting task coroutines
+    ASYNCIO = 2
+    # thread workers dispatching tasks to worker processes or hosts over a transport
+    DISTRIBUTED = 3
+
+
+class TaskObserver:
+    """Receives the task state changes of a project run.
+
+    Called from the worker hot path so implementations must return quickly.
+    """
+
+    def runStarted(self, runId:str, project:str):
+        pass
+
+
+    def taskQueued(self, task:Task):
+        pass
+
+
+    def taskStarted(self, task:Task):
+        pass
+
+
+    def taskCached(self, task:Task):
+        """A memoized task was completed from the result cache, called before taskFinished."""
+        pass
+
+
+    def taskFinished(self, task:Task):
+        pass
+
+
+    def runFinished(self, status:str):
+        pass
+
+
+class SchedulePriority(Enum):
+    # tasks run in the order they become runnable
+    FIFO = 1
+    # runnable tasks with the longest remaining path through their dependents run first
+    CRITICAL_PATH = 2
+
+
+class PriorityTaskQueue(Queue):
+    """A queue of tasks that hands out the highest ranked task first.
+
+    Tasks are put and got like a plain Queue, ties keep the order the tasks
+    were put in.
+    """
+
+    def __init__(self, ranks:dict):
+        super().__init__()
+        self._ranks = ranks
+
+
+    def _init(self, maxsize:int):
+        self.queue = []
+        self._counter = itertools.count()
+
+
+    def _qsize(self)->int:
+        return len(self.queue)
+
+
+    def _put(self, task:Task):
+        heapq.heappush(self.queue, (self._ranks.get(task, 0), next(self._counter), task))
+
+
+    def _get(self)->Task:
+        return heapq.heappop(self.queue)[2]
+
+
+class TaskTimer:
+    """Calls back tasks when their delay is due.
+
+    Timers are held in a heap ordered by due time and served by a single thread,
+    it parks failed tasks until their retry is due and enforces task timeouts
+    without a thread per task. Cancelled timers are dropped when they're due or
+    when they make up most of the heap. The thread exits once every timer has gone
+    off or been cancelled and is started again by the next call.
+    """
 
     def __init__(self):
 
-        self._queue = Queue()
+        self._heap = []
+        self._cancelled = 0
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+
+    def call(self, delay:float, callback, task:Task)->list:
+        """Call back the task after the delay, returns the timer to cancel it."""
+
+        timer = [time.monotonic() + delay, next(self._counter), task, callback]
+        with self._condition:
+            heapq.heappush(self._heap, timer)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name="TaskTimer", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+        return timer
+
+
+    def cancel(self, timer:list)->bool:
+        """Cancel the timer, returns False when it had already gone off."""
+
+        with self._condition:
+            cancelled = bool(timer[3])
+            if cancelled:
+                timer[3] = None
+                self._cancelled += 1
+
+            # timeouts are mostly cancelled long before they're due
+            if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+                self._heap = [t for t in self._heap if t[3]]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+            if self._cancelled == len(self._heap):
+                # wake the thread to exit
+                self._condition.notify()
+
+            return cancelled
+
+
+    def _run(self):
+
+        while True:
+            with self._condition:
+                while True:
+                    if self._cancelled == len(self._heap):
+                        # nothing left to call back
+                        self._heap = []
+                        self._cancelled = 0
+                        self._thread = None
+                        return
+
+                    if self._heap[0][0] <= time.monotonic():
+                        break
+                    self._condition.wait(self._heap[0][0] - time.monotonic())
+
+                timer = heapq.heappop(self._heap)
+                due, i, task, callback = timer
+                if callback:
+                    # a timer that's gone off can't be cancelled
+                    timer[3] = None
+                else:
+                    self._cancelled -= 1
+
+            if callback:
+                callback(task)
+
+
+class WorkerPool:
+    """Worker threads that grow with the runnable tasks and shrink when they're idle.
+
+    A thread is started when a task is queued while there are more queued tasks than
+    idle threads, up to maxWorkers. A thread that's been idle for idleTimeout seconds
+    exits while there are more than minWorkers. Closing the pool stops all the threads.
+    """
+
+    def __init__(self, worker, maxWorkers:int, minWorkers:int=0, idleTimeout:float=5):
+
+        self.worker = worker
+        self.maxWorkers = maxWorkers
+        self.minWorkers = minWorkers
+        self.idleTimeout = idleTimeout
+        self.peak = 0
+        self._size = 0
+        self._idle = 0
+        self._threads = set()
+        self._names = itertools.count()
+        self._closed = False
         self._lock = threading.Lock()
 
 
-    def _worker(self):
+    @property
+    def size(self)->int:
+        return self._size
+
+
+    @property
+    def busy(self)->int:
+        return self._size - self._idle
+
+
+    @property
+    def utilisation(self)->float:
+        """The fraction of the threads that are executing a task."""
+
+        return self.busy / self._size if self._size else 0.0
+
+
+    def grow(self):
+        """Start a thread if there are more queued tasks than idle threads."""
+
+        # a full pool doesn't need the lock to tell it can't grow
+        if self._size >= self.maxWorkers:
+            return
+
+        with self._lock:
+            if not self._closed and self._size < self.maxWorkers and self.worker._queue.qsize() > self._idle:
+                self._spawn()
+
+
+    def _spawn(self):
+
+        thread = threading.Thread(target=self._run, name=f"MyceliumWorker-{next(self._names)}", daemon=True)
+        self._size += 1
+        self._idle += 1
+        self._threads.add(thread)
+        self.peak = max(self.peak, self._size)
+        thread.start()
+
+
+    def _run(self):
+
+        logger = Logging.getLogger(threading.current_thread().name)
+        queue = self.worker._queue
 
         while True:
+            try:
+                task = queue.get(timeout=self.idleTimeout)
 
-            tname = threading.currentThread()._name + "_" + str(uuid.uuid4())
-            logger = Logging.getLogger(tname)
+            except Empty:
+                with self._lock:
+                    # leave before looking at the queue so that a task queued meanwhile
+                    # either stops the thread leaving or sees it gone and grows the pool
+                    self._exit()
+                    if queue.qsize() or self._size < self.minWorkers:
+                        self._enter()
+                        continue
+                return
 
-            task:Task = self._queue.get()
-            logger.debug(f"Trying: {task.name}")
+            if task is None:
+                with self._lock:
+                    self._exit()
+                queue.task_done()
+                return
 
-            # needs to be locked because we're reading the status
-            # of the task that may already be processing.
             with self._lock:
-                isReady = task.isReady()
+                self._idle -= 1
+
+            try:
+                self.worker._process(task, logger)
+            finally:
+                with self._lock:
+                    self._idle += 1
+
 
-            if isReady:
+    def _enter(self):
 
-                if task.enabled:
-                    result = task.execute()
+        self._size += 1
+        self._idle += 1
+        self._threads.add(threading.current_thread())
+
+
+    def _exit(self):
+
+        self._size -= 1
+        self._idle -= 1
+        self._threads.discard(threading.current_thread())
+
+
+    def close(self, timeout:float=None):
+        """Stop the threads once they've finished their tasks and wait for them to exit."""
+
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+
+        for t in threads:
+            self.worker._queue.put(None)
+        for t in threads:
+            t.join(timeout)
+
+
+class Worker:
+
+    def __init__(self):
+
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._observers = list()
+        self._metrics = None
+        self._resultCache = None
+        # executes tasks somewhere other than the worker thread, see Distributed.RemoteExecutor
+        self._executor = None
+        # resource pools gating the dispatch of tasks that claim slots, see ResourcePool.ResourcePools
+        self._pools = None
+        # the worker threads of the thread engines, see WorkerPool
+        self._pool = None
+        # threads shared with the runs of other projects, see SharedExecutor.SharedExecutor
+        self._shared = None
+        self._timer = TaskTimer()
+        self._initSchedule()
+
+
+    def _instrument(self, metrics):
+        """Collect scheduler metrics, see Metrics.SchedulerMetrics."""
+
+        if self._metrics:
+            return
+
+        self._metrics = metrics
+        self._lock = metrics.instrumentLock(self._lock)
+        self._observers.append(metrics)
+        # the queue is replaced for each run so it's looked up when collected
+        metrics.queueDepth.function = lambda: self._queue.qsize()
+        metrics.poolSize.function = lambda: self._pool.size if self._pool else 0
+
+
+    def _rankCriticalPath(self, durations:dict=None, order:list=None)->dict:
+        """Rank tasks by their priority attribute and then their remaining critical path.
+
+        The critical path of a task is its own duration plus the longest critical path
+        of its dependents. Durations are looked up by task name and default to 1 so that
+        without any durations the rank is the longest chain of dependents. Order is the
+        topological order of the dag, see Dag._validateDag, when there isn't one or a
+        task has dependents that aren't in it, because they're unreachable, the
+        dependents are walked to cost them first.
+        Returns sort keys where the smallest key is the most urgent.
+        """
+
+        durations = durations or dict()
+        criticalPath = dict()
+
+        # in reverse topological order the dependents are costed before the task
+        for task in reversed(order or []):
+            if task in self._edges and all(t in criticalPath for t, _, _ in self._edges[task]):
+                longest = max((criticalPath[t] for t, _, _ in self._edges[task]), default=0)
+                weight = 0 if isinstance(task, TaskGroupBarrier) else durations.get(task.name, 1)
+                criticalPath[task] = weight + longest
+
+        # iterative post order walk so that dependents are costed before the task
+        for root in self._edges:
+            if root in criticalPath:
+                continue
+
+            stack = [(root, False)]
+            while stack:
+                task, expanded = stack.pop()
+                if task in criticalPath:
+                    continue
+
+                if expanded:
+                    longest = max((criticalPath[t] for t, _, _ in self._edges[task]), default=0)
+                    weight = 0 if isinstance(task, TaskGroupBarrier) else durations.get(task.name, 1)
+                    criticalPath[task] = weight + longest
 
                 else:
-                    logger.info(f"Skipping disabled task: {task}")
+                    stack.append((task, True))
+                    stack.extend((t, False) for t, _, _ in self._edges[task] if t not in criticalPath)
+
+        return {
+            t: (-(getattr(t, "priority", None) or 0), -criticalPath[t])
+            for t in criticalPath
+        }
+
+
+    def _initSchedule(self, origin:Task=None, priority:SchedulePriority=SchedulePriority.FIFO, durations:dict=None, selection:list=None, order:list=None):
+        """Index the dependency edges of the dag reachable from the origin.
+
+        Each task keeps a counter of unmet AND dependencies and a flag for a met OR
+        dependency. When a task finishes only the edges leaving that task are evaluated
+        so a task is queued exactly once, at the moment it becomes runnable, and the
+        scheduling cost of a whole run is O(V+E). With CRITICAL_PATH priority the runnable
+        tasks are queued by rank using durations by task name as weights, costed in the
+        topological order when it's given. When a selection of tasks is given only the
+        edges between them are indexed, see _indexSelection. The edges of a CompactDag
+        are read from its arrays rather than materialized.
+        """
+
+        # parent task -> list of (dependent task, condition, operator) edges
+        self._edges = dict()
+        # task -> number of AND dependencies not yet met
+        self._unmetAnd = dict()
+        # task -> total number of AND dependencies
+        self._andCount = dict()
+        # tasks that have at least one met OR dependency
+        self._orMet = set()
+        # task -> total number of OR dependencies
+        self._orCount = dict()
+        # tasks with an AND dependency that can no longer be met
+        self._andDead = set()
+        # task -> number of OR dependencies that can no longer be met
+        self._orDead = dict()
+        # tasks with a dependency that can no longer be met because its task failed
+        self._upstreamFailed = set()
+        # tasks that have been put on the queue
+        self._scheduled = set()
+        # memoized task -> the cache key of its run
+        self._cacheKeys = dict()
+        # executing task -> the timer of its timeout
+        self._deadlines = dict()
+
+        if not origin:
+            return
+
+        if selection is not None:
+            self._indexSelection(origin, selection)
+            pending = ()
+        else:
+            # breadth first so that dependents are released in the order they're declared
+            visited = {origin}
+            pending = deque([origin])
+
+        while pending:
+            task = pending.popleft()
+            if isinstance(task, CompactTaskView):
+                self._edges[task] = task.edges
+                operators = task.dependencyOperators
+                andCount = operators.count(DependencyOperator.AND.value)
+                orCount = len(operators) - andCount
+            else:
+                self._edges.setdefault(task, [])
+                andCount = 0
+                dependencies = task.dependencies
+                for d in dependencies:
+                    self._edges.setdefault(d.task, []).append((task, d.condition, d.operator))
+                    if d.operator == DependencyOperator.AND:
+                        andCount += 1
+                orCount = len(dependencies) - andCount
+
+            self._andCount[task] = andCount
+            self._unmetAnd[task] = andCount
+            self._orCount[task] = orCount
+
+            for t in task.dependents:
+                if t not in visited:
+                    visited.add(t)
+                    pending.append(t)
+
+        ranks = None
+        if priority == SchedulePriority.CRITICAL_PATH:
+            ranks = self._rankCriticalPath(durations, order)
+            self._queue = PriorityTaskQueue(ranks)
+        else:
+            self._queue = Queue()
+
+        if self._pools:
+            self._pools.reset(ranks)
+
+
+    def _indexSelection(self, origin:Task, selection:list):
+        """Index the edges between the selected tasks, a subgraph of the dag.
+
+        Dependencies on tasks outside the selection are left out as if they're met, a
+        selected task without any selected dependencies depends on the origin.
+        """
+
+        selected = set(selection)
+        self._edges[origin] = []
+        self._andCount[origin] = 0
+        self._unmetAnd[origin] = 0
+        self._orCount[origin] = 0
 
-                for t in task.dependents:
+        for task in selection:
+            self._edges.setdefault(task, [])
+            dependencies = [d for d in task.dependencies if d.task in selected]
+            if not dependencies:
+                dependencies = [Dependency(origin)]
 
-                    # don't need to lock it because no threads
-                    # can interact with it until it's on the queue by convention
-                    # if this changes then it needs to be locked.
-                    with self._lock:
-                        t.status = TaskStatus.QUEUED
-                    
-                    self._queue.put(t)
+            andCount = 0
+            for d in dependencies:
+                self._edges.setdefault(d.task, []).append((task, d.condition, d.operator))
+                if d.operator == DependencyOperator.AND:
+                    andCount += 1
 
+            self._andCount[task] = andCount
+            self._unmetAnd[task] = andCount
+            self._orCount[task] = len(dependencies) - andCount
+
+
+    def _isRunnable(self, task:Task)->bool:
+        """A task is runnable when all of its AND or any of its OR dependencies are met."""
+
+        return (self._andCount[task] > 0 and self._unmetAnd[task] == 0) or task in self._orMet
+
+
+    def _isDead(self, task:Task)->bool:
+        """A task is dead when neither its AND nor its OR dependencies can be met any more."""
+
+        return (self._andCount[task] == 0 or task in self._andDead) and \
+            self._orDead.get(task, 0) == self._orCount[task]
+
+
+    def _release(self, task:Task)->list:
+        """Evaluate the dependency edges leaving a finished task.
+
+        Returns the dependents that have become runnable, each one is only
+        ever returned once per run. The finished task's status is final so a
+        dependency on it that isn't met never will be, dependents that are left
+        with no dependencies that can be met are never run and the edges leaving
+        them are evaluated in the same walk. They're marked UPSTREAM_FAILED when
+        one of those dependencies is on a failed task and SKIPPED otherwise.
+        """
+
+        runnable = []
+        pruned = []
+        checks = 0
+        with self._lock:
+            finished = deque([task])
+            while finished:
+                source = finished.popleft()
+                failed = source.status in (TaskStatus.FAILED, TaskStatus.UPSTREAM_FAILED)
+                for dependent, condition, operator in self._edges.get(source, []):
+                    checks += 1
+                    if dependent in self._scheduled:
+                        continue
+
+                    if not isMet(condition, source.status):
+                        if operator == DependencyOperator.AND:
+                            self._andDead.add(dependent)
+                        else:
+                            self._orDead[dependent] = self._orDead.get(dependent, 0) + 1
+                        if failed:
+                            self._upstreamFailed.add(dependent)
+
+                        if self._isDead(dependent):
+                            self._scheduled.add(dependent)
+                            if dependent in self._upstreamFailed:
+                                dependent.status = TaskStatus.UPSTREAM_FAILED
+                            else:
+                                dependent.status = TaskStatus.SKIPPED
+                            finished.append(dependent)
+                            if not isinstance(dependent, TaskGroupBarrier):
+                                pruned.append(dependent)
+                        continue
+
+                    if operator == DependencyOperator.AND:
+                        self._unmetAnd[dependent] -= 1
+                    else:
+                        self._orMet.add(dependent)
+
+                    if self._isRunnable(dependent):
+                        self._scheduled.add(dependent)
+
+                        # task group barriers complete straight away
+                        # releasing the dependents of the group
+                        if isinstance(dependent, TaskGroupBarrier):
+                            dependent.status = TaskStatus.SUCEEDED
+                            finished.append(dependent)
+                        else:
+                            dependent.status = TaskStatus.QUEUED
+                            runnable.append(dependent)
+
+        if self._metrics:
+            self._metrics.readinessChecks.inc(checks)
+
+        for t in runnable:
+            self._notify("taskQueued", t)
+
+        for t in pruned:
+            self._notify("taskFinished", t)
+
+        return runnable
+
+
+    def _notify(self, event:str, task:Task):
+
+        for o in self._observers:
+            try:
+                getattr(o, event)(task)
+            except Exception as e:
+                # a failing observer mustn't stop the scheduler
+                logger = Logging.getLogger(threading.current_thread().name)
+                logger.warning(f"Failed notifying {o.__class__.__name__} of {event}: {task.name}, {e}")
+
+
+    def _schedule(self, task:Task):
+
+        with self._lock:
+            self._scheduled.add(task)
+            task.status = TaskStatus.QUEUED
+
+        self._notify("taskQueued", task)
+
+
+    def _enqueue(self, task:Task):
+
+        self._schedule(task)
+        self._dispatch([task])
+
+
+    def _dispatch(self, tasks:list):
+        """Put runnable tasks on the queue, tasks claiming pool slots wait until they're free."""
+
+        for t in tasks:
+            if not self._pools or not t.enabled:
+                self._put(t)
             else:
-                logger.debug(f"Task not ready: {task.name}")
+                for admitted in self._pools.acquire(t):
+                    self._put(admitted)
+
+
+    def _put(self, task:Task):
+
+        self._queue.put(task)
+        if self._pool:
+            self._pool.grow()
+        elif self._shared:
+            self._shared.notify()
+
+
+    def _free(self, task:Task):
+        """Give back the pool slots of a task that's finished executing, dispatching the tasks waiting on them."""
+
+        if self._pools:
+            for t in self._pools.release(task):
+                self._put(t)
+
+
+    def _start(self, origin:Task, done:set=None):
+        """Queue the origin, or when resuming a run the frontier of the done tasks.
+
+        Done tasks are restored as succeeded and never queued, the edges leaving them
+        are evaluated as if they had just finished so their dependents are queued
+        once their dependency conditions are met.
+        """
+
+        if not done:
+            self._enqueue(origin)
+            return
+
+        done = {origin, *done}
+        with self._lock:
+            for t in done:
+                t.status = TaskStatus.SUCEEDED
+                self._scheduled.add(t)
+
+        for t in done:
+            self._dispatch(self._release(t))
+
+
+    def _isMemoized(self, task:Task)->bool:
+        return self._resultCache is not None and getattr(task, "memoize", False)
+
+
+    def _fromCache(self, task:Task, logger)->bool:
+        """Complete a memoized task from the result cache if its cache key has a successful result."""
+
+        try:
+            key = task.cacheKey()
+        except Exception as e:
+            logger.warning(f"Failed getting the cache key of {task.name}, executing it: {e}")
+            return False
+
+        cached = self._resultCache.get(key)
+        if cached:
+            logger.info(f"Skipping unchanged task: {task.name}, cached from run_id={cached['runId']}")
+            task.status = TaskStatus.SUCEEDED
+            self._notify("taskCached", task)
+            return True
+
+        self._cacheKeys[task] = key
+        return False
+
+
+    def _cacheResult(self, task:Task):
+
+        if task.status == TaskStatus.SUCEEDED:
+            key = self._cacheKeys.pop(task, None)
+            if key:
+                try:
+                    self._resultCache.put(key, task.name, getattr(task, "runId", None))
+                except Exception as e:
+                    logger = Logging.getLogger(threading.current_thread().name)
+                    logger.warning(f"Failed caching the result of {task.name}: {e}")
+
+
+    def _retryDelay(self, task:Task, logger)->float:
+        """The backoff before retrying a failed task, None when it's not retried.
+
+        The delay doubles with each retry from retryBackoff up to retryMaxBackoff
+        and is reduced by a random fraction of up to retryJitter so that tasks that
+        failed together don't all retry at once.
+        """
+
+        if task.status != TaskStatus.FAILED or getattr(task, "retries", None) is None or task.retries >= (task.retry or 0):
+            return None
+
+        task.retries += 1
+        delay = min(task.retryMaxBackoff, task.retryBackoff * 2 ** (task.retries - 1))
+        delay *= 1 - task.retryJitter * random.random()
+        task.status = TaskStatus.QUEUED
+        logger.info(f"Retrying task: {task.name} in {delay:.1f}s, retry {task.retries} of {task.retry}")
+
+        return delay
+
+
+    def _watch(self, task:Task)->list:
+        """Start the timeout of a task's execution, None when the task doesn't have one."""
+
+        timeout = getattr(task, "timeout", None)
+        if timeout:
+            with self._lock:
+                deadline = self._timer.call(timeout, self._timeout, task)
+                self._deadlines[task] = deadline
+            return deadline
+
+
+    def _timeout(self, task:Task):
+
+        with self._lock:
+            # the execution finished before its timeout went off
+            if task not in self._deadlines:
+                return
+
+        logger = Logging.getLogger(threading.current_thread().name)
+        logger.warning(f"Timed out task: {task.name} after {task.timeout}s, cancelling it")
+        if self._executor:
+            self._executor.cancel(task)
+        else:
+            task.cancel()
+
+
+    def _unwatch(self, task:Task, deadline:list):
+        """Stop the timeout of a task's execution, a task that overran it has failed.
+
+        The timeout can go off between the execution returning and its timer being
+        cancelled, the task only overran when it finished after the timeout was due.
+        """
+
+        finished = time.monotonic()
+        if not deadline:
+            return
+
+        with self._lock:
+            self._deadlines.pop(task, None)
+
+        if not self._timer.cancel(deadline) and finished >= deadline[0]:
+            task.status = TaskStatus.FAILED
+
+
+    def _requeue(self, task:Task):
+        """Queue a parked task again.
+
+        The failed attempt wasn't marked done so that the queue never looks empty
+        while tasks are parked, it's marked done once the retry is dispatched.
+        """
+
+        self._dispatch([task])
+        self._queue.task_done()
+
+
+    def _worker(self):
+
+        logger = Logging.getLogger(threading.current_thread().name)
+
+        while True:
+            self._process(self._queue.get(), logger)
+
+
+    def _begin(self, task:Task, logger)->bool:
+        """Start a task taken off the queue, returns False when it's complete without executing it."""
+
+        logger.debug(f"Running: {task.name}")
+        self._notify("taskStarted", task)
+
+        if not task.enabled:
+            # disabled tasks pass through so that their dependents still run
+            logger.info(f"Skipping disabled task: {task.name}")
+            task.status = TaskStatus.SUCEEDED
+            return False
+
+        return True
+
+
+    @contextmanager
+    def _executing(self, task:Task, logger):
+        """Enforce the timeout of a task's execution and cache its successful result.
+
+        A task whose execution raises is failed, it's still finished so that its
+        dependents are released and the queue isn't left waiting on it.
+        """
+
+        try:
+            deadline = self._watch(task)
+            try:
+                yield
+            finally:
+                self._unwatch(task, deadline)
+            self._cacheResult(task)
+
+        except Exception as e:
+            logger.warning(f"Failed Executing {task.__class__.__name__}: {task.name}, {e}")
+            task.status = TaskStatus.FAILED
+
+
+    def _finish(self, task:Task, logger, park)->bool:
+        """Finish an attempt of a task, returns True when it's parked for a retry.
+
+        The pool slots are given back first. A failed task with retries left is
+        parked and its callback park is called once its backoff is due, otherwise
+        the dependents it releases are queued.
+        """
+
+        self._free(task)
+
+        delay = self._retryDelay(task, logger)
+        if delay is not None:
+            # free the worker while the task waits out its backoff
+            self._timer.call(delay, park, task)
+            return True
+
+        self._notify("taskFinished", task)
+        self._dispatch(self._release(task))
+
+        self._queue.task_done()
+        return False
+
+
+    def _process(self, task:Task, logger):
+        """Execute a task taken off the queue and queue the dependents it releases."""
+
+        if self._begin(task, logger):
+            with self._executing(task, logger):
+                # memoized tasks are completed from the result of an unchanged successful run
+                if not (self._isMemoized(task) and self._fromCache(task, logger)):
+                    self._executor.execute(task) if self._executor else task.execute()
+
+        self._finish(task, logger, self._requeue)
+
+
+    async def _workAsync(self, origin:Task, maxParallel:int, done:set=None):
+        """Drive the dag from a single event loop.
+
+        Uses the same dependency counters and queue as the thread workers, up to
+        maxParallel tasks are taken off the queue and awaited at once. Done tasks
+        are restored as succeeded when resuming a run, see _start.
+        """
+
+        logger = Logging.getLogger(threading.current_thread().name)
+        loop = asyncio.get_running_loop()
+        running = set()
+        # tasks parked on the retry timer and woken on the loop when they're due
+        parked = 0
+        wake = asyncio.Event()
+
+        def resume(task:Task):
+            nonlocal parked
+            parked -= 1
+            self._requeue(task)
+            wake.set()
+
+        async def run(task:Task):
+            nonlocal parked
+
+            if self._begin(task, logger):
+                with self._executing(task, logger):
+                    # memoized tasks are completed from the result of an unchanged successful run
+                    if not (self._isMemoized(task) and await loop.run_in_executor(None, self._fromCache, task, logger)):
+                        await task.executeAsync()
+
+            if self._finish(task, logger, lambda t: loop.call_soon_threadsafe(resume, t)):
+                parked += 1
+
+        self._start(origin, done)
+
+        while True:
+            while len(running) < maxParallel and not self._queue.empty():
+                running.add(asyncio.ensure_future(run(self._queue.get_nowait())))
+
+            if not running and not parked:
+                break
+
+            waiter = None
+            if parked:
+                wake.clear()
+                waiter = asyncio.ensure_future(wake.wait())
+                running.add(waiter)
 
-            self._queue.task_done()
+            finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            if waiter:
+                running.discard(waiter)
+                waiter.cancel()
 
+            for f in finished:
+                f.result()
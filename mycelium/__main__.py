@@ -0,0 +1,49 @@
+"""Execute a mycelium project.
+
+    python -m mycelium ./pipelineProjects/ --targets taskgroup2 --downstream
+
+Without targets the whole dag is executed. Targets are task or task group names,
+they're executed with the tasks they depend on and with --downstream the tasks that
+depend on them. The run id and status are printed as json.
+"""
+import argparse
+import json
+import sys
+from .Project import Project
+from .Worker import ExecutionEngine, SchedulePriority
+
+
+def main(args:list=None)->dict:
+
+    parser = argparse.ArgumentParser(prog="mycelium", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", help="projects directory containing mycelium.yaml, defaults to MYCELIUMPROJECTSDIR")
+    parser.add_argument("--targets", nargs="+", help="task or task group names to execute with their upstream tasks")
+    parser.add_argument("--downstream", action="store_true", help="also execute the tasks that depend on the targets")
+    parser.add_argument("--engine", choices=[e.name for e in ExecutionEngine], default=ExecutionEngine.THREAD.name)
+    parser.add_argument("--schedule", choices=[s.name for s in SchedulePriority])
+    parser.add_argument("--max-parallel", type=int, default=0)
+    parser.add_argument("--resume", help="id of a run in the run history to carry on")
+    parser.add_argument("--no-history", action="store_true", help="don't record the run in the run history")
+    options = parser.parse_args(args)
+
+    if options.downstream and not options.targets:
+        parser.error("--downstream requires --targets")
+
+    project = Project(options.directory)
+    result = project.execute(
+        maxParallel=options.max_parallel,
+        engine=options.engine,
+        schedule=options.schedule,
+        history=not options.no_history,
+        resume=options.resume,
+        targets=options.targets,
+        downstream=options.downstream)
+
+    json.dump(result, sys.stdout)
+    print()
+    return result
+
+
+if __name__ == "__main__":
+    result = main()
+    sys.exit(0 if result.get("status") == "SUCEEDED" else 1)
@@ -0,0 +1,43 @@
+import os
+import sys
+import shutil
+import pytest
+
+# the logging configuration is loaded from the projects directory
+os.environ.setdefault("MYCELIUMPROJECTSDIR", "./pipelineProjects/")
+
+PROJECTS_DIR = os.path.join(os.path.dirname(__file__), "..", "pipelineProjects")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from generator import writeProject
+
+
+@pytest.fixture
+def projectDir(tmp_path, monkeypatch):
+    """A copy of the example projects directory that tests can change."""
+
+    directory = tmp_path / "pipelineProjects"
+    shutil.copytree(PROJECTS_DIR, directory, ignore=shutil.ignore_patterns(".mycelium"))
+    # the project sets the projects directory environment variable
+    monkeypatch.setenv("MYCELIUMPROJECTSDIR", f"{directory}/")
+    monkeypatch.setenv("MYCELIUMHISTORYPATH", str(tmp_path / "history.db"))
+    monkeypatch.setenv("MYCELIUMPROJECTCACHEDIR", str(tmp_path / "cache"))
+    return f"{directory}/"
+
+
+@pytest.fixture
+def generatedProject(tmp_path, monkeypatch):
+    """Writes a project of noOp tasks in a generated shape and returns its path.
+
+    Call it with the shape, number of tasks and width, and a name when a test
+    generates more than one project of a shape.
+    """
+
+    # the project sets the projects directory environment variable
+    monkeypatch.setenv("MYCELIUMPROJECTSDIR", os.environ["MYCELIUMPROJECTSDIR"])
+    monkeypatch.setenv("MYCELIUMPROJECTCACHEDIR", str(tmp_path / "cache"))
+
+    def generate(shape:str="mesh", tasks:int=20, width:int=4, name:str=None)->str:
+        return writeProject(str(tmp_path / (name or shape)), shape, tasks, width)
+
+    return generate
@@ -0,0 +1,18 @@
+import pytest
+from mycelium.Project import Project
+from mycelium.Task import TaskStatus
+
+# the benchmarks directory is on the path, see conftest
+from generator import SHAPES
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("engine", ["THREAD", "ASYNCIO"])
+def test_generated_projects_execute(shape, engine, generatedProject):
+    project = Project(generatedProject(shape, 95))
+
+    assert len(project.dag) == 96
+    result = project.execute(engine=engine, history=False)
+
+    assert result["status"] == TaskStatus.SUCEEDED.name
+    assert all(t.status == TaskStatus.SUCEEDED for t in project.dag.values())
@@ -0,0 +1,208 @@
+import io
+import json
+import yaml
+import pytest
+from mycelium.Dag import Dag, DagFormat
+from mycelium.Task import DatabricksNotebook, TaskStatus
+from mycelium.CompactDag import CompactDag
+from mycelium.Distributed import _taskRecord
+from mycelium.Worker import Worker, SchedulePriority
+from test_worker import run
+
+
+def groupDag(size:int, condition:str="success", operator:str="AND")->Dag:
+    tasks = {"tasks": [
+        {"type": "databricksNotebook", "name": f"{g}{i}"} for g in "ab" for i in range(size)
+    ]}
+    pipelines = {"pipelines": [{
+        "name": "test",
+        "tasks": [
+            {"name": "groupA", "tasks": [f"a{i}" for i in range(size)]},
+            {
+                "name": "groupB",
+                "dependsOn": [{"task": "groupA", "condition": condition, "operator": operator}],
+                "tasks": [f"b{i}" for i in range(size)]
+            }
+        ]
+    }]}
+    dag = Dag()
+    dag.name = "test"
+    dag._loadDag("test", pipelines, tasks)
+    return dag
+
+
+def test_group_dependencies_use_barriers():
+    dag = groupDag(500)
+
+    edges = sum(len(t.dependencies) for t in [*dag.dag.values(), *dag.barriers.values()])
+    assert len(dag.barriers) == 1
+    # origin to group a, group a to the barrier and the barrier to group b
+    assert edges == 500 * 3
+    b0 = dag.getDag()["b0"].toDict()
+    assert [d["task"] for d in b0["dependencies"]] == [f"a{i}" for i in range(500)]
+    assert dag.getDag()["a0"].toDict()["dependents"] == [f"b{i}" for i in range(500)]
+
+
+def test_barriers_execute(monkeypatch):
+    ran = []
+
+    def execute(self):
+        ran.append(self.name)
+        self.status = TaskStatus.FAILED if self.name == "a1" else TaskStatus.SUCEEDED
+
+    monkeypatch.setattr(DatabricksNotebook, "execute", execute)
+
+    run(groupDag(3, "completion", "AND").getDagOrigin())
+    assert sorted(ran) == ["a0", "a1", "a2", "b0", "b1", "b2"]
+
+    ran.clear()
+    run(groupDag(3, "success", "AND").getDagOrigin())
+    assert sorted(ran) == ["a0", "a1", "a2"]
+
+    ran.clear()
+    run(groupDag(3, "failure", "OR").getDagOrigin())
+    assert sorted(ran) == ["a0", "a1", "a2", "b0", "b1", "b2"]
+
+
+def test_compact_dag(monkeypatch):
+    ran = []
+
+    def execute(self):
+        ran.append(self.name)
+        self.status = TaskStatus.SUCEEDED
+
+    monkeypatch.setattr(DatabricksNotebook, "execute", execute)
+    expected = groupDag(50).getDag(DagFormat.DICT)
+    dag = groupDag(50)
+    dag.compact()
+
+    assert not hasattr(dag.getDag()["a0"], "__dict__")
+    assert isinstance(dag.getDag()["a0"], DatabricksNotebook)
+    assert dag.getDag(DagFormat.DICT) == expected
+    assert _taskRecord(dag.getDag()["a0"])[0] is DatabricksNotebook
+
+    def dependencies(self, taskId):
+        raise AssertionError("the scheduler materialized compact dependencies")
+
+    # the scheduler reads the edges from the graph's arrays
+    monkeypatch.setattr(CompactDag, "dependencies", dependencies)
+    run(dag.getDagOrigin())
+
+    assert len(ran) == 100
+    assert set(dag.graph.status) == {TaskStatus.SUCEEDED.value}
+
+
+def test_write_dag():
+    dag = groupDag(5)
+    expected = dag.getDag(DagFormat.DICT)
+
+    f = io.StringIO()
+    dag.writeDag(f)
+    assert f.getvalue() == json.dumps(expected, indent=4)
+
+    f = io.StringIO()
+    dag.writeDag(f, DagFormat.YAML)
+    assert yaml.safe_load(f.getvalue()) == expected
+
+    lines = dag.getDag(DagFormat.JSONL).splitlines()
+    assert [json.loads(l) for l in lines] == list(expected.values())
+
+
+def test_write_compact_dag():
+    dag = groupDag(5)
+
+    f = io.StringIO()
+    dag.writeDag(f, DagFormat.JSONL, compact=True)
+    tasks = [json.loads(l) for l in f.getvalue().splitlines()]
+
+    assert [t["id"] for t in tasks] == list(range(12))
+    barrier = tasks[-1]
+    assert barrier["type"] == "TaskGroupBarrier"
+    # group b references the barrier once instead of every task of group a
+    assert tasks[6]["dependencies"] == [[barrier["id"], "SUCCESS", "AND"]]
+    assert barrier["dependencies"] == [[i, "SUCCESS", "AND"] for i in range(1, 6)]
+    assert barrier["dependents"] == list(range(6, 11))
+
+
+def loadDag(groups:list, tasks:list)->Dag:
+    dag = Dag()
+    dag.name = "test"
+    dag._loadDag("test", {"pipelines": [{"name": "test", "tasks": groups}]}, {"tasks": [
+        {"type": "databricksNotebook", "name": t} for t in tasks
+    ]})
+    return dag
+
+
+def test_topological_order_and_levels():
+    dag = groupDag(3)
+    position = {t.name: i for i, t in enumerate(dag.order)}
+    barrier = "groupA:SUCCESS:AND"
+
+    assert len(dag.order) == len(dag.dag) + len(dag.barriers)
+    assert all(position[d.task.name] < position[t.name] for t in dag.order for d in t.dependencies)
+    assert dag.levels["test"] == 0
+    assert dag.levels["a0"] == 1
+    assert dag.levels[barrier] == 2
+    assert dag.levels["b2"] == 3
+    assert dag.unreachable == []
+
+    dag.compact()
+    assert [t.name for t in dag.order] == list(position)
+    assert dag.order[0] is dag.getDagOrigin()
+
+
+def test_cycle_is_named():
+    groups = [
+        {"name": "first", "dependsOn": [{"task": "third", "condition": "success", "operator": "AND"}], "tasks": ["a"]},
+        {"name": "second", "dependsOn": [{"task": "first", "condition": "success", "operator": "AND"}], "tasks": ["b"]},
+        {"name": "third", "dependsOn": [{"task": "second", "condition": "success", "operator": "AND"}], "tasks": ["c"]},
+        "d"
+    ]
+
+    with pytest.raises(Exception, match="The dag has a cycle: .*third:SUCCESS:AND -> c -> second:SUCCESS:AND -> b"):
+        loadDag(groups, ["a", "b", "c", "d"])
+
+
+def test_unreachable_tasks():
+    # b depends on a task that's defined but isn't in any pipeline
+    groups = [
+        "a",
+        {"name": "second", "dependsOn": [{"task": "x", "condition": "success", "operator": "AND"}], "tasks": ["b"]}
+    ]
+    dag = loadDag(groups, ["a", "b", "x"])
+
+    assert dag.unreachable == ["b"]
+    assert "b" not in dag.levels
+    assert [t.name for t in dag.order] == ["test", "a"]
+
+
+def test_critical_path_with_unreachable_dependents():
+    # b depends on a and on a task that isn't in any pipeline
+    groups = [
+        "a",
+        {"name": "second", "dependsOn": [
+            {"task": "a", "condition": "success", "operator": "AND"},
+            {"task": "x", "condition": "success", "operator": "AND"}
+        ], "tasks": ["b"]}
+    ]
+    dag = loadDag(groups, ["a", "b", "x"])
+
+    worker = Worker()
+    worker._initSchedule(dag.getDagOrigin(), SchedulePriority.CRITICAL_PATH, order=dag.order)
+    ranks = worker._queue._ranks
+    # b isn't in the topological order, it's costed by walking the dependents of a
+    assert ranks[dag.dag["test"]] < ranks[dag.dag["a"]] < ranks[dag.dag["b"]]
+
+
+def test_dependents_keep_dag_order_through_barriers():
+    dependsOn = lambda t: [{"task": t, "condition": "success", "operator": "and"}]
+    dag = loadDag([
+        {"name": "A", "tasks": ["a0", "a1"]},
+        {"name": "B", "dependsOn": dependsOn("A"), "tasks": ["b0"]},
+        {"name": "C", "dependsOn": dependsOn("a0"), "tasks": ["c0"]},
+        {"name": "D", "dependsOn": dependsOn("A"), "tasks": ["d0"]},
+    ], ["a0", "a1", "b0", "c0", "d0"])
+
+    assert dag.getDag(DagFormat.DICT)["a0"]["dependents"] == ["b0", "c0", "d0"]
+    assert json.loads(dag.getDag(DagFormat.JSON))["a0"]["dependents"] == ["b0", "c0", "d0"]
+    assert yaml.safe_load(dag.getDag(DagFormat.YAML))["a1"]["dependents"] == ["b0", "d0"]
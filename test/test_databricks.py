@@ -0,0 +1,263 @@
+import json
+import base64
+import threading
+import time
+import asyncio
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from mycelium import Databricks
+from mycelium.Task import DatabricksNotebook, PipelineOrigin, TaskStatus
+from mycelium.Dependency import Dependency
+from mycelium.Worker import Worker
+from mycelium.ResultCache import ResultCache
+
+
+class StubWorkspace(BaseHTTPRequestHandler):
+    """Stands in for the Databricks Jobs runs API, runs finish after runDuration."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    runDuration = 0.2
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def _reply(self, status:int, body:dict, headers:dict=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _call(self, method:str):
+        server = self.server
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length)) if length else dict()
+
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.calls[url.path] = server.calls.get(url.path, 0) + 1
+            if server.rateLimit > 0:
+                server.rateLimit -= 1
+                return self._reply(429, {"message": "slow down"}, {"Retry-After": "0.01"})
+
+            if url.path.endswith("/workspace/export"):
+                source = server.sources.get(query["path"], f"# {query['path']}")
+                return self._reply(200, {"content": base64.b64encode(source.encode()).decode()})
+
+            if url.path.endswith("/runs/cancel"):
+                server.cancelled.append(body["run_id"])
+                return self._reply(200, {})
+
+            if url.path.endswith("/runs/submit"):
+                token = body.get("idempotency_token")
+                if token in server.tokens:
+                    return self._reply(200, {"run_id": server.tokens[token]})
+                server.nextId += 1
+                server.runs[server.nextId] = (body["run_name"], time.monotonic())
+                server.tokens[token] = server.nextId
+                return self._reply(200, {"run_id": server.nextId})
+
+            now = time.monotonic()
+            active = [i for i, (_, t) in server.runs.items() if now - t < self.runDuration]
+
+            if url.path.endswith("/runs/list"):
+                offset, limit = int(query["offset"]), int(query["limit"])
+                page = active[offset:offset + limit]
+                return self._reply(200, {
+                    "runs": [{"run_id": i} for i in page],
+                    "has_more": offset + limit < len(active)
+                })
+
+            if url.path.endswith("/runs/get"):
+                runId = int(query["run_id"])
+                name, _ = server.runs[runId]
+                if runId in active:
+                    return self._reply(200, {"run_id": runId, "state": {"life_cycle_state": "RUNNING"}})
+                result = "FAILED" if name.startswith("fail") else "SUCCESS"
+                return self._reply(200, {"run_id": runId, "state": {"life_cycle_state": "TERMINATED", "result_state": result}})
+
+        self._reply(404, {"message": "not found"})
+
+
+    def do_GET(self):
+        self._call("GET")
+
+
+    def do_POST(self):
+        self._call("POST")
+
+
+@pytest.fixture
+def workspace(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWorkspace)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = set()
+    server.calls = dict()
+    server.runs = dict()
+    server.nextId = 0
+    server.tokens = dict()
+    server.rateLimit = 0
+    server.sources = dict()
+    server.cancelled = list()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("DATABRICKS_API_HOST", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv("DBUTILSTOKEN", "token")
+    monkeypatch.setenv("DATABRICKS_POLL_INTERVAL", "0.05")
+    Databricks.resetPoller()
+
+    yield server
+
+    Databricks.resetPoller()
+    server.shutdown()
+    server.server_close()
+
+
+def notebooks(names:list):
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    tasks = []
+    for n in names:
+        t = DatabricksNotebook("databricksNotebook", n, path="/Shared/", parameters=[{"path": "{path}{name}"}])
+        t.dependencies = [Dependency(origin)]
+        origin.dependents.append(t)
+        tasks.append(t)
+    return origin, tasks
+
+
+def test_run_submission():
+    t = DatabricksNotebook("databricksNotebook", "pyTask1", path="/Shared/", timeout=60,
+        parameters=[{"path": "{path}{name}"}, {"waittimeout": 5}], cluster="cluster-1")
+
+    run = t._runSubmission()
+
+    assert run["timeout_seconds"] == 60
+    assert run["tasks"][0]["existing_cluster_id"] == "cluster-1"
+    assert run["tasks"][0]["notebook_task"] == {
+        "notebook_path": "/Shared/pyTask1",
+        "base_parameters": {"path": "/Shared/pyTask1", "waittimeout": "5"}
+    }
+
+
+def test_resent_submission_starts_one_run(workspace):
+    api = Databricks.DatabricksApi()
+    run = DatabricksNotebook("databricksNotebook", "pyTask1", path="/Shared/")._runSubmission()
+
+    assert api.submitRun(run) == api.submitRun(run)
+    assert len(workspace.runs) == 1
+    api.close()
+
+
+def test_failed_request_closes_its_connection(workspace, monkeypatch):
+    session = Databricks.HttpSession(f"http://127.0.0.1:{workspace.server_address[1]}")
+    closed = []
+    newConnection = session._newConnection
+
+    def connection():
+        c = newConnection()
+        monkeypatch.setattr(c, "close", lambda: closed.append(c))
+        return c
+
+    def timeout(*args):
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(session, "_newConnection", connection)
+    monkeypatch.setattr(session, "_send", timeout)
+    with pytest.raises(TimeoutError):
+        session.request("GET", "/api/2.1/jobs/runs/list")
+
+    assert len(closed) == 1
+    assert session._pool.empty()
+
+
+def test_concurrent_runs_share_one_poller(workspace):
+    origin, tasks = notebooks([f"ok{i}" for i in range(200)] + ["fail0"])
+    worker = Worker()
+    worker._initSchedule(origin)
+
+    asyncio.run(worker._workAsync(origin, 500))
+
+    assert all(t.status == TaskStatus.SUCEEDED for t in tasks[:-1])
+    assert tasks[-1].status == TaskStatus.FAILED
+    # every run is only fetched once it has dropped out of the active list
+    assert workspace.calls["/api/2.1/jobs/runs/get"] <= len(tasks) * 2
+    assert len(workspace.connections) <= 16
+
+
+def test_thread_engine_honours_rate_limit(workspace):
+    workspace.rateLimit = 3
+    origin, tasks = notebooks(["ok0", "ok1", "fail0"])
+    worker = Worker()
+    worker._initSchedule(origin)
+    for i in range(3):
+        threading.Thread(target=worker._worker, daemon=True).start()
+
+    worker._enqueue(origin)
+    worker._queue.join()
+
+    assert [t.status for t in tasks] == [TaskStatus.SUCEEDED, TaskStatus.SUCEEDED, TaskStatus.FAILED]
+    assert all(t.runId for t in tasks)
+
+
+def test_memoized_notebooks_skip_unchanged_runs(workspace, tmp_path):
+    cache = ResultCache(str(tmp_path / "results.db"))
+
+    def runNotebooks():
+        origin, tasks = notebooks(["ok0", "ok1", "fail0"])
+        for t in tasks:
+            t.memoize = True
+            t.inputs = ["raw/customers@2026-10-17"]
+        worker = Worker()
+        worker._resultCache = cache
+        worker._initSchedule(origin)
+        asyncio.run(worker._workAsync(origin, 4))
+        return tasks
+
+    runNotebooks()
+    assert workspace.calls["/api/2.1/jobs/runs/submit"] == 3
+
+    # only the failed notebook runs again
+    tasks = runNotebooks()
+    assert workspace.calls["/api/2.1/jobs/runs/submit"] == 4
+    assert [t.status for t in tasks] == [TaskStatus.SUCEEDED, TaskStatus.SUCEEDED, TaskStatus.FAILED]
+
+    # a changed notebook source changes the cache key
+    workspace.sources["/Shared/ok1"] = "print('changed')"
+    runNotebooks()
+    assert workspace.calls["/api/2.1/jobs/runs/submit"] == 6
+
+
+def test_timed_out_run_is_cancelled(workspace):
+    StubWorkspace.runDuration = 5
+    try:
+        origin, tasks = notebooks(["slow"])
+        slow = tasks[0]
+        slow.timeout = 0.2
+        onFailure = DatabricksNotebook("databricksNotebook", "onFailure", timeout=0.2)
+        onFailure.dependencies = [Dependency(slow, "failure", "and")]
+        slow.dependents.append(onFailure)
+
+        worker = Worker()
+        worker._initSchedule(origin)
+        start = time.monotonic()
+        asyncio.run(worker._workAsync(origin, 4))
+
+        assert time.monotonic() - start < 2
+        assert slow.status == TaskStatus.FAILED
+        # the failure branch still runs, it's also cancelled at its own timeout
+        assert onFailure.runId
+        time.sleep(0.2)
+        assert workspace.cancelled == [slow.runId, onFailure.runId]
+
+    finally:
+        StubWorkspace.runDuration = 0.2
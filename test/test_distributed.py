@@ -0,0 +1,146 @@
+import os
+import socket
+import threading
+import multiprocessing
+import pytest
+from mycelium.Task import DatabricksNotebook, PipelineOrigin, TaskStatus
+from mycelium.Dependency import Dependency
+from mycelium.Worker import Worker
+from mycelium.Distributed import RemoteExecutor, ProcessTransport, TcpTransport, listen
+from mycelium.Project import Project
+from test_worker import link, run
+
+
+class PidNotebook(DatabricksNotebook):
+    """Records the process that executed it in its run id."""
+
+    def __init__(self, name:str, fail:bool=False):
+        super().__init__("databricksNotebook", name)
+        self.fail = fail
+
+
+    def execute(self):
+        self.runId = os.getpid()
+        self.status = TaskStatus.FAILED if self.fail else TaskStatus.SUCEEDED
+        return {"pid": self.runId}
+
+
+def dag(fail:str=None):
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    first = [PidNotebook(f"a{i}", fail=f"a{i}" == fail) for i in range(4)]
+    second = PidNotebook("b")
+    for t in first:
+        link(t, [Dependency(origin)])
+    link(second, [Dependency(t, "success", "and") for t in first])
+    return origin, [*first, second]
+
+
+def distributed(origin, transport):
+    worker = Worker()
+    worker._executor = RemoteExecutor(transport)
+    worker._executor.start()
+    try:
+        run(origin, worker)
+    finally:
+        worker._executor.close()
+
+
+def test_process_transport_executes_tasks_on_workers():
+    origin, tasks = dag()
+    distributed(origin, ProcessTransport(2))
+
+    assert all(t.status == TaskStatus.SUCEEDED for t in tasks)
+    assert os.getpid() not in {t.runId for t in tasks}
+
+
+def test_worker_failure_propagates_to_dependents():
+    origin, tasks = dag(fail="a1")
+    distributed(origin, ProcessTransport(2))
+
+    assert tasks[1].status == TaskStatus.FAILED
+    assert tasks[-1].status == TaskStatus.UPSTREAM_FAILED
+
+
+def test_tcp_transport():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = multiprocessing.get_context("spawn").Process(target=listen, args=(f"127.0.0.1:{port}", 2, b"secret"), daemon=True)
+    server.start()
+    try:
+        origin, tasks = dag()
+        distributed(origin, TcpTransport([f"127.0.0.1:{port}"], authkey=b"secret"))
+
+        assert all(t.status == TaskStatus.SUCEEDED for t in tasks)
+        assert {t.runId for t in tasks} == {server.pid}
+    finally:
+        server.terminate()
+
+
+class PipeTransport:
+    """Connects the executor to a pipe served by the test."""
+
+    def __init__(self):
+        self.connection, self.worker = multiprocessing.Pipe()
+
+    def connect(self):
+        return [self.connection]
+
+    def close(self):
+        pass
+
+
+def test_unknown_replies_are_ignored():
+    transport = PipeTransport()
+    executor = RemoteExecutor(transport)
+    executor.start()
+
+    def serveTask():
+        transport.worker.send(("result", 99, "SUCEEDED", dict(), dict()))
+        kind, taskId, cls, state = transport.worker.recv()
+        transport.worker.send(("result", taskId, "SUCEEDED", {"runId": 1}, {"ok": True}))
+
+    thread = threading.Thread(target=serveTask)
+    thread.start()
+    task = PidNotebook("a")
+    result = executor.execute(task)
+    thread.join()
+    executor.close()
+
+    assert result == {"ok": True}
+    assert task.status == TaskStatus.SUCEEDED
+    assert task.runId == 1
+
+
+def test_failed_send_isnt_left_in_flight(monkeypatch):
+    transport = PipeTransport()
+    executor = RemoteExecutor(transport)
+    executor.start()
+    connection = transport.connection
+
+    def send(connection, *message):
+        raise OSError("broken pipe")
+
+    monkeypatch.setattr(executor, "_send", send)
+    task = PidNotebook("a")
+    executor.execute(task)
+
+    assert task.status == TaskStatus.FAILED
+    assert executor._inFlight == {connection: 0}
+    assert not executor._pending
+    executor.close()
+
+
+def test_tcp_transport_requires_key(monkeypatch):
+    monkeypatch.delenv("MYCELIUMWORKERKEY", raising=False)
+    with pytest.raises(Exception, match="MYCELIUMWORKERKEY"):
+        TcpTransport(["127.0.0.1:7100"])
+
+
+def test_execute_distributed(generatedProject):
+    project = Project(generatedProject("mesh", 40))
+    result = project.execute(engine="DISTRIBUTED", history=False)
+
+    assert result["status"] == TaskStatus.SUCEEDED.name
+    assert all(t.status == TaskStatus.SUCEEDED for t in project.dag.values())
@@ -0,0 +1,88 @@
+import time
+from mycelium.History import RunHistory
+from mycelium.ResultCache import ResultCache
+from mycelium.Task import PipelineOrigin, TaskStatus
+from mycelium.Dependency import Dependency
+from mycelium.Worker import Worker
+from test_worker import CountingNotebook, link, run
+
+
+def test_records_task_state_changes(tmp_path):
+    history = RunHistory(str(tmp_path / "history.db"))
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    ok = CountingNotebook("ok")
+    failed = CountingNotebook("failed", fail=True)
+    link(ok, [Dependency(origin)])
+    link(failed, [Dependency(ok, "success", "and")])
+
+    for i in range(3):
+        origin.status, ok.status, failed.status = TaskStatus.NONE, TaskStatus.NONE, TaskStatus.NONE
+        history.runStarted(f"run{i}", "test")
+        worker = Worker()
+        worker._observers.append(history)
+        run(origin, worker)
+        history.runFinished("FAILED")
+
+    history.close()
+
+    stats = history.durationStats()
+    assert set(stats) == {"test", "ok"}
+    assert stats["ok"]["count"] == 3
+    assert [m["runId"] for m in history.makespans("test")] == ["run0", "run1", "run2"]
+
+
+class MemoizedNotebook(CountingNotebook):
+
+    def cacheKey(self)->str:
+        return self.name
+
+
+    def execute(self):
+        time.sleep(0.2)
+        return super().execute()
+
+
+def test_cache_hits_are_left_out_of_durations(tmp_path):
+    history = RunHistory(str(tmp_path / "history.db"))
+    cache = ResultCache(str(tmp_path / "results.db"))
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    memoized = MemoizedNotebook("memoized")
+    memoized.memoize = True
+    link(memoized, [Dependency(origin)])
+
+    for i in range(3):
+        origin.status, memoized.status = TaskStatus.NONE, TaskStatus.NONE
+        history.runStarted(f"run{i}", "test")
+        worker = Worker()
+        worker._resultCache = cache
+        worker._observers.append(history)
+        run(origin, worker)
+        history.runFinished("SUCEEDED")
+
+    history.close()
+
+    # the later runs are cache hits, they succeed without executing
+    assert memoized.executions == 1
+    assert history.taskStatuses("run2")["memoized"] == "SUCEEDED"
+    stats = history.durationStats("memoized")["memoized"]
+    assert stats["count"] == 1
+    assert stats["p50"] >= 0.2
+
+
+def test_duration_percentiles(tmp_path):
+    history = RunHistory(str(tmp_path / "history.db"))
+    history.runStarted("run", "test")
+    for i in range(1, 101):
+        history._put("started", f"run{i}", "slow", 0.0)
+        history._put("finished", f"run{i}", "slow", float(i), "SUCEEDED", 0)
+        history._put("started", f"run{i}", "fast", 0.0)
+        history._put("finished", f"run{i}", "fast", 1.0, "SUCEEDED", 0)
+    history.flush()
+
+    stats = history.durationStats()
+
+    assert stats["slow"]["p50"] == 50
+    assert stats["slow"]["p95"] == 95
+    assert stats["slow"]["max"] == 100
+    assert history.slowestTasks(1)[0][0] == "slow"
+    assert history.durations() == {"slow": 50, "fast": 1}
@@ -0,0 +1,35 @@
+import logging
+import logging.config
+import logging.handlers
+from mycelium import Logging
+
+
+def test_configures_once_and_caches_loggers(monkeypatch):
+    Logging.shutdown()
+    calls = []
+    dictConfig = logging.config.dictConfig
+    monkeypatch.setattr(logging.config, "dictConfig", lambda c: (calls.append(c), dictConfig(c)))
+
+    first = Logging.getLogger("cached")
+    second = Logging.getLogger("cached")
+    Logging.getLogger("another")
+
+    assert first is second
+    assert len(calls) == 1
+
+
+def test_queued_handlers():
+    Logging.shutdown()
+    Logging.configure(queued=True)
+
+    try:
+        handlers = logging.getLogger().handlers
+        assert len(handlers) == 1
+        assert isinstance(handlers[0], logging.handlers.QueueHandler)
+        Logging.getLogger("queued").info("does not block")
+
+    finally:
+        Logging.shutdown()
+        Logging.configure()
+
+    assert not isinstance(logging.getLogger().handlers[0], logging.handlers.QueueHandler)
@@ -0,0 +1,82 @@
+import json
+import threading
+import http.client
+from mycelium.Project import Project
+from mycelium.Metrics import MetricsRegistry
+
+
+def get(port:int, path:str):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    body = response.read().decode()
+    connection.close()
+    return response, body
+
+
+def test_histogram_buckets():
+    histogram = MetricsRegistry().histogram("h", "help", (1, 2))
+    for v in (0.5, 1, 1.5, 3):
+        histogram.observe(v)
+
+    assert histogram.samples() == [
+        ("h_bucket", {"le": "1"}, 2),
+        ("h_bucket", {"le": "2"}, 3),
+        ("h_bucket", {"le": "+Inf"}, 4),
+        ("h_sum", {}, 6.0),
+        ("h_count", {}, 4),
+    ]
+
+
+def test_exited_thread_shards_are_folded():
+    registry = MetricsRegistry()
+    counter = registry.counter("c", "help", ("kind",))
+    histogram = registry.histogram("h", "help", (1,))
+
+    def work():
+        counter.inc(1, "a")
+        histogram.observe(0.5)
+
+    for i in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    assert counter.samples() == [("c", {"kind": "a"}, 50)]
+    assert histogram.samples()[-1] == ("h_count", {}, 50)
+    # only the shard of the last thread that started is still held
+    assert len(counter._shards) <= 1
+    assert len(histogram._shards) <= 1
+
+
+def test_project_metrics(generatedProject):
+    project = Project(generatedProject("mesh", 40))
+    metrics = project.enableMetrics(port=0)
+    try:
+        project.execute(maxParallel=2, history=False)
+
+        snapshot = metrics.registry.snapshot()
+        value = lambda name, i=-1: snapshot[name]["samples"][i]["value"]
+        assert snapshot["mycelium_tasks_total"]["samples"] == [
+            {"name": "mycelium_tasks_total", "labels": {"status": "SUCEEDED"}, "value": 41}
+        ]
+        assert value("mycelium_task_queue_wait_seconds") == 41
+        assert value("mycelium_task_execute_seconds") == 41
+        # every edge is checked once, the first group off the origin, the other
+        # 9 groups off their barrier and each barrier off the 4 tasks of a group
+        assert value("mycelium_readiness_checks_total") == 4 + 36 + 9 * 4
+        assert value("mycelium_scheduler_lock_hold_seconds") > 0
+        assert value("mycelium_active_workers") == 0
+        assert value("mycelium_workers") == 2
+        assert value("mycelium_queue_depth") == 0
+
+        response, body = get(project.metricsServer.port, "/metrics")
+        assert response.status == 200
+        assert "# TYPE mycelium_task_queue_wait_seconds histogram" in body
+        assert 'mycelium_runs_total{status="SUCEEDED"} 1' in body
+
+        response, body = get(project.metricsServer.port, "/metrics.json")
+        assert json.loads(body)["mycelium_runs_total"]["samples"][0]["value"] == 1
+
+    finally:
+        project.metricsServer.close()
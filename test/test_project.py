@@ -0,0 +1,235 @@
+import os
+import logging
+import pytest
+import yaml
+from mycelium import Project as ProjectModule
+from mycelium import ProjectCache as ProjectCacheModule
+from mycelium.Project import Project
+from mycelium.Dag import DagFormat
+from mycelium.Task import NoOp, TaskStatus
+
+
+def test_compiled_project_cache(projectDir, monkeypatch):
+    expected = Project(projectDir, useCache=True).getDag(DagFormat.DICT)
+
+    loads = []
+    parseYaml = ProjectModule.parseYaml
+    monkeypatch.setattr(ProjectModule, "parseYaml", lambda c: loads.append(c) or parseYaml(c))
+    project = Project(projectDir, useCache=True)
+
+    # none of the project files are parsed
+    assert len(loads) == 0
+    assert project.getDag(DagFormat.DICT) == expected
+    origin = project.getDagOrigin()
+    assert origin.dependents[0].dependencies[0].task is origin
+
+
+def test_compiled_project_cache_invalidation(projectDir):
+    Project(projectDir, useCache=True)
+
+    with open(f"{projectDir}pipelineTest/patterns.yaml", "a") as f:
+        f.write("\n  - name: another\n    path: ./another/\n")
+
+    with open(f"{projectDir}pipelineTest/tasks.yaml") as f:
+        tasks = f.read()
+    with open(f"{projectDir}pipelineTest/tasks.yaml", "w") as f:
+        f.write(tasks.replace("name: pyTask1\n    pattern: default", "name: pyTask1\n    pattern: another"))
+
+    project = Project(projectDir, useCache=True)
+
+    assert project.getDag()["pyTask1"].path == "./another/"
+    assert Project(projectDir, useCache=False).getDag(DagFormat.DICT) == project.getDag(DagFormat.DICT)
+
+
+def test_compiled_project_cache_location(projectDir, tmp_path, monkeypatch):
+    loads = []
+    parseYaml = ProjectModule.parseYaml
+    monkeypatch.setattr(ProjectModule, "parseYaml", lambda c: loads.append(c) or parseYaml(c))
+
+    # the cache is opt in and kept out of the project directory
+    Project(projectDir)
+    Project(projectDir, useCache=True)
+    assert not os.path.exists(f"{projectDir}.mycelium/project.cache")
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    cachePath = f"{projectDir}.mycelium/project.cache"
+    Project(projectDir, useCache=True, cachePath=cachePath)
+    assert os.path.exists(cachePath)
+
+    # a cache others can write to isn't unpickled
+    os.chmod(cachePath, 0o666)
+    parsed = len(loads)
+    Project(projectDir, useCache=True, cachePath=cachePath)
+    assert len(loads) > parsed
+
+
+def test_compiled_project_cache_sources(projectDir, monkeypatch):
+    Project(projectDir, useCache=True)
+
+    loads = []
+    parseYaml = ProjectModule.parseYaml
+    monkeypatch.setattr(ProjectModule, "parseYaml", lambda c: loads.append(c) or parseYaml(c))
+    monkeypatch.setattr(ProjectCacheModule, "sourceHash", lambda: "changed")
+    Project(projectDir, useCache=True)
+
+    # a change to the mycelium sources invalidates the cache
+    assert len(loads) > 0
+
+
+def test_merges_yaml_files(projectDir):
+    with open(f"{projectDir}mycelium.yaml") as f:
+        project = yaml.safe_load(f)
+    project["project"]["tasks"].append("./moreTasks.yaml")
+    with open(f"{projectDir}mycelium.yaml", "w") as f:
+        yaml.safe_dump(project, f)
+
+    with open(f"{projectDir}pipelineTest/pipelines.yaml") as f:
+        pipelines = f.read()
+    with open(f"{projectDir}pipelineTest/pipelines.yaml", "w") as f:
+        f.write(pipelines.replace("          - pyTask3", "          - pyTask3\n          - moreTask1"))
+
+    with open(f"{projectDir}pipelineTest/moreTasks.yaml", "w") as f:
+        f.write("version: sibytes.io/mycelium/task/api/0.1.0\n"
+            "tasks:\n  - type: databricksNotebook\n    name: moreTask1\n    pattern: default\n")
+
+    dag = Project(projectDir, useCache=False).getDag()
+
+    assert dag["moreTask1"].timeout == 3600
+    assert [e.task.name for d in dag["moreTask1"].dependencies for e in d.expand()] == ["pyTask2_1", "pyTask2_2"]
+
+
+def test_unknown_pattern(projectDir):
+    with open(f"{projectDir}pipelineTest/tasks.yaml") as f:
+        tasks = f.read()
+    with open(f"{projectDir}pipelineTest/tasks.yaml", "w") as f:
+        f.write(tasks.replace("name: pyTask1\n    pattern: default", "name: pyTask1\n    pattern: missing"))
+
+    with pytest.raises(Exception, match="Pattern missing is not found"):
+        Project(projectDir)
+
+
+def test_resume_run(generatedProject, tmp_path, monkeypatch):
+    monkeypatch.setenv("MYCELIUMHISTORYPATH", str(tmp_path / "history.db"))
+    path = generatedProject("mesh", 20)
+
+    ran = []
+    def execute(self):
+        ran.append(self.name)
+        self.status = TaskStatus.FAILED if self.name in failing else TaskStatus.SUCEEDED
+
+    monkeypatch.setattr(NoOp, "execute", execute)
+
+    failing = {"task5"}
+    project = Project(path)
+    first = project.execute()
+    assert first["status"] == TaskStatus.FAILED.name
+    # the groups after the failed task's group never run
+    assert len(ran) == 8
+    assert project.dag["task12"].status == TaskStatus.UPSTREAM_FAILED
+    assert project.history.taskStatuses(first["runId"])["task12"] == TaskStatus.UPSTREAM_FAILED.name
+
+    failing.clear()
+    ran.clear()
+    resumed = Project(path).execute(resume=first["runId"])
+
+    assert resumed == {"runId": first["runId"], "status": TaskStatus.SUCEEDED.name}
+    assert sorted(ran) == sorted(["task5", *[f"task{i}" for i in range(8, 20)]])
+
+    with pytest.raises(Exception, match="not found in the run history"):
+        Project(path).execute(resume="unknown")
+
+
+def test_execute_does_not_leak_worker_threads(generatedProject):
+    import threading
+    path = generatedProject("mesh", 20)
+
+    before = threading.active_count()
+    for i in range(3):
+        project = Project(path)
+        assert project.execute()["status"] == TaskStatus.SUCEEDED.name
+
+    assert project.workerPool is None
+    assert threading.active_count() == before
+    assert project.history.taskStatuses(project.runId)["task19"] == TaskStatus.SUCEEDED.name
+
+
+def test_state_is_kept_out_of_the_project(generatedProject, tmp_path):
+    path = generatedProject("mesh", 20)
+
+    project = Project(path)
+    project.execute()
+
+    assert not os.path.exists(f"{path}.mycelium")
+    assert project.historyPath.startswith(str(tmp_path / "cache"))
+    assert project.resultCachePath.startswith(str(tmp_path / "cache"))
+
+
+def test_execute_with_unreachable_tasks(generatedProject, caplog, monkeypatch):
+    path = generatedProject("mesh", 8)
+    with open(f"{path}mesh/tasks.yaml") as f:
+        tasks = yaml.safe_load(f)
+    tasks["tasks"] += [{"type": "noOp", "name": "orphan"}, {"type": "noOp", "name": "x"}]
+    with open(f"{path}mesh/tasks.yaml", "w") as f:
+        yaml.safe_dump(tasks, f)
+
+    # orphan depends on a pipeline task and on x that isn't in any pipeline
+    with open(f"{path}mesh/pipelines.yaml") as f:
+        pipelines = yaml.safe_load(f)
+    pipelines["pipelines"][0]["tasks"].append({"name": "orphans", "tasks": ["orphan"], "dependsOn": [
+        {"task": "task0", "condition": "success", "operator": "AND"},
+        {"task": "x", "condition": "success", "operator": "AND"}
+    ]})
+    with open(f"{path}mesh/pipelines.yaml", "w") as f:
+        yaml.safe_dump(pipelines, f)
+
+    project = Project(path)
+    # the project's logging configuration replaces the handlers of the root logger
+    # and disables the loggers of projects that were configured before
+    logger = logging.getLogger(project.name)
+    monkeypatch.setattr(logger, "disabled", False)
+    logger.addHandler(caplog.handler)
+    try:
+        with caplog.at_level("INFO", project.name):
+            assert project.execute(schedule="critical_path", history=False)["status"] == TaskStatus.SUCEEDED.name
+    finally:
+        logger.removeHandler(caplog.handler)
+
+    assert project.dag["task7"].status == TaskStatus.SUCEEDED
+    assert project.dag["orphan"].status == TaskStatus.NONE
+    assert "Didn't execute 1 tasks because they're unreachable from the pipeline origin: orphan" in caplog.text
+
+
+def test_execute_targets(generatedProject, monkeypatch):
+    path = generatedProject("mesh", 20)
+
+    ran = []
+    def execute(self):
+        ran.append(self.name)
+        self.status = TaskStatus.SUCEEDED
+
+    monkeypatch.setattr(NoOp, "execute", execute)
+
+    project = Project(path)
+    assert project.taskGroups["mesh2"] == ["task8", "task9", "task10", "task11"]
+    assert project.execute(history=False, targets=["mesh2"])["status"] == TaskStatus.SUCEEDED.name
+    assert sorted(ran) == sorted(f"task{i}" for i in range(12))
+    assert project.dag["task12"].status == TaskStatus.NONE
+
+    # the downstream tasks don't wait on the unselected tasks of the target's group
+    ran.clear()
+    Project(path).execute(engine="ASYNCIO", history=False, targets=["task9"], downstream=True)
+    assert sorted(ran) == sorted(f"task{i}" for i in [*range(8), 9, *range(12, 20)])
+
+    with pytest.raises(Exception, match="Target missing is not found"):
+        Project(path).execute(history=False, targets=["missing"])
+
+
+def test_main_targets(generatedProject, capsys):
+    import json
+    from mycelium.__main__ import main
+    path = generatedProject("chain", 5)
+
+    result = main([path, "--targets", "task2", "--no-history"])
+
+    assert json.loads(capsys.readouterr().out) == result
+    assert result["status"] == TaskStatus.SUCEEDED.name
@@ -0,0 +1,161 @@
+import threading
+import time
+import asyncio
+import pytest
+import yaml
+from mycelium.Task import DatabricksNotebook, PipelineOrigin, NoOp, TaskStatus
+from mycelium.Dependency import Dependency
+from mycelium.Worker import Worker
+from mycelium.ResourcePool import ResourcePools
+from mycelium.Project import Project
+from test_worker import link, run
+
+
+class PooledNotebook(DatabricksNotebook):
+    """Counts the most slots of each pool it claims in use at once."""
+
+    running = dict()
+    peaks = dict()
+    lock = threading.Lock()
+
+    def __init__(self, name:str, pools):
+        super().__init__("databricksNotebook", name, pools=pools)
+
+
+    def _enter(self, delta:int):
+        with self.lock:
+            for p, slots in self.pools.items():
+                self.running[p] = self.running.get(p, 0) + delta * slots
+                self.peaks[p] = max(self.peaks.get(p, 0), self.running[p])
+
+
+    def execute(self):
+        self._enter(1)
+        time.sleep(0.02)
+        self._enter(-1)
+        self.status = TaskStatus.SUCEEDED
+        return dict()
+
+
+    async def executeAsync(self):
+        self._enter(1)
+        await asyncio.sleep(0.02)
+        self._enter(-1)
+        self.status = TaskStatus.SUCEEDED
+        return dict()
+
+
+def task(name:str, pools:dict):
+    return NoOp("noOp", name, pools=pools)
+
+
+def test_waiting_task_holds_back_later_claims():
+    pools = ResourcePools({"cluster": 2})
+    a, b, big, c = task("a", ["cluster"]), task("b", ["cluster"]), task("big", {"cluster": 2}), task("c", ["cluster"])
+
+    assert pools.acquire(a) == [a] and pools.acquire(b) == [b]
+    assert pools.acquire(big) == []
+    assert pools.acquire(c) == []
+
+    # c doesn't jump ahead of big when a slot frees
+    assert pools.release(a) == []
+    assert pools.release(b) == [big]
+    assert pools.release(big) == [c]
+
+
+def test_unclaimed_tasks_and_other_pools_are_not_held_back():
+    pools = ResourcePools({"cluster": 1, "database": 1})
+    a, b, d = task("a", ["cluster"]), task("b", ["cluster"]), task("d", ["database"])
+
+    free = task("free", None)
+    assert pools.acquire(a) == [a]
+    assert pools.acquire(b) == []
+    assert pools.acquire(d) == [d]
+    assert pools.acquire(free) == [free]
+    assert pools.release(a) == [b]
+
+
+def poolDag():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    tasks = [PooledNotebook(f"db{i}", ["database"]) for i in range(6)]
+    tasks += [PooledNotebook(f"both{i}", ["database", "cluster"]) for i in range(3)]
+    tasks += [PooledNotebook(f"cluster{i}", {"cluster": 2}) for i in range(3)]
+    for t in tasks:
+        link(t, [Dependency(origin)])
+    return origin, tasks
+
+
+@pytest.mark.parametrize("engine", ["thread", "asyncio"])
+def test_pools_limit_concurrency(engine):
+    PooledNotebook.running.clear()
+    PooledNotebook.peaks.clear()
+    origin, tasks = poolDag()
+
+    worker = Worker()
+    worker._pools = ResourcePools({"database": 2, "cluster": 3})
+    if engine == "thread":
+        run(origin, worker, maxParallel=8)
+    else:
+        worker._initSchedule(origin)
+        asyncio.run(worker._workAsync(origin, 8))
+
+    assert all(t.status == TaskStatus.SUCEEDED for t in tasks)
+    assert PooledNotebook.peaks["database"] == 2
+    assert PooledNotebook.peaks["cluster"] <= 3
+
+
+def writePooledProject(path:str, pools:list)->str:
+    with open(f"{path}mycelium.yaml") as f:
+        project = yaml.safe_load(f)
+    project["project"]["pools"] = pools
+    with open(f"{path}mycelium.yaml", "w") as f:
+        yaml.safe_dump(project, f)
+
+    with open(f"{path}mesh/pipelines.yaml") as f:
+        pipelines = yaml.safe_load(f)
+    groups = pipelines["pipelines"][0]["tasks"]
+    groups[0]["pools"] = ["database"]
+    groups[1]["maxParallel"] = 1
+    with open(f"{path}mesh/pipelines.yaml", "w") as f:
+        yaml.safe_dump(pipelines, f)
+
+    return path
+
+
+def test_project_pools(generatedProject, tmp_path):
+    path = writePooledProject(generatedProject("mesh", 12), [{"name": "database", "slots": 2}])
+
+    for useCache in (True, True, False):
+        project = Project(path, useCache=useCache, cachePath=str(tmp_path / "project.cache"))
+
+        assert project._pools.slots == {"database": 2, "mesh1": 1}
+        assert project.dag["task0"].pools == {"database": 1}
+        assert project.dag["task4"].pools == {"mesh1": 1}
+        assert project.dag["task8"].pools is None
+
+    assert project.execute(history=False)["status"] == TaskStatus.SUCEEDED.name
+
+
+def test_project_pool_validation(generatedProject):
+    with pytest.raises(Exception, match="Pool database claimed by task task0 is not found"):
+        Project(writePooledProject(generatedProject("mesh", 12, name="missing"), [{"name": "cluster", "slots": 2}]))
+
+    path = writePooledProject(generatedProject("mesh", 12, name="slots"), [{"name": "database", "slots": 2}])
+    with open(f"{path}mesh/tasks.yaml") as f:
+        tasks = f.read()
+    with open(f"{path}mesh/tasks.yaml", "w") as f:
+        f.write(tasks.replace("name: task0\n", "name: task0\n  pools:\n    database: 3\n", 1))
+
+    with pytest.raises(Exception, match="Task task0 claims 3 slots of pool database which only has 2"):
+        Project(path)
+
+    # libraries can't be limited by the pools of their group
+    path = writePooledProject(generatedProject("mesh", 12, name="library"), [{"name": "database", "slots": 2}])
+    with open(f"{path}mesh/tasks.yaml") as f:
+        tasks = yaml.safe_load(f)
+    tasks["tasks"][4] = {"type": "databricksLibrary", "name": "task4"}
+    with open(f"{path}mesh/tasks.yaml", "w") as f:
+        yaml.safe_dump(tasks, f)
+
+    with pytest.raises(Exception, match="Task task4 of type databricksLibrary can't claim the pools or maxParallel"):
+        Project(path)
@@ -0,0 +1,23 @@
+import time
+from mycelium.ResultCache import ResultCache
+
+
+def test_eviction(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "results.db"), maxEntries=2, maxAge=60)
+    now = time.time()
+    for i, key in enumerate(["a", "b", "c"]):
+        monkeypatch.setattr(time, "time", lambda: now + i)
+        cache.put(key, key, i)
+
+    # a is evicted as the least recently used result
+    monkeypatch.setattr(time, "time", lambda: now + 3)
+    assert cache.get("b") == {"task": "b", "runId": "1", "created": now + 1}
+    assert cache.get("c")
+    assert cache.evict() == 1
+    assert cache.get("a") is None
+
+    # results older than maxAge expire
+    monkeypatch.setattr(time, "time", lambda: now + 61.5)
+    assert cache.get("b") is None
+    assert cache.evict() == 1
+    assert cache.get("c")
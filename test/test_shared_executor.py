@@ -0,0 +1,144 @@
+import threading
+import time
+import queue
+import pytest
+from mycelium.Task import PipelineOrigin, TaskStatus
+from mycelium.Dependency import Dependency
+from mycelium.Worker import Worker
+from mycelium.SharedExecutor import SharedExecutor, _Share
+from mycelium.Project import Project
+from test_worker import CountingNotebook, link
+
+
+class TimedNotebook(CountingNotebook):
+    """Records the project of each task it starts and the most running at once."""
+
+    lock = threading.Lock()
+
+    def __init__(self, name:str, project:str, state:dict):
+        super().__init__(name)
+        self.project = project
+        self.state = state
+
+
+    def execute(self):
+        with self.lock:
+            self.state["order"].append(self.project)
+            running = self.state["running"]
+            running[self.project] = running.get(self.project, 0) + 1
+            running["all"] = running.get("all", 0) + 1
+            for k, v in running.items():
+                self.state["peaks"][k] = max(self.state["peaks"].get(k, 0), v)
+
+        time.sleep(0.01)
+
+        with self.lock:
+            self.state["running"][self.project] -= 1
+            self.state["running"]["all"] -= 1
+
+        return super().execute()
+
+
+def projectRun(executor:SharedExecutor, name:str, tasks:int, state:dict)->threading.Thread:
+    origin = PipelineOrigin("PipelineOrigin", name)
+    for i in range(tasks):
+        link(TimedNotebook(f"{name}{i}", name, state), [Dependency(origin)])
+
+    worker = Worker()
+    worker._initSchedule(origin)
+    worker._shared = executor
+    executor.attach(worker, name)
+
+    def run():
+        worker._start(origin)
+        worker._queue.join()
+        executor.detach(worker)
+
+    return threading.Thread(target=run)
+
+
+def runProjects(executor:SharedExecutor, projects:dict)->dict:
+    state = {"order": [], "running": dict(), "peaks": dict()}
+    runs = [projectRun(executor, n, t, state) for n, t in projects.items()]
+    for r in runs:
+        r.start()
+    for r in runs:
+        r.join()
+    return state
+
+
+def test_weighted_fair_share():
+    executor = SharedExecutor(2)
+    executor.register("hourly", weight=3)
+    try:
+        state = runProjects(executor, {"backfill": 60, "hourly": 20})
+    finally:
+        executor.close()
+
+    # while both have tasks waiting the hourly project gets three slots for each backfill one
+    first = state["order"][:24]
+    assert 15 <= first.count("hourly") <= 20
+    assert len(state["order"]) == 80
+    assert state["peaks"]["all"] <= 2
+
+
+def test_quota():
+    executor = SharedExecutor(4)
+    executor.register("backfill", quota=1)
+    try:
+        state = runProjects(executor, {"backfill": 10, "hourly": 10})
+    finally:
+        executor.close()
+
+    assert state["peaks"]["backfill"] == 1
+    assert state["peaks"]["all"] <= 4
+    assert executor.running == dict()
+
+
+class QueuedWorker:
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+
+def test_idle_project_cant_bank_virtual_time():
+    executor = SharedExecutor(1)
+    busy, idle = QueuedWorker(), QueuedWorker()
+    executor._attached[busy] = _Share("busy", busy, 1, None, 0)
+    executor._attached[idle] = _Share("idle", idle, 1, None, 0)
+
+    # the idle project stays attached with nothing queued while the busy one runs
+    for i in range(20):
+        busy._queue.put(f"busy{i}")
+    for i in range(10):
+        executor._next()
+    for i in range(10):
+        idle._queue.put(f"idle{i}")
+
+    names = [executor._next()[0].name for i in range(10)]
+
+    assert names.count("idle") <= 6
+
+
+def test_invalid_weight():
+    with pytest.raises(Exception, match="must be greater than 0"):
+        SharedExecutor().register("hourly", weight=0)
+
+
+def test_projects_execute_on_a_shared_executor(generatedProject):
+    executor = SharedExecutor(3)
+    results = dict()
+
+    def execute(shape:str):
+        project = Project(generatedProject(shape, 40))
+        results[shape] = project.execute(history=False, executor=executor)
+
+    runs = [threading.Thread(target=execute, args=(s,)) for s in ("mesh", "nested")]
+    for r in runs:
+        r.start()
+    for r in runs:
+        r.join()
+    executor.close()
+
+    assert [r["status"] for r in results.values()] == [TaskStatus.SUCEEDED.name] * 2
+    assert not any(t.name.startswith("MyceliumShared") for t in threading.enumerate())
@@ -0,0 +1,431 @@
+import threading
+import asyncio
+import time
+import pytest
+from mycelium.Task import DatabricksNotebook, PipelineOrigin, TaskStatus
+from mycelium.Dependency import Dependency
+from mycelium.Worker import Worker, WorkerPool, SchedulePriority, TaskObserver
+
+
+class CountingNotebook(DatabricksNotebook):
+
+    def __init__(self, name:str, fail:bool=False, priority:int=None, order:list=None):
+        super().__init__("databricksNotebook", name, priority=priority)
+        self.fail = fail
+        self.executions = 0
+        self.order = order if order is not None else []
+
+
+    def execute(self):
+        self.executions += 1
+        self.order.append(self.name)
+        self.status = TaskStatus.FAILED if self.fail else TaskStatus.SUCEEDED
+        return dict()
+
+
+    async def executeAsync(self):
+        await asyncio.sleep(0.05)
+        return self.execute()
+
+
+def link(task, dependencies:list):
+    task.dependencies = dependencies
+    for d in dependencies:
+        d.task.dependents.append(task)
+
+
+def run(origin, worker:Worker=None, maxParallel:int=4, priority=SchedulePriority.FIFO, durations:dict=None):
+    worker = worker or Worker()
+    worker._initSchedule(origin, priority, durations)
+    for i in range(maxParallel):
+        threading.Thread(target=worker._worker, daemon=True).start()
+    worker._enqueue(origin)
+    worker._queue.join()
+    return worker
+
+
+def test_group_to_group_runs_each_task_once():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    upstream = [CountingNotebook(f"a{i}") for i in range(20)]
+    downstream = [CountingNotebook(f"b{i}") for i in range(20)]
+    for t in upstream:
+        link(t, [Dependency(origin)])
+    for t in downstream:
+        link(t, [Dependency(u, "success", "and") for u in upstream])
+
+    puts = [origin]
+    worker = Worker()
+    release = worker._release
+    worker._release = lambda t: [puts.append(r) or r for r in release(t)]
+    run(origin, worker)
+
+    assert all(t.executions == 1 for t in upstream + downstream)
+    assert all(t.status == TaskStatus.SUCEEDED for t in upstream + downstream)
+    assert len(puts) == 1 + len(upstream) + len(downstream)
+
+
+def test_or_dependency_runs_after_first_parent():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    ok = CountingNotebook("ok")
+    failed = CountingNotebook("failed", fail=True)
+    either = CountingNotebook("either")
+    link(ok, [Dependency(origin)])
+    link(failed, [Dependency(origin)])
+    link(either, [Dependency(ok, "success", "or"), Dependency(failed, "success", "or")])
+
+    run(origin)
+
+    assert either.executions == 1
+    assert either.status == TaskStatus.SUCEEDED
+
+
+def test_unmet_condition_is_never_queued():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    parent = CountingNotebook("parent")
+    onFailure = CountingNotebook("onFailure")
+    link(parent, [Dependency(origin)])
+    link(onFailure, [Dependency(parent, "failure", "and")])
+    afterFailure = CountingNotebook("afterFailure")
+    link(afterFailure, [Dependency(onFailure, "success", "and")])
+
+    run(origin)
+
+    assert parent.status == TaskStatus.SUCEEDED
+    assert onFailure.executions == 0
+    # nothing upstream failed, the failure condition just wasn't met
+    assert onFailure.status == TaskStatus.SKIPPED
+    assert afterFailure.status == TaskStatus.SKIPPED
+
+
+def test_failure_prunes_dependents_that_can_never_run():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    failed = CountingNotebook("failed", fail=True)
+    ok = CountingNotebook("ok")
+    onSuccess = CountingNotebook("onSuccess")
+    afterSkipped = CountingNotebook("afterSkipped")
+    onCompletion = CountingNotebook("onCompletion")
+    onFailure = CountingNotebook("onFailure")
+    eitherOk = CountingNotebook("eitherOk")
+    neither = CountingNotebook("neither")
+    andOrOk = CountingNotebook("andOrOk")
+    link(failed, [Dependency(origin)])
+    link(ok, [Dependency(origin)])
+    link(onSuccess, [Dependency(failed, "success", "and")])
+    link(afterSkipped, [Dependency(onSuccess, "success", "and")])
+    link(onCompletion, [Dependency(onSuccess, "completion", "and")])
+    link(onFailure, [Dependency(failed, "failure", "and")])
+    link(eitherOk, [Dependency(failed, "success", "or"), Dependency(ok, "success", "or")])
+    link(neither, [Dependency(failed, "success", "or"), Dependency(onSuccess, "success", "or")])
+    link(andOrOk, [Dependency(failed, "success", "and"), Dependency(ok, "success", "or")])
+    onOkFailure = CountingNotebook("onOkFailure")
+    afterOkFailure = CountingNotebook("afterOkFailure")
+    link(onOkFailure, [Dependency(ok, "failure", "and")])
+    link(afterOkFailure, [Dependency(onOkFailure, "completion", "and"), Dependency(failed, "success", "and")])
+
+    run(origin)
+
+    pruned = [onSuccess, afterSkipped, neither, afterOkFailure]
+    assert all(t.status == TaskStatus.UPSTREAM_FAILED and t.executions == 0 for t in pruned)
+    assert onOkFailure.status == TaskStatus.SKIPPED and onOkFailure.executions == 0
+    assert all(t.status == TaskStatus.SUCEEDED for t in [ok, onCompletion, onFailure, eitherOk, andOrOk])
+
+
+def criticalPathDag(order:list, leafPriority:int=None):
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    leaves = [CountingNotebook(f"leaf{i}", order=order) for i in range(3)]
+    leaves.append(CountingNotebook("leaf3", priority=leafPriority, order=order))
+    chain = [CountingNotebook(f"chain{i}", order=order) for i in range(3)]
+    for t in leaves:
+        link(t, [Dependency(origin)])
+    link(chain[0], [Dependency(origin)])
+    link(chain[1], [Dependency(chain[0], "success", "and")])
+    link(chain[2], [Dependency(chain[1], "success", "and")])
+    return origin
+
+
+def test_fifo_schedule():
+    order = []
+    run(criticalPathDag(order), maxParallel=1)
+
+    assert order[:5] == ["leaf0", "leaf1", "leaf2", "leaf3", "chain0"]
+
+
+def test_critical_path_schedule():
+    order = []
+    run(criticalPathDag(order), maxParallel=1, priority=SchedulePriority.CRITICAL_PATH)
+
+    assert order[0] == "chain0"
+
+
+def test_critical_path_durations_and_priority():
+    order = []
+    run(criticalPathDag(order), maxParallel=1, priority=SchedulePriority.CRITICAL_PATH, durations={"leaf2": 10})
+
+    assert order[:2] == ["leaf2", "chain0"]
+
+    order = []
+    run(criticalPathDag(order, leafPriority=1), maxParallel=1, priority=SchedulePriority.CRITICAL_PATH)
+
+    assert order[:2] == ["leaf3", "chain0"]
+
+
+def runAsync(origin, maxParallel:int=4):
+    worker = Worker()
+    worker._initSchedule(origin)
+    asyncio.run(worker._workAsync(origin, maxParallel))
+    return worker
+
+
+def test_async_engine_runs_each_task_once():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    upstream = [CountingNotebook(f"a{i}") for i in range(20)]
+    downstream = [CountingNotebook(f"b{i}") for i in range(20)]
+    onFailure = CountingNotebook("onFailure")
+    for t in upstream:
+        link(t, [Dependency(origin)])
+    for t in downstream:
+        link(t, [Dependency(u, "success", "and") for u in upstream])
+    link(onFailure, [Dependency(downstream[0], "failure", "and")])
+
+    runAsync(origin)
+
+    assert all(t.executions == 1 for t in upstream + downstream)
+    assert onFailure.status == TaskStatus.SKIPPED
+
+
+def test_async_engine_concurrency():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    tasks = [CountingNotebook(f"t{i}") for i in range(2000)]
+    for t in tasks:
+        link(t, [Dependency(origin)])
+
+    start = time.monotonic()
+    runAsync(origin, maxParallel=2000)
+
+    assert all(t.status == TaskStatus.SUCEEDED for t in tasks)
+    assert time.monotonic() - start < 5
+
+
+class FlakyNotebook(CountingNotebook):
+
+    def __init__(self, name:str, failures:int, order:list):
+        super().__init__(name, order=order)
+        self.failures = failures
+        self.retry = 2
+        self.retryBackoff = 0.2
+        self.retryJitter = 0
+
+
+    def execute(self):
+        self.fail = self.executions < self.failures
+        return super().execute()
+
+
+@pytest.mark.parametrize("runner", [run, runAsync])
+def test_retries_free_the_worker(runner):
+    order = []
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    flaky = FlakyNotebook("flaky", 1, order)
+    others = [CountingNotebook(f"other{i}", order=order) for i in range(2)]
+    after = CountingNotebook("after", order=order)
+    for t in [flaky, *others]:
+        link(t, [Dependency(origin)])
+    link(after, [Dependency(flaky, "success", "and")])
+
+    start = time.monotonic()
+    runner(origin, maxParallel=1)
+
+    assert time.monotonic() - start >= 0.2
+    # the other tasks run while the failed task waits out its backoff
+    assert order == ["flaky", "other0", "other1", "flaky", "after"]
+    assert flaky.status == TaskStatus.SUCEEDED
+    assert flaky.toDict()["retries"] == 1
+
+
+@pytest.mark.parametrize("runner", [run, runAsync])
+def test_retries_are_exhausted(runner):
+    order = []
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    flaky = FlakyNotebook("flaky", 3, order)
+    flaky.retryBackoff = 0.01
+    after = CountingNotebook("after", order=order)
+    link(flaky, [Dependency(origin)])
+    link(after, [Dependency(flaky, "success", "and")])
+
+    runner(origin)
+
+    assert flaky.executions == 3
+    assert flaky.retries == 2
+    assert flaky.status == TaskStatus.FAILED
+    assert after.executions == 0
+
+
+class SlowNotebook(CountingNotebook):
+
+    def execute(self):
+        time.sleep(0.3)
+        return super().execute()
+
+
+def test_timed_out_task_fails():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    slow = SlowNotebook("slow")
+    slow.timeout = 0.1
+    onFailure = CountingNotebook("onFailure")
+    onSuccess = CountingNotebook("onSuccess")
+    link(slow, [Dependency(origin)])
+    link(onFailure, [Dependency(slow, "failure", "and")])
+    link(onSuccess, [Dependency(slow, "success", "and")])
+
+    worker = run(origin)
+
+    assert slow.status == TaskStatus.FAILED
+    assert onFailure.executions == 1
+    assert onSuccess.executions == 0
+    assert not worker._deadlines
+
+
+def test_timeout_due_after_the_execution_finished(monkeypatch):
+    task = CountingNotebook("task")
+    task.timeout = 0.05
+    task.status = TaskStatus.SUCEEDED
+
+    worker = Worker()
+    deadline = worker._watch(task)
+    # the timer goes off after the execution returned and before it's cancelled
+    time.sleep(0.1)
+    finished = deadline[0] - 0.01
+    monkeypatch.setattr(time, "monotonic", lambda: finished)
+    worker._unwatch(task, deadline)
+    monkeypatch.undo()
+
+    assert task.status == TaskStatus.SUCEEDED
+    assert not worker._deadlines
+
+
+def timerThreads()->int:
+    return sum(t.name == "TaskTimer" for t in threading.enumerate())
+
+
+def test_timer_thread_exits_after_the_run():
+    before = timerThreads()
+    for i in range(5):
+        origin = PipelineOrigin("PipelineOrigin", "test")
+        tasks = [CountingNotebook(f"t{j}") for j in range(4)]
+        for t in tasks:
+            t.timeout = 60
+            link(t, [Dependency(origin)])
+        run(origin)
+
+    # the timeouts are cancelled when the tasks finish, leaving the timer thread nothing to wait for
+    deadline = time.monotonic() + 2
+    while timerThreads() > before and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert timerThreads() <= before
+
+
+def runPool(origin, maxWorkers:int=4, idleTimeout:float=5):
+    worker = Worker()
+    worker._initSchedule(origin)
+    worker._pool = WorkerPool(worker, maxWorkers, idleTimeout=idleTimeout)
+    worker._start(origin)
+    worker._queue.join()
+    return worker
+
+
+def poolThreads()->int:
+    return sum(t.name.startswith("MyceliumWorker") for t in threading.enumerate())
+
+
+def test_worker_pool_grows_with_runnable_tasks_and_closes():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    tasks = [SlowNotebook(f"t{i}") for i in range(8)]
+    for t in tasks:
+        link(t, [Dependency(origin)])
+
+    before = poolThreads()
+    start = time.monotonic()
+    worker = runPool(origin, maxWorkers=4)
+
+    assert all(t.status == TaskStatus.SUCEEDED for t in tasks)
+    assert worker._pool.peak == 4
+    assert time.monotonic() - start < 0.9
+
+    worker._pool.close()
+    assert worker._pool.size == 0
+    assert poolThreads() == before
+
+
+def test_worker_pool_shrinks_when_idle():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    wide = [SlowNotebook(f"wide{i}") for i in range(4)]
+    narrow = [SlowNotebook(f"narrow{i}") for i in range(3)]
+    for t in wide:
+        link(t, [Dependency(origin)])
+    link(narrow[0], [Dependency(t, "success", "and") for t in wide])
+    link(narrow[1], [Dependency(narrow[0], "success", "and")])
+    link(narrow[2], [Dependency(narrow[1], "success", "and")])
+
+    worker = runPool(origin, maxWorkers=4, idleTimeout=0.1)
+
+    assert all(t.status == TaskStatus.SUCEEDED for t in wide + narrow)
+    assert worker._pool.peak >= 3
+    # the threads left idle by the narrow end of the dag have exited
+    assert worker._pool.size == 1
+    assert worker._pool.busy == 0
+    assert worker._pool.utilisation == 0
+    worker._pool.close()
+
+
+class RaisingNotebook(CountingNotebook):
+
+    def execute(self):
+        raise RuntimeError("lost the workspace")
+
+
+    async def executeAsync(self):
+        raise RuntimeError("lost the workspace")
+
+
+class RaisingObserver(TaskObserver):
+
+    def taskStarted(self, task):
+        raise RuntimeError("observer failed")
+
+
+def raisingDag():
+    origin = PipelineOrigin("PipelineOrigin", "test")
+    raising = RaisingNotebook("raising")
+    onFailure = CountingNotebook("onFailure")
+    onSuccess = CountingNotebook("onSuccess")
+    link(raising, [Dependency(origin)])
+    link(onFailure, [Dependency(raising, "failure", "and")])
+    link(onSuccess, [Dependency(raising, "success", "and")])
+    return origin, raising, onFailure, onSuccess
+
+
+@pytest.mark.parametrize("engine", ["pool", "async"])
+def test_raising_task_fails_and_releases_its_dependents(engine):
+    origin, raising, onFailure, onSuccess = raisingDag()
+
+    worker = runPool(origin, maxWorkers=2) if engine == "pool" else runAsync(origin)
+
+    assert raising.status == TaskStatus.FAILED
+    assert onFailure.executions == 1
+    assert onSuccess.status == TaskStatus.UPSTREAM_FAILED
+    if engine == "pool":
+        assert worker._pool.busy == 0
+        worker._pool.close()
+
+
+def test_raising_observer_doesnt_stop_the_run():
+    origin, raising, onFailure, onSuccess = raisingDag()
+    worker = Worker()
+    worker._observers.append(RaisingObserver())
+
+    run(origin, worker)
+
+    assert onFailure.executions == 1
+    assert origin.status == TaskStatus.SUCEEDED
+